@@ -0,0 +1,48 @@
+#!/usr/bin/python
+"""
+Record real BoardGameGeek pages as benchmark fixtures.
+Uses URLs from .env (CATEGORIES_URL, GAMES_URL, BASE_URL). Game page is rendered with Firefox.
+
+Usage: python -m bench.record [GAME_LINK]
+"""
+###IMPORTS###
+import os
+import sys
+from dotenv import load_dotenv
+
+import bg_scraper as bgs
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
+
+
+###FUNCTIONS###
+def save(name, content):
+    """Save fixture content to the fixtures directory."""
+    if isinstance(content, str):
+        content = content.encode("utf-8")
+    with open(os.path.join(FIXTURES, name), "wb") as f:
+        f.write(content)
+    print("Recorded {} ({} bytes)".format(name, len(content)))
+
+def main():
+    load_dotenv()
+    baseURL = os.getenv("BASE_URL")
+    session = bgs.SimpleScraper.shared_session()
+    save("category_page.html", session.get(os.getenv("CATEGORIES_URL")).content)
+    browse = session.get(os.getenv("GAMES_URL") + "/1").content
+    save("browse_page.html", browse)
+    links = bgs.ListCrawler.parse_links(browse, baseURL)
+    link = sys.argv[1] if len(sys.argv) > 1 else links[0]
+    scraper = bgs.Scraper(link, timeout = int(os.getenv("TIMEOUT") or 30))
+    try:
+        scraper.wait_for_elem("gameplay-item-primary")
+        save("game_page.html", str(scraper.soup))
+    finally:
+        scraper.quit()
+    ids = [bgs.XMLAPIBackend.game_id(link) for link in links[:20]]
+    response = session.get("https://boardgamegeek.com/xmlapi2/thing", params = {"id" : ",".join(ids), "stats" : 1})
+    save("thing.xml", response.content)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+#!/usr/bin/python
+"""
+Offline benchmark suite. Serves recorded pages from bench/fixtures through a local HTTP stand-in,
+measures throughput and latency of the scraping stages and compares them with the stored baseline.
+
+Usage: python -m bench.run [--repeat N] [--check] [--update-baseline] [--output FILE]
+"""
+###IMPORTS###
+import os
+import io
+import re
+import sys
+import json
+import time
+import argparse
+import tempfile
+import contextlib
+import xml.etree.ElementTree as ET
+from urllib.parse import urlparse, parse_qs
+
+import bg_scraper as bgs
+from bench.stand_in import StandInServer, StandInDriver, crawl_environment
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
+BASELINE = os.path.join(os.path.dirname(__file__), "baseline.json")
+
+
+###FUNCTIONS###
+def fixture(name):
+    with open(os.path.join(FIXTURES, name), "rb") as f:
+        return f.read()
+
+def thing_route(request):
+    """Answer thing request with the recorded item copied for every requested id."""
+    ids = parse_qs(urlparse(request.path).query)["id"][0].split(",")
+    template = ET.fromstring(fixture("thing.xml")).find("item")
+    root = ET.Element("items")
+    for id_ in ids:
+        item = ET.fromstring(ET.tostring(template))
+        item.set("id", id_)
+        item.find("name[@type='primary']").set("value", "Game {}".format(id_))
+        root.append(item)
+    return 200, {"Content-Type" : "text/xml"}, ET.tostring(root)
+
+def routes():
+    """Routes of the BGG stand-in built from fixtures."""
+    browse = fixture("browse_page.html")
+    game = fixture("game_page.html")
+    routes = {
+        "/browse/boardgamecategory" : fixture("category_page.html"),
+        "/xmlapi2/thing" : thing_route
+    }
+    for page_no in range(1, 101):
+        routes["/browse/boardgame/page/{}".format(page_no)] = browse
+    for link in bgs.ListCrawler.parse_links(browse):
+        routes[link] = game
+    return routes
+
+def measure(function, repeat, items = 1):
+    """
+    Call function repeatedly.
+    RETURN
+    ------
+    dictionary with throughput (items per second at median latency, robust to outliers)
+    and latency percentiles in milliseconds
+    """
+    latencies = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        latencies.append(time.perf_counter() - start)
+    latencies.sort()
+    def percentile(q):
+        return 1000 * latencies[min(len(latencies) - 1, int(q * len(latencies)))]
+    return {
+        "throughput" : items / latencies[len(latencies) // 2],
+        "p50_ms" : percentile(0.5),
+        "p95_ms" : percentile(0.95)
+    }
+
+def run(repeat = 20):
+    """Run all benchmarks against the local stand-in. Return dictionary benchmark -> metrics."""
+    results = {}
+    with StandInServer(routes()) as server, contextlib.redirect_stdout(io.StringIO()):
+        session = bgs.make_session(retries = 0)
+        browse_url = server.url + "/browse/boardgame/page/1"
+        game_url = server.url + bgs.ListCrawler.parse_links(fixture("browse_page.html"))[0]
+
+        scraper = bgs.SimpleScraper(browse_url, session = session)
+        results["simple_scraper_fetch"] = measure(lambda: scraper.set_page(browse_url), repeat)
+        results["simple_scraper_scrape"] = measure(
+            lambda: scraper.scrape('a', class_ = "primary", get_text = False,
+                parent = scraper.scrape('table', id_ = "collectionitems", get_text = False, all_results = False)),
+            repeat
+        )
+        crawler = bgs.ListCrawler(server.url + "/browse/boardgame/page", server.url, concurrency = 8, session = session)
+        results["list_crawl_20_pages"] = measure(lambda: crawler.crawl(20), max(1, repeat // 5), items = 20)
+
+        game = bgs.SimpleScraper(game_url, session = session)
+        params = game.scrape('div', class_ = "gameplay-item-primary", get_text = False)
+        params = [list(filter(lambda t: t != "", re.split(r'[\t ]+', par.get_text()))) for par in params]
+        results["game_extract_params"] = measure(
+            lambda: [bgs.Game.extract_params(params) for _ in range(1000)], repeat, items = 1000
+        )
+        results["game_title_and_release"] = measure(lambda: bgs.Game.get_title_and_release_date(game), repeat)
+        results["game_parse_full"] = measure(lambda: game.set_page(game_url), repeat)
+        targeted = bgs.SimpleScraper(game_url, session = session, regions = bgs.Game.REGIONS)
+        results["game_parse_regions"] = measure(lambda: targeted.set_page(game_url), repeat)
+        results["game_extract_spec"] = measure(lambda: bgs.GAME_EXTRACTOR.extract(targeted.soup), repeat)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            output = os.path.join(tmp, "games.jsonl")
+            def end_to_end(factory = None):
+                os.remove(output) if os.path.exists(output) else None
+                bgs.main(factory = factory)
+            with crawl_environment(server, OUTPUT = output):
+                results["main_end_to_end"] = measure(end_to_end, max(1, repeat // 5))
+            #Html backend renders game pages with stand-in drivers, so the pool and page parsing are measured without a browser
+            with crawl_environment(server, OUTPUT = output, BACKEND = "html", DRIVERS = 4, PARSE_WORKERS = 0):
+                results["main_end_to_end_html"] = measure(lambda: end_to_end(StandInDriver), max(1, repeat // 5))
+    return results
+
+def compare(results, baseline, tolerance = 0.3):
+    """
+    Compare throughput with baseline.
+    RETURN
+    ------
+    list of (benchmark, current throughput, baseline throughput, ratio, regression flag) tuples
+    """
+    rows = []
+    for name, metrics in results.items():
+        base = baseline.get(name)
+        if base is None:
+            rows.append((name, metrics["throughput"], None, None, False))
+            continue
+        ratio = metrics["throughput"] / base["throughput"]
+        rows.append((name, metrics["throughput"], base["throughput"], ratio, ratio < 1 - tolerance))
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description = "Offline scraping benchmarks")
+    parser.add_argument("--repeat", type = int, default = 20)
+    parser.add_argument("--tolerance", type = float, default = 0.3, help = "allowed throughput drop against baseline")
+    parser.add_argument("--check", action = "store_true", help = "exit with 1 on regression")
+    parser.add_argument("--update-baseline", action = "store_true")
+    parser.add_argument("--output", help = "write results as JSON to the file")
+    args = parser.parse_args()
+
+    results = run(args.repeat)
+    baseline = {}
+    if os.path.exists(BASELINE):
+        with open(BASELINE) as f:
+            baseline = json.load(f)
+    rows = compare(results, baseline, args.tolerance)
+    print("{:<26} {:>14} {:>14} {:>8}".format("benchmark", "items/s", "baseline", "ratio"))
+    for name, current, base, ratio, regression in rows:
+        print("{:<26} {:>14.1f} {:>14} {:>8} {}".format(
+            name, current, "-" if base is None else "{:.1f}".format(base),
+            "-" if ratio is None else "{:.2f}".format(ratio), "REGRESSION" if regression else ""
+        ))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent = 2)
+    if args.update_baseline:
+        with open(BASELINE, "w") as f:
+            json.dump(results, f, indent = 2, sort_keys = True)
+        print("Baseline updated: {}".format(BASELINE))
+    if args.check and any(row[4] for row in rows):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
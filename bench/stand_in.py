@@ -0,0 +1,153 @@
+"""Local stand-ins of boardgamegeek and the browser driver used by benchmarks and tests."""
+import os
+import threading
+from contextlib import contextmanager
+from urllib.parse import urlparse
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import bg_scraper as bgs
+
+
+class StandInServer():
+    """
+    Serve fixed responses from a local port in a background thread.
+
+    ATTRS
+    -----
+    routes  [dict]  path -> body (str or bytes) or callable(handler) returning (status, headers, body)
+    hits    [dict]  path -> number of requests received
+    url     [str]   base URL of the server, without trailing slash
+    """
+    def __init__(self, routes = None):
+        self.routes = routes or {}
+        self.hits = {}
+        self.lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def do_GET(self):
+                server._serve(self)
+
+            def do_POST(self):
+                server._serve(self)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.httpd.daemon_threads = True
+        self.thread = threading.Thread(target = self.httpd.serve_forever, daemon = True)
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address
+        return "http://{}:{}".format(host, port)
+
+    def _serve(self, handler):
+        path = handler.path
+        if path.startswith(("http://", "https://")):
+            #Server used as a forward proxy, serve routes by path of the absolute URL
+            parsed = urlparse(path)
+            path = parsed.path + ("?" + parsed.query if parsed.query else "")
+        with self.lock:
+            self.hits[path] = self.hits.get(path, 0) + 1
+        route = self.routes.get(path)
+        if route is None:
+            route = self.routes.get(path.split("?")[0])
+        if route is None:
+            status, headers, body = 404, {}, b"not found"
+        elif callable(route):
+            status, headers, body = route(handler)
+        else:
+            status, headers, body = 200, {"Content-Type" : "text/html"}, route
+        if isinstance(body, str):
+            body = body.encode("utf-8")
+        handler.send_response(status)
+        for key, value in headers.items():
+            handler.send_header(key, value)
+        handler.send_header("Content-Length", str(len(body)))
+        handler.end_headers()
+        handler.wfile.write(body)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+
+class StandInDriver():
+    """
+    Stand-in for the headless Scraper in ScraperPool. Pages are fetched with requests and parsed
+    with the regions of rendered game pages, so the html backend runs without a browser.
+
+    ATTRS
+    -----
+    proxy   [str]   proxy passed by the pool, not used
+    """
+    def __init__(self, proxy = None):
+        self.proxy = proxy
+        self.__scraper = None
+
+    @property
+    def page(self):
+        return self.__scraper.page if self.__scraper is not None else None
+
+    @property
+    def soup(self):
+        return self.__scraper.soup
+
+    @property
+    def page_response(self):
+        return self.__scraper.page_response
+
+    def set_page(self, page):
+        if self.__scraper is None:
+            self.__scraper = bgs.SimpleScraper(page, regions = bgs.Game.REGIONS)
+        else:
+            self.__scraper.set_page(page)
+
+    def quit(self):
+        pass
+
+
+
+#Settings of bg_scraper.main() which benchmarks and tests set or clear
+CRAWL_SETTINGS = (
+    "BASE_URL", "CATEGORIES_URL", "GAMES_URL", "XMLAPI_URL", "BACKEND", "OUTPUT", "PAGES", "JOURNAL_PATH",
+    "JOURNAL_MAX_ATTEMPTS", "DELTA_INDEX", "DELTA_OUTPUT", "INDEX_PATH", "STATS_PATH", "TAGS_PATH", "SEARCH_INDEX",
+    "PARQUET_DIR", "METRICS_PATH", "CACHE_PATH", "RATE_LIMIT", "PROXY", "PROXIES"
+)
+
+@contextmanager
+def crawl_environment(server, **values):
+    """
+    Point crawl settings at the stand-in server with the XML API backend, other settings are cleared.
+    Given values override them, None clears the setting. Previous environment is restored on exit.
+    """
+    saved = {key : os.environ.get(key) for key in set(CRAWL_SETTINGS) | set(values)}
+    settings = dict.fromkeys(CRAWL_SETTINGS)
+    settings.update({
+        "BASE_URL" : server.url, "CATEGORIES_URL" : server.url + "/browse/boardgamecategory",
+        "GAMES_URL" : server.url + "/browse/boardgame/page", "XMLAPI_URL" : server.url + "/xmlapi2", "BACKEND" : "xmlapi"
+    })
+    settings.update(values)
+    try:
+        for key, value in settings.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = str(value)
+        yield
+    finally:
+        for key, value in saved.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
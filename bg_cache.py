@@ -0,0 +1,244 @@
+#!/usr/bin/python
+###IMPORTS###
+import os
+import re
+import sys
+import time
+import sqlite3
+import threading
+
+
+###CLASSES###
+class ResponseCache():
+    """
+    Persistent on-disk cache of page sources keyed by URL and namespace. Raw responses use no namespace,
+    pages rendered by a browser use their own, so both versions of the same URL are kept apart.
+    Stale entries are revalidated with conditional requests (ETag / Last-Modified)
+    and the least recently used entries are evicted when the cache exceeds its size cap.
+    Access times of hits are kept in memory and written in batches, before eviction and on close.
+
+    ATTRS
+    -----
+    path    [str]   path to the SQLite file with cached entries
+    max_size    [int]   max total size of cached bodies in bytes
+    ttls    [list]  list of (compiled regex, seconds) tuples. The first pattern matching URL sets its TTL
+    default_ttl [int]   TTL in seconds for URLs not matching any pattern
+    stats   [dict]  counters of hits, misses, revalidations, stores and evictions
+    """
+    #Number of pending access times which triggers a write
+    ACCESS_BATCH = 1000
+
+    def __init__(self, path, max_size = 512 * 1024 ** 2, ttls = None, default_ttl = 24 * 3600):
+        """
+        ARGS
+        ----
+        path    [str]   path to the SQLite file. Parent directories are created
+        max_size    [int]   max total size of cached bodies in bytes
+        ttls    [dict or list]  URL pattern -> TTL in seconds, e.g. {r"/browse/": 6 * 3600}
+        default_ttl [int]   TTL in seconds for URLs not matching any pattern
+        """
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok = True)
+        self.__path = path
+        self.__max_size = max_size
+        ttls = ttls.items() if isinstance(ttls, dict) else (ttls or [])
+        self.__ttls = [(re.compile(pattern), seconds) for pattern, seconds in ttls]
+        self.__default_ttl = default_ttl
+        self.__lock = threading.Lock()
+        self.__accessed = {}
+        self.__db = sqlite3.connect(path, check_same_thread = False)
+        self.__db.execute(
+            """CREATE TABLE IF NOT EXISTS entries (
+                url TEXT PRIMARY KEY,
+                body BLOB NOT NULL,
+                etag TEXT,
+                last_modified TEXT,
+                stored_at REAL NOT NULL,
+                accessed_at REAL NOT NULL,
+                size INTEGER NOT NULL
+            )"""
+        )
+        self.__db.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed_at)")
+        self.__db.commit()
+        self.__size = self.__db.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        self.stats = {"hits" : 0, "misses" : 0, "revalidated" : 0, "stores" : 0, "evictions" : 0}
+
+    @property
+    def path(self):
+        return self.__path
+
+    @property
+    def max_size(self):
+        return self.__max_size
+
+    @property
+    def size(self):
+        return self.__size
+
+    @property
+    def hit_rate(self):
+        """Share of lookups served from cache, including revalidated entries."""
+        total = self.stats["hits"] + self.stats["misses"]
+        return self.stats["hits"] / total if total else 0.0
+
+    @property
+    def miss_rate(self):
+        total = self.stats["hits"] + self.stats["misses"]
+        return self.stats["misses"] / total if total else 0.0
+
+    def ttl(self, url):
+        """Return TTL in seconds for given URL."""
+        for pattern, seconds in self.__ttls:
+            if pattern.search(url):
+                return seconds
+        return self.__default_ttl
+
+    @staticmethod
+    def key(url, namespace = None):
+        """Return key of the entry, e.g. "render:lean http://..." for a page rendered in the lean profile."""
+        return url if namespace is None else "{} {}".format(namespace, url)
+
+    def lookup(self, url, namespace = None):
+        """
+        Find cached entry.
+        ARGS
+        ----
+        url [str]   URL of the page
+        namespace   [str]   how the page was obtained, e.g. "render:lean". None for raw responses
+
+        RETURN
+        ------
+        tuple of body, freshness flag, ETag and Last-Modified in the given order or None if URL is not cached.
+        """
+        key = ResponseCache.key(url, namespace)
+        with self.__lock:
+            row = self.__db.execute(
+                "SELECT body, etag, last_modified, stored_at FROM entries WHERE url = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            self.__accessed[key] = time.time()
+            if len(self.__accessed) >= ResponseCache.ACCESS_BATCH:
+                self._write_accessed_()
+                self.__db.commit()
+        body, etag, last_modified, stored_at = row
+        return body, time.time() - stored_at < self.ttl(url), etag, last_modified
+
+    def store(self, url, body, etag = None, last_modified = None, namespace = None):
+        """Save page source with its validators and evict old entries if the size cap is exceeded."""
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        key = ResponseCache.key(url, namespace)
+        now = time.time()
+        with self.__lock:
+            old = self.__db.execute("SELECT size FROM entries WHERE url = ?", (key,)).fetchone()
+            self.__db.execute(
+                "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, body, etag, last_modified, now, now, len(body))
+            )
+            self.__size += len(body) - (old[0] if old else 0)
+            self.stats["stores"] += 1
+            self.__accessed.pop(key, None)
+            self._write_accessed_()
+            self._evict_()
+            self.__db.commit()
+
+    def refresh(self, url, namespace = None):
+        """Mark entry as fresh after successful revalidation."""
+        now = time.time()
+        with self.__lock:
+            self.__accessed.pop(ResponseCache.key(url, namespace), None)
+            self.__db.execute(
+                "UPDATE entries SET stored_at = ?, accessed_at = ? WHERE url = ?", (now, now, ResponseCache.key(url, namespace))
+            )
+            self.__db.commit()
+
+    def _write_accessed_(self):
+        """Write pending access times of hits. Call with lock held, the caller commits."""
+        if self.__accessed:
+            self.__db.executemany("UPDATE entries SET accessed_at = ? WHERE url = ?", [
+                (accessed_at, key) for key, accessed_at in self.__accessed.items()
+            ])
+            self.__accessed = {}
+
+    def _evict_(self):
+        """Remove least recently used entries until the cache fits its size cap. Call with lock held."""
+        while self.__size > self.__max_size:
+            rows = self.__db.execute(
+                "SELECT url, size FROM entries ORDER BY accessed_at LIMIT 64"
+            ).fetchall()
+            if not rows:
+                self.__size = 0
+                return
+            for url, size in rows:
+                self.__db.execute("DELETE FROM entries WHERE url = ?", (url,))
+                self.__size -= size
+                self.stats["evictions"] += 1
+                if self.__size <= self.__max_size:
+                    return
+
+    def count(self, *keys):
+        """Increase given stats counters. Used by callers which look entries up on their own."""
+        with self.__lock:
+            for key in keys:
+                self.stats[key] += 1
+
+    def fetch(self, session, url, raise_for_status = False, **kwargs):
+        """
+        Return page source from cache or from the web.
+        Fresh entries are returned directly, stale entries with validators are revalidated
+        with a conditional request.
+        ARGS
+        ----
+        session [Session]   session used for requests
+        url [str]   URL of the page
+        raise_for_status    [bool]  if True then raise HTTPError for error responses
+        kwargs  additional arguments passed to session.get
+
+        RETURN
+        ------
+        page source as bytes
+        """
+        entry = self.lookup(url)
+        headers = dict(kwargs.pop('headers', None) or {})
+        if entry is not None:
+            body, fresh, etag, last_modified = entry
+            if fresh:
+                self.count("hits")
+                return body
+            if etag:
+                headers['If-None-Match'] = etag
+            if last_modified:
+                headers['If-Modified-Since'] = last_modified
+        response = session.get(url, headers = headers, **kwargs)
+        if entry is not None and response.status_code == 304:
+            self.refresh(url)
+            self.count("hits", "revalidated")
+            return entry[0]
+        self.count("misses")
+        if raise_for_status:
+            response.raise_for_status()
+        if response.ok:
+            self.store(url, response.content, response.headers.get('ETag'), response.headers.get('Last-Modified'))
+        return response.content
+
+    def clear(self):
+        """Remove all entries."""
+        with self.__lock:
+            self.__db.execute("DELETE FROM entries")
+            self.__db.commit()
+            self.__accessed = {}
+            self.__size = 0
+
+    def report(self, file = sys.stderr):
+        """Print cache statistics."""
+        print(
+            "Cache {}: hit rate {:.1%}, miss rate {:.1%}, {}".format(self.__path, self.hit_rate, self.miss_rate, self.stats),
+            file = file
+        )
+
+    def close(self):
+        with self.__lock:
+            self._write_accessed_()
+            self.__db.commit()
+            self.__db.close()
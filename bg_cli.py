@@ -0,0 +1,109 @@
+#!/usr/bin/python
+###IMPORTS###
+import os
+import sys
+import argparse
+#Stages import their dependencies when they run, so starting a requests-only stage does not load browser or pandas
+
+
+###FUNCTIONS###
+def read_links(path):
+    """
+    Read games links, one per line. Empty lines and lines starting with # are skipped.
+    ARGS
+    ----
+    path    [str]   path to the links file or - for standard input
+
+    RETURN
+    ------
+    list of links in file order
+    """
+    f = sys.stdin if path == "-" else open(path, encoding = 'utf-8')
+    try:
+        return [line.strip() for line in f if line.strip() and not line.startswith("#")]
+    finally:
+        if f is not sys.stdin:
+            f.close()
+
+def write_links(links, path):
+    """Write games links, one per line, to the file or to standard output if path is -."""
+    if path == "-":
+        sys.stdout.writelines(link + "\n" for link in links)
+        sys.stdout.flush()
+        return
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok = True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding = 'utf-8') as f:
+        f.writelines(link + "\n" for link in links)
+    os.replace(tmp_path, path)
+
+def list_links_command(args):
+    from bg_scraper import configure_from_env, list_links
+    configure_from_env()
+    links = list_links(args.pages, args.first_page)
+    write_links(links, args.output)
+    print("Games links: {}".format(len(links)), file = sys.stderr)
+    return 0
+
+def scrape_games_command(args):
+    import bg_scraper
+    #Options override environment variables read by the crawl
+    for name, value in (("OUTPUT", args.output), ("BACKEND", args.backend), ("PAGES", args.pages)):
+        if value is not None:
+            os.environ[name] = str(value)
+    bg_scraper.main(read_links(args.links) if args.links else None)
+    return 0
+
+def export_command(args):
+    from bg_export import export_parquet, read_jsonl
+    print(export_parquet(read_jsonl(args.games), args.output_dir, args.date))
+    return 0
+
+def upload_command(args):
+    from bg_upload import upload_from_env
+    results = upload_from_env(args.data_dir, args.remote_dir)
+    for result in results:
+        print("{status}: {file} -> {remote} ({bytes} bytes)".format(**result))
+    return 1 if any(result["status"] == "failed" for result in results) else 0
+
+def make_parser():
+    parser = argparse.ArgumentParser(
+        prog = "bg_cli.py", description = "Boardgames crawl stages. Settings are read from environment variables and .env file."
+    )
+    commands = parser.add_subparsers(dest = "command", required = True)
+
+    command = commands.add_parser("list-links", help = "crawl ranking pages and write games links in rank order")
+    command.add_argument("--pages", type = int, help = "number of ranking pages (default PAGES or 2)")
+    command.add_argument("--first-page", type = int, default = 1, help = "number of the first page")
+    command.add_argument("--output", "-o", default = "-", help = "links file, - for standard output (default)")
+    command.set_defaults(handler = list_links_command)
+
+    command = commands.add_parser("scrape-games", help = "scrape games and write them to JSON Lines")
+    command.add_argument("--links", help = "links file written by list-links, - for standard input. If omitted then links are crawled")
+    command.add_argument("--output", "-o", help = "games JSON Lines file (default OUTPUT or games.jsonl)")
+    command.add_argument("--backend", choices = ("html", "xmlapi"), help = "games source (default BACKEND or html)")
+    command.add_argument("--pages", type = int, help = "number of ranking pages crawled when --links is omitted")
+    command.set_defaults(handler = scrape_games_command)
+
+    command = commands.add_parser("export", help = "export games JSON Lines to Parquet")
+    command.add_argument("games", help = "games JSON Lines file")
+    command.add_argument("output_dir", help = "directory of the Parquet dataset")
+    command.add_argument("--date", help = "scrape date partition (default today)")
+    command.set_defaults(handler = export_command)
+
+    command = commands.add_parser("upload", help = "upload files of the directory to Dropbox")
+    command.add_argument("data_dir", help = "local directory")
+    command.add_argument("remote_dir", nargs = "?", default = "/", help = "Dropbox directory (default /)")
+    command.set_defaults(handler = upload_command)
+    return parser
+
+def main(argv = None):
+    args = make_parser().parse_args(argv)
+    from dotenv import load_dotenv
+    load_dotenv()
+    return args.handler(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
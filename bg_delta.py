@@ -0,0 +1,187 @@
+#!/usr/bin/python
+###IMPORTS###
+import os
+import time
+import sqlite3
+import datetime
+from dataclasses import asdict
+
+from bg_scraper import Game, game_fingerprint
+
+
+###CONSTANTS###
+INSERT = "insert"
+UPDATE = "update"
+DELETE = "delete"
+
+
+###CLASSES###
+class DeltaIndex():
+    """
+    Fingerprints of games from the previous run stored in SQLite. Each run compares its records with
+    the index and emits only inserted, updated and deleted games. Changes of a run are committed
+    together by finish(), so an interrupted run leaves the previous index intact.
+
+    ATTRS
+    -----
+    path    [str]   path to the index file
+    run     [str]   identifier of the current run
+    counts  [dict]  operation -> number of games in the current run, unchanged ones included
+    """
+    def __init__(self, path):
+        """
+        ARGS
+        ----
+        path    [str]   path to the index file. Parent directories are created
+        """
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok = True)
+        self.__path = path
+        self.__db = sqlite3.connect(path)
+        self.__db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS games (
+                key TEXT PRIMARY KEY,
+                fingerprint TEXT NOT NULL,
+                generation INTEGER NOT NULL,
+                run TEXT NOT NULL,
+                updated_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS games_generation ON games (generation);
+            """
+        )
+        self.__db.commit()
+        self.run = None
+        self.counts = {}
+        self.__generation = None
+
+    @property
+    def path(self):
+        return self.__path
+
+    def __len__(self):
+        return self.__db.execute("SELECT COUNT(*) FROM games").fetchone()[0]
+
+    def begin(self, run = None):
+        """
+        Start new run.
+        ARGS
+        ----
+        run [str]   run identifier. Defaults to current time
+        """
+        self.__db.rollback()
+        self.run = run or datetime.datetime.now().isoformat(timespec = "seconds")
+        #Runs are told apart by generation, labels of quick runs may repeat
+        self.__generation = (self.__db.execute("SELECT MAX(generation) FROM games").fetchone()[0] or 0) + 1
+        self.counts = {INSERT : 0, UPDATE : 0, DELETE : 0, "unchanged" : 0}
+
+    def diff(self, key, record):
+        """
+        Compare record with the previous run and remember its fingerprint.
+        ARGS
+        ----
+        key [str]   game key, e.g. its link
+        record  [dict or Game]  game record
+
+        RETURN
+        ------
+        tuple (operation, fingerprint). Operation is "insert", "update" or None if game did not change
+        """
+        if self.run is None:
+            raise RuntimeError("Call begin() before comparing records.")
+        fingerprint = game_fingerprint(record)
+        row = self.__db.execute("SELECT fingerprint FROM games WHERE key = ?", (key,)).fetchone()
+        op = INSERT if row is None else UPDATE if row[0] != fingerprint else None
+        self.__db.execute(
+            "INSERT OR REPLACE INTO games VALUES (?, ?, ?, ?, ?)", (key, fingerprint, self.__generation, self.run, time.time())
+        )
+        self.counts[op or "unchanged"] += 1
+        return op, fingerprint
+
+    def finish(self, keep = ()):
+        """
+        Remove games not seen in the current run and commit the run.
+        ARGS
+        ----
+        keep    [iterable]  keys which were not seen but must not be deleted, e.g. links which failed
+
+        RETURN
+        ------
+        list of deleted keys
+        """
+        if self.run is None:
+            raise RuntimeError("Call begin() before finishing the run.")
+        keep = set(keep)
+        stale = self.__db.execute("SELECT key FROM games WHERE generation < ? ORDER BY key", (self.__generation,))
+        deleted = [key for (key,) in stale if key not in keep]
+        self.__db.executemany("DELETE FROM games WHERE key = ?", [(key,) for key in deleted])
+        self.__db.commit()
+        self.counts[DELETE] = len(deleted)
+        self.run = None
+        self.__generation = None
+        return deleted
+
+    def close(self):
+        self.__db.rollback()
+        self.__db.close()
+
+
+###FUNCTIONS###
+def delta_record(op, key, record = None, fingerprint = None):
+    """Return line of the delta file."""
+    entry = {"op" : op, "key" : key}
+    if record is not None:
+        entry["fingerprint"] = fingerprint
+        entry["record"] = asdict(record) if isinstance(record, Game) else record
+    return entry
+
+def track_changes(games, index, writer):
+    """
+    Write inserted and updated games to the delta sink as they pass.
+    ARGS
+    ----
+    games   [iterable]  (key, Game or dict) tuples
+    index   [DeltaIndex]    index with started run
+    writer  [JSONLWriter]   sink of the delta file
+
+    RETURN
+    ------
+    generator of the same (key, game) tuples
+    """
+    for key, game in games:
+        op, fingerprint = index.diff(key, game)
+        if op is not None:
+            writer.write(delta_record(op, key, game, fingerprint))
+        yield key, game
+
+def finish_delta(index, writer, keep = ()):
+    """Write deletes of the finished run to the delta sink. Return counts of operations."""
+    for key in index.finish(keep):
+        writer.write(delta_record(DELETE, key))
+    return dict(index.counts)
+
+def delta_path(output):
+    """Return path of the delta file written next to the snapshot, e.g. games.delta.jsonl for games.jsonl."""
+    root, extension = os.path.splitext(output)
+    return "{}.delta{}".format(root, extension or ".jsonl")
+
+def apply_delta(snapshot, delta):
+    """
+    Apply delta entries to a snapshot.
+    ARGS
+    ----
+    snapshot    [dict]  key -> record of the previous run
+    delta   [iterable]  delta entries
+
+    RETURN
+    ------
+    new snapshot dictionary
+    """
+    snapshot = dict(snapshot)
+    for entry in delta:
+        if entry["op"] == DELETE:
+            snapshot.pop(entry["key"], None)
+        else:
+            snapshot[entry["key"]] = entry["record"]
+    return snapshot
+
@@ -0,0 +1,164 @@
+#!/usr/bin/python
+###IMPORTS###
+import os
+import sys
+import json
+import datetime
+from dataclasses import fields, asdict
+from typing import get_origin
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+from bg_scraper import Game
+
+
+###CONSTANTS###
+#Columns stored with dictionary encoding, they repeat across many games
+DICTIONARY_COLUMNS = ("category", "publisher")
+PARTITION_COLUMN = "scrape_date"
+
+
+###FUNCTIONS###
+def _require_pyarrow_():
+    if pa is None:
+        raise ImportError("pyarrow is required for the columnar export. Install it with: pip install pyarrow")
+
+def _arrow_type_(name, type_):
+    """Map Game field annotation to Arrow type."""
+    if name in DICTIONARY_COLUMNS:
+        return pa.dictionary(pa.int32(), pa.string())
+    if type_ is list or get_origin(type_) is list:
+        return pa.list_(pa.string())
+    return {
+        int : pa.int64(),
+        float : pa.float64(),
+        bool : pa.bool_(),
+        str : pa.string()
+    }.get(type_, pa.string())
+
+def game_schema():
+    """
+    Build Arrow schema from the Game dataclass fields.
+
+    RETURN
+    ------
+    pyarrow.Schema with Game fields in their order. Tags are list column, category and publisher
+    are dictionary-encoded.
+    """
+    _require_pyarrow_()
+    return pa.schema([pa.field(f.name, _arrow_type_(f.name, f.type)) for f in fields(Game)])
+
+def _coerce_(value, type_):
+    """Convert scraped value to the annotated type. Return None if it is not possible."""
+    if value is None or value == "":
+        return None
+    if type_ is list or get_origin(type_) is list:
+        if isinstance(value, str):
+            return [tag for tag in value.split("###") if tag]
+        return [str(tag) for tag in value]
+    try:
+        if type_ is int:
+            return int(value)
+        if type_ is float:
+            return float(value)
+    except (TypeError, ValueError):
+        return None
+    return str(value) if type_ is str else value
+
+def to_record_batch(records, schema = None):
+    """
+    Convert Game records to Arrow record batch.
+    ARGS
+    ----
+    records [list]  Game instances or dictionaries with Game fields
+    schema  [Schema]    target schema. Defaults to game_schema()
+
+    RETURN
+    ------
+    pyarrow.RecordBatch
+    """
+    schema = schema or game_schema()
+    types = {f.name : f.type for f in fields(Game)}
+    columns = {name : [] for name in types}
+    for record in records:
+        if isinstance(record, Game):
+            record = asdict(record)
+        for name, type_ in types.items():
+            columns[name].append(_coerce_(record.get(name), type_))
+    arrays = []
+    for field in schema:
+        if pa.types.is_dictionary(field.type):
+            arrays.append(pa.array(columns[field.name], pa.string()).dictionary_encode())
+        else:
+            arrays.append(pa.array(columns[field.name], field.type))
+    return pa.RecordBatch.from_arrays(arrays, schema = schema)
+
+def read_jsonl(path):
+    """Return generator of records from JSON Lines file."""
+    with open(path, encoding = 'utf-8') as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+def export_parquet(records, root, scrape_date = None, compression = "zstd", batch_size = 10000):
+    """
+    Write Game records to Parquet dataset partitioned by scrape date (root/scrape_date=YYYY-MM-DD/).
+    Existing partition for the same date is replaced.
+    ARGS
+    ----
+    records [iterable]  Game instances or dictionaries with Game fields
+    root    [str]   dataset directory
+    scrape_date [date or str]   partition value. Defaults to today
+    compression [str]   Parquet compression codec
+    batch_size  [int]   number of records converted at once
+
+    RETURN
+    ------
+    path to the written file
+    """
+    _require_pyarrow_()
+    scrape_date = str(scrape_date or datetime.date.today())
+    partition = os.path.join(root, "{}={}".format(PARTITION_COLUMN, scrape_date))
+    os.makedirs(partition, exist_ok = True)
+    path = os.path.join(partition, "games.parquet")
+    tmp_path = path + ".tmp"
+    schema = game_schema()
+    batch = []
+    with pq.ParquetWriter(tmp_path, schema, compression = compression) as writer:
+        for record in records:
+            batch.append(record)
+            if len(batch) >= batch_size:
+                writer.write_batch(to_record_batch(batch, schema))
+                batch = []
+        if batch:
+            writer.write_batch(to_record_batch(batch, schema))
+    os.replace(tmp_path, path)
+    return path
+
+def read_history(root, filters = None, columns = None):
+    """
+    Read Parquet dataset written by export_parquet.
+    ARGS
+    ----
+    root    [str]   dataset directory
+    filters [list]  pyarrow filters, e.g. [("scrape_date", ">=", "2024-01-01")]
+    columns [list]  columns to read
+
+    RETURN
+    ------
+    pyarrow.Table with scrape_date column
+    """
+    _require_pyarrow_()
+    return pq.read_table(root, filters = filters, columns = columns, partitioning = "hive")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3:
+        print("Usage: bg_export.py GAMES_JSONL OUTPUT_DIR [SCRAPE_DATE]", file = sys.stderr)
+        sys.exit(1)
+    print(export_parquet(read_jsonl(sys.argv[1]), sys.argv[2], sys.argv[3] if len(sys.argv) > 3 else None))
@@ -0,0 +1,244 @@
+#!/usr/bin/python
+###IMPORTS###
+import re
+from bs4 import BeautifulSoup as bsp
+from bs4.element import Tag
+
+
+###CONSTANTS###
+#Simple selector: tag, optional class, optional id and optional attribute condition
+SIMPLE_SELECTOR = re.compile(
+    r"^(?P<tag>[a-zA-Z][\w-]*|\*)?(?:\.(?P<cls>[\w-]+))?(?:#(?P<id>[\w-]+))?"
+    r"(?:\[(?P<attr>[\w-]+)(?:(?P<op>[\^\$\*]?=)(?P<value>[^\]]+))?\])?$"
+)
+WHITESPACE = re.compile(r"\s+")
+
+
+###CLASSES###
+class Selector():
+    """
+    Compiled CSS selector subset: tag, tag.class, tag#id, tag[attr], tag[attr=value] with =, ^=, $= and *=
+    operators, and descendant combinator (space).
+
+    ATTRS
+    -----
+    source  [str]   selector text
+    tag [str]   tag name of the rightmost part or None for any tag
+    """
+    def __init__(self, source):
+        self.source = source
+        self.__parts = []
+        for part in source.split():
+            match_ = SIMPLE_SELECTOR.match(part)
+            if match_ is None or not part:
+                raise ValueError("Unsupported selector {}.".format(source))
+            tag = match_.group("tag")
+            self.__parts.append((
+                None if tag in (None, "*") else tag.lower(), match_.group("cls"), match_.group("id"),
+                match_.group("attr"), match_.group("op"), match_.group("value")
+            ))
+        if not self.__parts:
+            raise ValueError("Empty selector.")
+        self.tag = self.__parts[-1][0]
+
+    @staticmethod
+    def _match_part_(tag, part):
+        name, cls, id_, attr, op, value = part
+        if name is not None and tag.name != name:
+            return False
+        if cls is not None and cls not in (tag.get("class") or ()):
+            return False
+        if id_ is not None and tag.get("id") != id_:
+            return False
+        if attr is not None:
+            actual = tag.get(attr)
+            if actual is None:
+                return False
+            if isinstance(actual, list):
+                actual = " ".join(actual)
+            if op == "=" and actual != value:
+                return False
+            if op == "^=" and not actual.startswith(value):
+                return False
+            if op == "$=" and not actual.endswith(value):
+                return False
+            if op == "*=" and value not in actual:
+                return False
+        return True
+
+    def match(self, tag):
+        """Return True if the tag matches the selector. Ancestors are checked only for candidate tags."""
+        if not Selector._match_part_(tag, self.__parts[-1]):
+            return False
+        remaining = len(self.__parts) - 2
+        for ancestor in tag.parents:
+            if remaining < 0:
+                break
+            if ancestor.name is not None and Selector._match_part_(ancestor, self.__parts[remaining]):
+                remaining -= 1
+        return remaining < 0
+
+
+
+class Field():
+    """
+    Compiled extraction rule of a single field.
+
+    ATTRS
+    -----
+    name    [str]   field name
+    selector    [Selector]  elements holding the value
+    index   [int]   which match is used, in document order. Ignored if many is True
+    many    [bool]  use all matches and return list
+    """
+    def __init__(self, name, select, index = 0, many = False, attr = None, post = (), join = None, default = None):
+        """
+        ARGS
+        ----
+        name    [str]   field name
+        select  [str]   CSS selector, e.g. "div.game-header-title-container h1"
+        index   [int]   which match is used, in document order
+        many    [bool]  use all matches. Values are returned as list or joined with join
+        attr    [str]   take the attribute instead of element text
+        post    [list]  post-processing steps applied to each value, in order:
+                        "strip", "squash" (collapse whitespace), "int", "float",
+                        ("re", pattern[, group]) (search and keep the group), ("sub", pattern, replacement),
+                        ("word", n) (n-th whitespace separated word).
+                        A step returning None stops processing and the value is dropped
+        join    [str]   separator joining values of many matches
+        default value used when nothing matched
+        """
+        self.name = name
+        self.selector = Selector(select)
+        self.index = index
+        self.many = many
+        self.join = join
+        self.default = default
+        self.__attr = attr
+        self.__steps = [Field._compile_step_(step) for step in post]
+
+    @staticmethod
+    def _compile_step_(step):
+        if isinstance(step, str):
+            step = (step,)
+        kind, args = step[0], step[1:]
+        if kind == "strip":
+            return str.strip
+        if kind == "squash":
+            return lambda value: WHITESPACE.sub(" ", value).strip()
+        if kind in ("int", "float"):
+            convert = int if kind == "int" else float
+            def number(value):
+                try:
+                    return convert(value)
+                except (TypeError, ValueError):
+                    return None
+            return number
+        if kind == "re":
+            pattern, group = re.compile(args[0]), args[1] if len(args) > 1 else 0
+            def search(value):
+                match_ = pattern.search(value)
+                return match_.group(group) if match_ else None
+            return search
+        if kind == "sub":
+            pattern, replacement = re.compile(args[0]), args[1]
+            return lambda value: pattern.sub(replacement, value)
+        if kind == "word":
+            n = args[0]
+            def word(value):
+                words = value.split()
+                return words[n] if -len(words) <= n < len(words) else None
+            return word
+        raise ValueError("Unknown post-processing step {}.".format(kind))
+
+    def wants(self, count):
+        """True if the next match, given number of matches so far, is used."""
+        return self.many or count == self.index
+
+    def value(self, tag):
+        """Read and post-process value of the matched element. Return None if a step rejected it."""
+        value = tag.get(self.__attr) if self.__attr else tag.get_text()
+        for step in self.__steps:
+            if value is None:
+                return None
+            value = step(value)
+        return value
+
+    def result(self, values):
+        """Build field value from the collected values."""
+        if self.many:
+            values = [value for value in values if value is not None]
+            if not values:
+                return self.default
+            return self.join.join(values) if self.join is not None else values
+        return values[0] if values and values[0] is not None else self.default
+
+
+
+class Extractor():
+    """
+    Declarative extraction spec compiled once and applied to a document in a single tree walk.
+    Fields are dispatched by tag name, so cost of a walk hardly grows with the number of fields.
+
+    ATTRS
+    -----
+    fields  [list]  compiled Field instances in spec order
+    """
+    def __init__(self, spec):
+        """
+        ARGS
+        ----
+        spec    [dict]  field name -> dictionary of Field arguments, e.g. {"title" : {"select" : "h1", "post" : ["strip"]}}
+        """
+        self.fields = [Field(name, **options) for name, options in spec.items()]
+        self.__by_tag = {}
+        self.__any_tag = []
+        for position, field in enumerate(self.fields):
+            if field.selector.tag is None:
+                self.__any_tag.append(position)
+            else:
+                self.__by_tag.setdefault(field.selector.tag, []).append(position)
+
+    def extract(self, root):
+        """
+        Extract all fields from the parsed document.
+        ARGS
+        ----
+        root    [Tag]   BeautifulSoup document or element
+
+        RETURN
+        ------
+        dictionary field name -> value
+        """
+        counts = [0] * len(self.fields)
+        values = [[] for _ in self.fields]
+        by_tag, any_tag, fields = self.__by_tag, self.__any_tag, self.fields
+        for tag in root.descendants:
+            if not isinstance(tag, Tag):
+                continue
+            candidates = by_tag.get(tag.name)
+            if candidates is None and not any_tag:
+                continue
+            for position in (candidates or ()) if not any_tag else list(candidates or ()) + any_tag:
+                field = fields[position]
+                if field.selector.match(tag):
+                    if field.wants(counts[position]):
+                        values[position].append(field.value(tag))
+                    counts[position] += 1
+        return {field.name : field.result(values[position]) for position, field in enumerate(fields)}
+
+    def extract_many(self, documents, parse = None):
+        """
+        Extract fields from many documents.
+        ARGS
+        ----
+        documents   [iterable]  parsed documents or page sources
+        parse   [callable]  function parsing page source. Defaults to BeautifulSoup with html.parser
+
+        RETURN
+        ------
+        generator of dictionaries field name -> value, in order of documents
+        """
+        parse = parse or (lambda content: bsp(content, 'html.parser'))
+        for document in documents:
+            yield self.extract(document if isinstance(document, Tag) else parse(document))
@@ -0,0 +1,274 @@
+#!/usr/bin/python
+###IMPORTS###
+import os
+import time
+import sqlite3
+import threading
+from dataclasses import asdict, is_dataclass
+
+
+###CONSTANTS###
+#Relations of a game to named entities: table of names, link table, link column
+RELATIONS = {
+    "category" : ("categories", "game_categories", "category_id"),
+    "tag" : ("tags", "game_tags", "tag_id"),
+    "publisher" : ("publishers", "game_publishers", "publisher_id")
+}
+
+
+###CLASSES###
+class GameIndex():
+    """
+    Index of games, categories, tags and publishers stored in SQLite. Link tables are keyed by
+    the entity first, so they serve as inverted category -> games, tag -> games and publisher -> games
+    lookups, and games are read in rank order without scanning the whole table.
+    Games are updated incrementally, one record at a time, as they are scraped.
+
+    ATTRS
+    -----
+    path    [str]   path to the index file
+    """
+    def __init__(self, path, commit_every = 100):
+        """
+        ARGS
+        ----
+        path    [str]   path to the index file. Parent directories are created
+        commit_every    [int]   number of updated games after which changes are committed
+        """
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok = True)
+        self.__path = path
+        self.__lock = threading.Lock()
+        self.__commit_every = commit_every
+        self.__uncommitted = 0
+        self.__db = sqlite3.connect(path, check_same_thread = False)
+        self.__db.executescript(
+            """
+            PRAGMA journal_mode = WAL;
+            CREATE TABLE IF NOT EXISTS games (
+                id INTEGER PRIMARY KEY,
+                key TEXT UNIQUE NOT NULL,
+                title TEXT,
+                release INTEGER,
+                players TEXT,
+                age TEXT,
+                time TEXT,
+                weight REAL,
+                rank INTEGER,
+                updated_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS games_rank ON games (rank);
+            CREATE INDEX IF NOT EXISTS games_title ON games (title);
+            CREATE TABLE IF NOT EXISTS categories (id INTEGER PRIMARY KEY, name TEXT UNIQUE NOT NULL);
+            CREATE TABLE IF NOT EXISTS tags (id INTEGER PRIMARY KEY, name TEXT UNIQUE NOT NULL);
+            CREATE TABLE IF NOT EXISTS publishers (id INTEGER PRIMARY KEY, name TEXT UNIQUE NOT NULL);
+            CREATE TABLE IF NOT EXISTS game_categories (
+                category_id INTEGER NOT NULL, game_id INTEGER NOT NULL, PRIMARY KEY (category_id, game_id)
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS game_tags (
+                tag_id INTEGER NOT NULL, game_id INTEGER NOT NULL, PRIMARY KEY (tag_id, game_id)
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS game_publishers (
+                publisher_id INTEGER NOT NULL, game_id INTEGER NOT NULL, PRIMARY KEY (publisher_id, game_id)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS game_categories_game ON game_categories (game_id);
+            CREATE INDEX IF NOT EXISTS game_tags_game ON game_tags (game_id);
+            CREATE INDEX IF NOT EXISTS game_publishers_game ON game_publishers (game_id);
+            """
+        )
+        self.__db.commit()
+        #Name -> id of entities, so updates do not look them up again
+        self.__ids = {relation : {} for relation in RELATIONS}
+
+    @property
+    def path(self):
+        return self.__path
+
+    def __len__(self):
+        with self.__lock:
+            return self.__db.execute("SELECT COUNT(*) FROM games").fetchone()[0]
+
+    def _entity_id_(self, relation, name):
+        """Return id of the named entity, inserting it if needed. Caller holds the lock."""
+        ids = self.__ids[relation]
+        if name not in ids:
+            table = RELATIONS[relation][0]
+            self.__db.execute("INSERT OR IGNORE INTO {} (name) VALUES (?)".format(table), (name,))
+            ids[name] = self.__db.execute("SELECT id FROM {} WHERE name = ?".format(table), (name,)).fetchone()[0]
+        return ids[name]
+
+    def add_categories(self, names):
+        """Add categories, e.g. the list scraped from the categories page. Return number of categories."""
+        with self.__lock:
+            for name in names:
+                name = name.strip()
+                if name:
+                    self._entity_id_("category", name)
+            self.__db.commit()
+            return self.__db.execute("SELECT COUNT(*) FROM categories").fetchone()[0]
+
+    def update(self, key, record, rank = None):
+        """
+        Insert or replace game and its relations.
+        ARGS
+        ----
+        key [str]   game key, e.g. its link
+        record  [dict or Game]  game record
+        rank    [int]   position of the game in the ranking. If None then the stored rank is kept
+        """
+        if is_dataclass(record):
+            record = asdict(record)
+        names = {
+            "category" : [record.get("category")],
+            "tag" : record.get("tags") or [],
+            "publisher" : [record.get("publisher")]
+        }
+        with self.__lock:
+            self.__db.execute(
+                """
+                INSERT INTO games (key, title, release, players, age, time, weight, rank, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (key) DO UPDATE SET
+                    title = excluded.title, release = excluded.release, players = excluded.players,
+                    age = excluded.age, time = excluded.time, weight = excluded.weight,
+                    rank = COALESCE(excluded.rank, games.rank), updated_at = excluded.updated_at
+                """,
+                (
+                    key, record.get("title"), record.get("release"), record.get("players"), record.get("age"),
+                    record.get("time"), record.get("weight"), rank, time.time()
+                )
+            )
+            game_id = self.__db.execute("SELECT id FROM games WHERE key = ?", (key,)).fetchone()[0]
+            for relation, (_, link_table, column) in RELATIONS.items():
+                self.__db.execute("DELETE FROM {} WHERE game_id = ?".format(link_table), (game_id,))
+                ids = {self._entity_id_(relation, name) for name in names[relation] if name}
+                self.__db.executemany(
+                    "INSERT INTO {} ({}, game_id) VALUES (?, ?)".format(link_table, column),
+                    [(id_, game_id) for id_ in ids]
+                )
+            self.__uncommitted += 1
+            if self.__uncommitted >= self.__commit_every:
+                self.__db.commit()
+                self.__uncommitted = 0
+
+    def remove(self, key):
+        """Remove game and its relations. Return True if the game was indexed."""
+        with self.__lock:
+            row = self.__db.execute("SELECT id FROM games WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return False
+            for _, link_table, _ in RELATIONS.values():
+                self.__db.execute("DELETE FROM {} WHERE game_id = ?".format(link_table), row)
+            self.__db.execute("DELETE FROM games WHERE id = ?", row)
+            self.__uncommitted += 1
+            return True
+
+    def retain(self, ranks):
+        """
+        Match the index with the ranking of a finished run. Games missing from the ranking are removed,
+        ranks of the others are set from it.
+        ARGS
+        ----
+        ranks   [dict]  key -> rank of every game of the run
+
+        RETURN
+        ------
+        number of removed games
+        """
+        with self.__lock:
+            stored = self.__db.execute("SELECT id, key, rank FROM games").fetchall()
+            removed = [(id_,) for id_, key, _ in stored if key not in ranks]
+            for _, link_table, _ in RELATIONS.values():
+                self.__db.executemany("DELETE FROM {} WHERE game_id = ?".format(link_table), removed)
+            self.__db.executemany("DELETE FROM games WHERE id = ?", removed)
+            self.__db.executemany(
+                "UPDATE games SET rank = ? WHERE id = ?",
+                [(ranks[key], id_) for id_, key, rank in stored if key in ranks and rank != ranks[key]]
+            )
+            self.__db.commit()
+            self.__uncommitted = 0
+            return len(removed)
+
+    def commit(self):
+        with self.__lock:
+            self.__db.commit()
+            self.__uncommitted = 0
+
+    def games(self, category = None, tags = (), publisher = None, limit = None):
+        """
+        Find games in rank order, e.g. top-ranked games in category X with tag Y.
+        ARGS
+        ----
+        category    [str]   category name
+        tags    [iterable]  tag names, games must have all of them
+        publisher   [str]   publisher name
+        limit   [int]   max number of games
+
+        RETURN
+        ------
+        list of dictionaries with key, title, release, rank and weight. Unranked games come last
+        """
+        filters = [("category", category), ("publisher", publisher)] + [("tag", tag) for tag in tags]
+        query = ["SELECT g.key, g.title, g.release, g.rank, g.weight FROM games g"]
+        args = []
+        for number, (relation, name) in enumerate(filter(lambda f: f[1] is not None, filters)):
+            table, link_table, column = RELATIONS[relation]
+            query.append(
+                "JOIN {link} l{n} ON l{n}.game_id = g.id AND l{n}.{column} = (SELECT id FROM {table} WHERE name = ?)".format(
+                    link = link_table, n = number, column = column, table = table
+                )
+            )
+            args.append(name)
+        query.append("ORDER BY g.rank IS NULL, g.rank, g.title")
+        if limit is not None:
+            query.append("LIMIT ?")
+            args.append(limit)
+        with self.__lock:
+            cursor = self.__db.execute(" ".join(query), args)
+            columns = [column[0] for column in cursor.description]
+            return [dict(zip(columns, row)) for row in cursor]
+
+    def counts(self, relation):
+        """
+        Return number of games per category, tag or publisher.
+        ARGS
+        ----
+        relation    [str]   "category", "tag" or "publisher"
+
+        RETURN
+        ------
+        dictionary name -> number of games, entities without games included
+        """
+        table, link_table, column = RELATIONS[relation]
+        with self.__lock:
+            return dict(self.__db.execute(
+                "SELECT t.name, COUNT(l.game_id) FROM {} t LEFT JOIN {} l ON l.{} = t.id GROUP BY t.id ORDER BY t.name".format(
+                    table, link_table, column
+                )
+            ))
+
+    def close(self):
+        with self.__lock:
+            self.__db.commit()
+            self.__db.close()
+
+
+###FUNCTIONS###
+def index_games(games, index, ranks = None):
+    """
+    Update the index with games as they pass.
+    ARGS
+    ----
+    games   [iterable]  (key, Game or dict) tuples
+    index   [GameIndex] index of games
+    ranks   [dict]  key -> rank of the game
+
+    RETURN
+    ------
+    generator of the same (key, game) tuples
+    """
+    ranks = ranks or {}
+    for key, game in games:
+        index.update(key, game, ranks.get(key))
+        yield key, game
+    index.commit()
@@ -0,0 +1,176 @@
+#!/usr/bin/python
+###IMPORTS###
+import os
+import json
+import time
+import sqlite3
+import threading
+
+
+###CLASSES###
+class CrawlJournal():
+    """
+    Checkpoint journal of a crawl stored in SQLite. It records discovered games links,
+    completed and failed game pages and extracted Game records, so a restarted crawl
+    skips work which is already done.
+
+    ATTRS
+    -----
+    path    [str]   path to the journal file
+    """
+    PENDING = "pending"
+    DONE = "done"
+    FAILED = "failed"
+
+    def __init__(self, path):
+        """
+        ARGS
+        ----
+        path    [str]   path to the journal file. Parent directories are created
+        """
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok = True)
+        self.__path = path
+        self.__lock = threading.Lock()
+        self.__db = sqlite3.connect(path, check_same_thread = False)
+        self.__db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+            CREATE TABLE IF NOT EXISTS links (
+                link TEXT PRIMARY KEY,
+                rank INTEGER NOT NULL,
+                status TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                error TEXT,
+                updated_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS links_status ON links (status, rank);
+            CREATE TABLE IF NOT EXISTS records (link TEXT PRIMARY KEY, record TEXT NOT NULL);
+            """
+        )
+        self.__db.commit()
+
+    @property
+    def path(self):
+        return self.__path
+
+    def get_meta(self, key, default = None):
+        with self.__lock:
+            row = self.__db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def set_meta(self, key, value):
+        with self.__lock:
+            self.__db.execute("INSERT OR REPLACE INTO meta VALUES (?, ?)", (key, json.dumps(value)))
+            self.__db.commit()
+
+    @property
+    def links_complete(self):
+        """True if the list crawl finished and all games links are recorded."""
+        return bool(self.get_meta("links_complete", False))
+
+    def add_links(self, links, complete = False):
+        """
+        Record discovered games links in rank order. Already known links keep their status.
+        ARGS
+        ----
+        links   [iterable]  games links
+        complete    [bool]  mark list crawl as finished
+        """
+        now = time.time()
+        with self.__lock:
+            rank = self.__db.execute("SELECT COALESCE(MAX(rank), 0) FROM links").fetchone()[0]
+            for rank, link in enumerate(links, start = rank + 1):
+                self.__db.execute(
+                    "INSERT OR IGNORE INTO links (link, rank, status, updated_at) VALUES (?, ?, ?, ?)",
+                    (link, rank, CrawlJournal.PENDING, now)
+                )
+            if complete:
+                self.__db.execute("INSERT OR REPLACE INTO meta VALUES ('links_complete', 'true')")
+            self.__db.commit()
+
+    def links(self):
+        """Return all recorded links in rank order."""
+        with self.__lock:
+            return [row[0] for row in self.__db.execute("SELECT link FROM links ORDER BY rank")]
+
+    def pending_links(self, retry_failed = True, max_attempts = None):
+        """
+        Return links which still have to be scraped, in rank order.
+        ARGS
+        ----
+        retry_failed    [bool]  include links which failed before
+        max_attempts    [int]   skip failed links with at least that many attempts
+
+        RETURN
+        ------
+        list of links
+        """
+        statuses = (CrawlJournal.PENDING, CrawlJournal.FAILED) if retry_failed else (CrawlJournal.PENDING,)
+        query = "SELECT link FROM links WHERE status IN ({})".format(",".join("?" * len(statuses)))
+        args = list(statuses)
+        if max_attempts is not None:
+            query += " AND attempts < ?"
+            args.append(max_attempts)
+        with self.__lock:
+            return [row[0] for row in self.__db.execute(query + " ORDER BY rank", args)]
+
+    def finished(self, max_attempts = None):
+        """True if the list crawl finished and no link is pending or can be retried."""
+        return self.links_complete and not self.pending_links(max_attempts = max_attempts)
+
+    def mark_done(self, link, record = None):
+        """
+        Mark link as completed and save its extracted record.
+        ARGS
+        ----
+        link    [str]   game link
+        record  [dict]  extracted Game record as dictionary
+        """
+        self.mark_done_many([(link, record)])
+
+    def mark_done_many(self, items):
+        """Mark links as completed in a single transaction. Items are (link, record) tuples, record may be None."""
+        now = time.time()
+        with self.__lock:
+            for link, record in items:
+                self.__db.execute(
+                    "UPDATE links SET status = ?, attempts = attempts + 1, error = NULL, updated_at = ? WHERE link = ?",
+                    (CrawlJournal.DONE, now, link)
+                )
+                if record is not None:
+                    self.__db.execute("INSERT OR REPLACE INTO records VALUES (?, ?)", (link, json.dumps(record)))
+            self.__db.commit()
+
+    def mark_failed(self, link, error):
+        """Mark link as failed with the error message."""
+        with self.__lock:
+            self.__db.execute(
+                "UPDATE links SET status = ?, attempts = attempts + 1, error = ?, updated_at = ? WHERE link = ?",
+                (CrawlJournal.FAILED, str(error), time.time(), link)
+            )
+            self.__db.commit()
+
+    def records(self):
+        """Return generator of (link, record) tuples in rank order."""
+        with self.__lock:
+            rows = self.__db.execute(
+                "SELECT records.link, record FROM records JOIN links USING (link) ORDER BY rank"
+            ).fetchall()
+        for link, record in rows:
+            yield link, json.loads(record)
+
+    def counts(self):
+        """Return dictionary status -> number of links."""
+        with self.__lock:
+            return dict(self.__db.execute("SELECT status, COUNT(*) FROM links GROUP BY status").fetchall())
+
+    def reset(self):
+        """Forget all links and records to start a new crawl."""
+        with self.__lock:
+            self.__db.executescript("DELETE FROM links; DELETE FROM records; DELETE FROM meta;")
+            self.__db.commit()
+
+    def close(self):
+        with self.__lock:
+            self.__db.close()
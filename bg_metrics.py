@@ -0,0 +1,179 @@
+#!/usr/bin/python
+###IMPORTS###
+import os
+import json
+import time
+import bisect
+import threading
+from contextlib import contextmanager
+
+
+###CONSTANTS###
+SECONDS_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+BYTES_BUCKETS = (1024, 10 * 1024, 100 * 1024, 1024 ** 2, 10 * 1024 ** 2)
+PREFIX = "bgg_"
+
+
+###CLASSES###
+class Histogram():
+    """
+    Cumulative histogram with fixed upper bounds, in the Prometheus style.
+
+    ATTRS
+    -----
+    buckets [tuple] upper bounds of buckets. The +Inf bucket is implicit
+    counts  [list]  number of observations per bucket (not cumulative), last one is +Inf
+    count   [int]   number of observations
+    sum     [float] sum of observed values
+    """
+    __slots__ = ("buckets", "counts", "count", "sum", "min", "max")
+
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def to_dict(self):
+        cumulative = 0
+        buckets = {}
+        for bound, count in zip(self.buckets + ("+Inf",), self.counts):
+            cumulative += count
+            buckets[str(bound)] = cumulative
+        return {"count" : self.count, "sum" : self.sum, "min" : self.min, "max" : self.max, "buckets" : buckets}
+
+
+
+class Metrics():
+    """
+    Thread-safe registry of run metrics: histograms of time and bytes per stage and counters.
+    Metrics are identified by name and label values.
+    """
+    def __init__(self):
+        self.__lock = threading.Lock()
+        self.__histograms = {}
+        self.__counters = {}
+        self.__started = time.time()
+
+    @staticmethod
+    def _key_(name, labels):
+        return name, tuple(sorted(labels.items()))
+
+    def observe(self, name, value, buckets = SECONDS_BUCKETS, **labels):
+        """Add observation to the histogram with given name and labels."""
+        key = Metrics._key_(name, labels)
+        with self.__lock:
+            histogram = self.__histograms.get(key)
+            if histogram is None:
+                histogram = self.__histograms[key] = Histogram(buckets)
+            histogram.observe(value)
+
+    def inc(self, name, value = 1, **labels):
+        """Increase counter with given name and labels."""
+        key = Metrics._key_(name, labels)
+        with self.__lock:
+            self.__counters[key] = self.__counters.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        """Set counter to the value, e.g. totals collected by other components."""
+        with self.__lock:
+            self.__counters[Metrics._key_(name, labels)] = value
+
+    @contextmanager
+    def timer(self, stage, **labels):
+        """Measure time spent in the with block as stage_seconds{stage=...}."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe("stage_seconds", time.perf_counter() - start, stage = stage, **labels)
+
+    def histogram(self, name, **labels):
+        """Return histogram or None if nothing was observed."""
+        with self.__lock:
+            return self.__histograms.get(Metrics._key_(name, labels))
+
+    def counter(self, name, **labels):
+        with self.__lock:
+            return self.__counters.get(Metrics._key_(name, labels), 0)
+
+    def reset(self):
+        with self.__lock:
+            self.__histograms = {}
+            self.__counters = {}
+            self.__started = time.time()
+
+    def to_dict(self):
+        """Return metrics as JSON serializable dictionary."""
+        with self.__lock:
+            return {
+                "started" : self.__started,
+                "finished" : time.time(),
+                "histograms" : [
+                    dict(name = name, labels = dict(labels), **histogram.to_dict())
+                    for (name, labels), histogram in sorted(self.__histograms.items())
+                ],
+                "counters" : [
+                    {"name" : name, "labels" : dict(labels), "value" : value}
+                    for (name, labels), value in sorted(self.__counters.items())
+                ]
+            }
+
+    def to_prometheus(self):
+        """Return metrics in the Prometheus text exposition format."""
+        def labels_text(labels, extra = ()):
+            pairs = list(labels) + list(extra)
+            if not pairs:
+                return ""
+            return "{" + ",".join('{}="{}"'.format(key, str(value).replace('"', '\\"')) for key, value in pairs) + "}"
+        lines = []
+        with self.__lock:
+            typed = set()
+            for (name, labels), histogram in sorted(self.__histograms.items()):
+                metric = PREFIX + name
+                if metric not in typed:
+                    lines.append("# TYPE {} histogram".format(metric))
+                    typed.add(metric)
+                cumulative = 0
+                for bound, count in zip(histogram.buckets + ("+Inf",), histogram.counts):
+                    cumulative += count
+                    lines.append("{}_bucket{} {}".format(metric, labels_text(labels, [("le", bound)]), cumulative))
+                lines.append("{}_sum{} {}".format(metric, labels_text(labels), histogram.sum))
+                lines.append("{}_count{} {}".format(metric, labels_text(labels), histogram.count))
+            for (name, labels), value in sorted(self.__counters.items()):
+                #Scrapers and recording rules expect counters named with _total suffix
+                metric = PREFIX + name if name.endswith("_total") else PREFIX + name + "_total"
+                if metric not in typed:
+                    lines.append("# TYPE {} counter".format(metric))
+                    typed.add(metric)
+                lines.append("{}{} {}".format(metric, labels_text(labels), value))
+        return "\n".join(lines) + "\n"
+
+    def export(self, path):
+        """
+        Write metrics to the file. Files with .prom extension get Prometheus textfile format, others JSON.
+        File is replaced atomically so collectors never read partial data.
+        """
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok = True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as f:
+            if path.endswith(".prom"):
+                f.write(self.to_prometheus())
+            else:
+                json.dump(self.to_dict(), f, indent = 2)
+        os.replace(tmp_path, path)
+
+
+###VARIABLES###
+#Registry shared by the scraping pipeline
+METRICS = Metrics()
@@ -0,0 +1,177 @@
+#!/usr/bin/python
+###IMPORTS###
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+
+###CONSTANTS###
+#Upper bounds of median warehouse price for the borrow price buckets
+BORROW_THRESHOLDS = np.array([40.00, 80.00, 120.00, 180.00, 250.00])
+#Borrow price for each bucket. Games priced above the last threshold are not borrowed
+BORROW_PRICES = np.array([5, 10, 15, 20, 30])
+#Share of standard deviation added to median sell price
+SELL_SD_FACTOR = 0.5
+
+
+###CLASSES###
+class RaggedPrices():
+    """
+    Offer prices of many games stored as one flat array with offsets.
+    Prices of game i are values[offsets[i]:offsets[i + 1]].
+
+    ATTRS
+    -----
+    values  [ndarray]   flat float64 array of all offer prices
+    offsets [ndarray]   int64 array of length number of games + 1
+    """
+    def __init__(self, values, offsets):
+        self.values = np.asarray(values, dtype = np.float64)
+        self.offsets = np.asarray(offsets, dtype = np.int64)
+        if self.offsets.ndim != 1 or len(self.offsets) == 0 or self.offsets[0] != 0 or self.offsets[-1] != len(self.values):
+            raise ValueError("Offsets have to start with 0 and end with the number of prices.")
+        if np.any(np.diff(self.offsets) < 0):
+            raise ValueError("Offsets have to be non-decreasing.")
+
+    @classmethod
+    def from_lists(cls, offers):
+        """Build ragged array from list of price lists, one list per game."""
+        counts = np.fromiter((len(prices) for prices in offers), dtype = np.int64, count = len(offers))
+        offsets = np.zeros(len(offers) + 1, dtype = np.int64)
+        np.cumsum(counts, out = offsets[1:])
+        values = np.fromiter((price for prices in offers for price in prices), dtype = np.float64, count = int(offsets[-1]))
+        return cls(values, offsets)
+
+    @property
+    def counts(self):
+        return np.diff(self.offsets)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+
+
+###FUNCTIONS###
+def parse_prices(texts):
+    """
+    Convert scraped price strings like "129,99" or "1 299,00 zł" to floats.
+    ARGS
+    ----
+    texts   [list]  price strings
+
+    RETURN
+    ------
+    float64 ndarray. Unparsable prices are NaN.
+    """
+    series = pd.Series(texts, dtype = object).astype(str)
+    series = series.str.replace(r"[^\d,.]", "", regex = True).str.replace(",", ".", regex = False)
+    return pd.to_numeric(series, errors = "coerce").to_numpy(dtype = np.float64)
+
+def _sort_within_games_(games, values, starts, counts):
+    """
+    Sort prices within each game. Games are contiguous in the input.
+    Prices are padded to a games x max offers matrix and sorted along rows, unless offers counts
+    are so skewed that the matrix would be much bigger than the data.
+    """
+    width = int(counts.max())
+    if len(counts) * width <= 4 * len(values) + 1024:
+        position = np.arange(len(values)) - starts[games]
+        matrix = np.full((len(counts), width), np.inf)
+        matrix[games, position] = values
+        matrix.sort(axis = 1)
+        return matrix[games, position]
+    order = np.argsort(values)
+    order = order[np.argsort(games[order], kind = "stable")]
+    return values[order]
+
+def price_games(prices):
+    """
+    Compute warehouse, sell and borrow prices for all games at once.
+    ARGS
+    ----
+    prices  [RaggedPrices or list]  offer prices of games. NaN offers are ignored
+
+    RETURN
+    ------
+    pandas.DataFrame with columns offers, price_warehouse (median), price_sd (population standard deviation),
+    price_sell and price_borrow. Games without offers have missing prices.
+    """
+    if not isinstance(prices, RaggedPrices):
+        prices = RaggedPrices.from_lists(prices)
+    n = len(prices)
+    games = np.repeat(np.arange(n), prices.counts)
+    values = prices.values
+    valid = ~np.isnan(values)
+    games, values = games[valid], values[valid]
+    counts = np.bincount(games, minlength = n)
+    has_offers = counts > 0
+
+    #Median: sort prices within games and pick middle elements
+    starts = np.zeros(n, dtype = np.int64)
+    np.cumsum(counts[:-1], out = starts[1:])
+    median = np.full(n, np.nan)
+    if len(values):
+        values = _sort_within_games_(games, values, starts, counts)
+        low = (starts + (counts - 1) // 2)[has_offers]
+        high = (starts + counts // 2)[has_offers]
+        median[has_offers] = (values[low] + values[high]) / 2
+
+    #Population standard deviation in two passes for numerical stability
+    with np.errstate(invalid = "ignore", divide = "ignore"):
+        mean = np.bincount(games, weights = values, minlength = n) / counts
+        sd = np.sqrt(np.bincount(games, weights = (values - mean[games]) ** 2, minlength = n) / counts)
+
+    #Bucket i holds medians in [threshold i-1, threshold i), the last one is not borrowed
+    bucket = np.searchsorted(BORROW_THRESHOLDS, median, side = "right")
+    borrowed = has_offers & (bucket < len(BORROW_PRICES))
+    borrow = pd.array(np.zeros(n, dtype = np.int64), dtype = "Int64")
+    borrow[borrowed] = BORROW_PRICES[bucket[borrowed]]
+    borrow[~borrowed] = pd.NA
+    return pd.DataFrame({
+        "offers" : counts,
+        "price_warehouse" : median,
+        "price_sd" : sd,
+        "price_sell" : median + SELL_SD_FACTOR * sd,
+        "price_borrow" : borrow
+    })
+
+def price_games_loop(offers):
+    """
+    Reference implementation following the legacy per-game loop. Used to validate and benchmark price_games.
+    """
+    rows = []
+    for prices in offers:
+        prices = sorted(p for p in prices if not np.isnan(p))
+        if not prices:
+            rows.append((0, np.nan, np.nan, np.nan, pd.NA))
+            continue
+        if len(prices) % 2:
+            med = prices[len(prices) // 2]
+        else:
+            med = (prices[len(prices) // 2] + prices[len(prices) // 2 - 1]) / 2
+        sd = float(np.std(prices))
+        conds = [med < 40.00, med < 80.00, med < 120.00, med < 180.00, med < 250.00, med >= 250.00]
+        borrow = int(np.select(conds, [5, 10, 15, 20, 30, 10000]))
+        rows.append((len(prices), med, sd, med + SELL_SD_FACTOR * sd, borrow if borrow != 10000 else pd.NA))
+    frame = pd.DataFrame(rows, columns = ["offers", "price_warehouse", "price_sd", "price_sell", "price_borrow"])
+    frame["price_borrow"] = frame["price_borrow"].astype("Int64")
+    return frame
+
+def benchmark(n = 20000, seed = 0):
+    """Compare vectorized pricing with the per-game loop. Return times in seconds."""
+    rng = np.random.default_rng(seed)
+    counts = rng.integers(0, 30, size = n)
+    offers = [list(rng.uniform(10, 400, size = count)) for count in counts]
+    ragged = RaggedPrices.from_lists(offers)
+    start = time.perf_counter()
+    price_games(ragged)
+    vectorized = time.perf_counter() - start
+    start = time.perf_counter()
+    price_games_loop(offers)
+    loop = time.perf_counter() - start
+    return {"games" : n, "vectorized" : vectorized, "loop" : loop}
+
+
+if __name__ == "__main__":
+    print(benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 20000))
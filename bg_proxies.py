@@ -0,0 +1,285 @@
+#!/usr/bin/python
+###IMPORTS###
+import sys
+import time
+import threading
+from collections import deque
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from bg_metrics import METRICS
+from bg_ratelimit import LimitedAdapter, THROTTLE_STATUSES, parse_retry_after
+
+
+###CONSTANTS###
+#Statuses meaning that the target refuses the proxy
+BAN_STATUSES = (403, 407)
+
+
+###CLASSES###
+class ProxyStats():
+    """
+    Health of a single proxy.
+
+    ATTRS
+    -----
+    proxy   [str]   proxy URL
+    requests    [int]   number of reported requests
+    latency [float] exponentially weighted mean latency in seconds. None before the first success
+    outcomes    [deque] 1 for failed and 0 for successful requests in the last window
+    in_use  [int]   number of leases holding the proxy
+    banned_until    [float] monotonic time until which proxy is not assigned
+    removed [bool]  proxy was dropped from the pool
+    """
+    __slots__ = ("proxy", "requests", "latency", "outcomes", "in_use", "banned_until", "removed")
+
+    def __init__(self, proxy, window):
+        self.proxy = proxy
+        self.requests = 0
+        self.latency = None
+        self.outcomes = deque(maxlen = window)
+        self.in_use = 0
+        self.banned_until = 0.0
+        self.removed = False
+
+    @property
+    def failure_rate(self):
+        return sum(self.outcomes) / len(self.outcomes) if self.outcomes else 0.0
+
+    def score(self):
+        """Lower is better. Untested proxies are tried first."""
+        return (self.latency or 0.0) * (1 + 4 * self.failure_rate)
+
+
+
+class ProxyPool():
+    """
+    Pool of proxies shared by sessions and browser drivers. Proxies are scored by latency and
+    failure rate; throttled proxies are banned for a while, slow or failing ones are removed.
+
+    ATTRS
+    -----
+    rotate_every    [int]   number of requests after which a lease switches to another proxy
+    """
+    def __init__(self, proxies, rotate_every = 50, max_latency = 10.0, max_failure_rate = 0.5,
+            min_requests = 5, ban_time = 300.0, alpha = 0.3, window = 20):
+        """
+        ARGS
+        ----
+        proxies [list]  proxy URLs, e.g. ["http://10.0.0.1:3128"]
+        rotate_every    [int]   requests served through a proxy before its lease rotates
+        max_latency [float] proxies with higher mean latency in seconds are removed
+        max_failure_rate    [float] proxies with higher share of failed requests are removed
+        min_requests    [int]   number of requests in the window before a proxy can be removed
+        ban_time    [float] seconds a throttled proxy is not assigned, unless Retry-After says otherwise
+        alpha   [float] weight of the newest latency in the mean
+        window  [int]   number of last requests used for the failure rate
+        """
+        proxies = [proxy.strip() for proxy in proxies if proxy and proxy.strip()]
+        if not proxies:
+            raise ValueError("Proxy pool needs at least one proxy.")
+        self.rotate_every = rotate_every
+        self.max_latency = max_latency
+        self.max_failure_rate = max_failure_rate
+        self.min_requests = min_requests
+        self.ban_time = ban_time
+        self.alpha = alpha
+        self.__stats = {proxy : ProxyStats(proxy, window) for proxy in dict.fromkeys(proxies)}
+        self.__condition = threading.Condition()
+
+    def __len__(self):
+        return len(self.healthy())
+
+    def stats(self, proxy):
+        return self.__stats[proxy]
+
+    def healthy(self):
+        """Return proxies which were not removed, including temporarily banned ones."""
+        with self.__condition:
+            return [stats.proxy for stats in self.__stats.values() if not stats.removed]
+
+    def acquire(self, exclude = ()):
+        """
+        Assign the best available proxy. Waits if all remaining proxies are banned.
+        ARGS
+        ----
+        exclude [iterable]  proxies which should not be assigned unless there is no other choice
+
+        RETURN
+        ------
+        proxy URL
+        """
+        with self.__condition:
+            while True:
+                alive = [stats for stats in self.__stats.values() if not stats.removed]
+                if not alive:
+                    raise RuntimeError("No healthy proxies left in the pool.")
+                now = time.monotonic()
+                free = [stats for stats in alive if stats.banned_until <= now]
+                if free:
+                    preferred = [stats for stats in free if stats.proxy not in exclude] or free
+                    best = min(preferred, key = lambda stats: (stats.in_use, stats.score()))
+                    best.in_use += 1
+                    return best.proxy
+                self.__condition.wait(min(stats.banned_until for stats in alive) - now)
+
+    def release(self, proxy):
+        with self.__condition:
+            self.__stats[proxy].in_use -= 1
+            self.__condition.notify_all()
+
+    def record(self, proxy, latency = None, error = False, throttled = False, retry_after = None):
+        """
+        Record outcome of a request sent through the proxy.
+        ARGS
+        ----
+        proxy   [str]   proxy URL
+        latency [float] request time in seconds of successful requests
+        error   [bool]  connection through the proxy failed or target refused the proxy
+        throttled   [bool]  target answered 429 or 503
+        retry_after [float] seconds from Retry-After header
+        """
+        with self.__condition:
+            stats = self.__stats[proxy]
+            stats.requests += 1
+            #Throttling is temporary and handled by the ban, only errors count towards removal
+            stats.outcomes.append(1 if error else 0)
+            if latency is not None and not error:
+                stats.latency = latency if stats.latency is None else self.alpha * latency + (1 - self.alpha) * stats.latency
+            if throttled:
+                stats.banned_until = time.monotonic() + (retry_after if retry_after is not None else self.ban_time)
+            if not stats.removed and len(stats.outcomes) >= self.min_requests and (
+                    stats.failure_rate > self.max_failure_rate or (stats.latency or 0.0) > self.max_latency):
+                stats.removed = True
+                METRICS.inc("proxies_removed")
+                print("Proxy {} removed: failure rate {:.0%}, latency {:.2f}s".format(
+                    proxy, stats.failure_rate, stats.latency or 0.0), file = sys.stderr)
+            self.__condition.notify_all()
+        METRICS.inc("proxy_requests", proxy = proxy, outcome = "error" if error else "throttled" if throttled else "ok")
+
+    def lease(self, exclude = ()):
+        """Return ProxyLease holding the best available proxy."""
+        return ProxyLease(self, self.acquire(exclude))
+
+    def report(self, file = sys.stderr):
+        """Print health of all proxies."""
+        with self.__condition:
+            rows = [(s.proxy, s.requests, s.failure_rate, s.latency, s.removed) for s in self.__stats.values()]
+        for proxy, requests_, failure_rate, latency, removed in rows:
+            print("Proxy {}: {} requests, failure rate {:.0%}, latency {}{}".format(
+                proxy, requests_, failure_rate, "{:.2f}s".format(latency) if latency is not None else "-",
+                ", removed" if removed else ""), file = file)
+
+
+
+class ProxyLease():
+    """
+    Proxy assigned to a single session thread or driver. Lease expires after rotate_every requests,
+    after an error and when the proxy is removed or banned.
+
+    ATTRS
+    -----
+    proxy   [str]   assigned proxy URL
+    requests    [int]   number of requests sent through the lease
+    """
+    def __init__(self, pool, proxy):
+        self.__pool = pool
+        self.proxy = proxy
+        self.requests = 0
+        self.__failed = False
+        self.__released = False
+
+    @property
+    def expired(self):
+        stats = self.__pool.stats(self.proxy)
+        return (self.__failed or self.requests >= self.__pool.rotate_every or stats.removed
+            or stats.banned_until > time.monotonic())
+
+    def record(self, latency = None, error = False, throttled = False, retry_after = None):
+        """Report outcome of a request to the pool."""
+        self.requests += 1
+        self.__failed = self.__failed or error or throttled
+        self.__pool.record(self.proxy, latency, error, throttled, retry_after)
+
+    def release(self):
+        if not self.__released:
+            self.__released = True
+            self.__pool.release(self.proxy)
+
+    def renew(self):
+        """Release the proxy and return lease of another one."""
+        self.release()
+        return self.__pool.lease(exclude = (self.proxy,))
+
+
+
+class ProxyAdapter(HTTPAdapter):
+    """
+    HTTP adapter sending requests through the proxy pool. Each thread holds its own lease, which
+    rotates by request count or after errors. Requests which failed through a proxy are repeated
+    through another one.
+
+    ATTRS
+    -----
+    proxy_pool  [ProxyPool] shared proxy pool
+    switch_retries  [int]   number of retries through other proxies. If None then each healthy proxy is tried once
+    """
+    def __init__(self, proxy_pool, switch_retries = None, **kwargs):
+        self.proxy_pool = proxy_pool
+        self.switch_retries = switch_retries
+        self.__local = threading.local()
+        #Current lease of each thread, renewed leases are released by renew
+        self.__leases = {}
+        self.__lock = threading.Lock()
+        super().__init__(**kwargs)
+
+    def _lease_(self):
+        lease = getattr(self.__local, "lease", None)
+        if lease is not None and not lease.expired:
+            return lease
+        lease = self.proxy_pool.lease() if lease is None else lease.renew()
+        self.__local.lease = lease
+        with self.__lock:
+            self.__leases[threading.get_ident()] = lease
+        return lease
+
+    def send(self, request, **kwargs):
+        attempts = self.switch_retries + 1 if self.switch_retries is not None else max(1, len(self.proxy_pool))
+        for attempt in range(attempts):
+            lease = self._lease_()
+            kwargs["proxies"] = {"http" : lease.proxy, "https" : lease.proxy}
+            start = time.monotonic()
+            try:
+                response = super().send(request, **kwargs)
+            except (requests.exceptions.ProxyError, requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                lease.record(error = True)
+                if attempt == attempts - 1:
+                    raise
+                continue
+            throttled = response.status_code in THROTTLE_STATUSES
+            banned = response.status_code in BAN_STATUSES
+            lease.record(
+                time.monotonic() - start, error = banned, throttled = throttled,
+                retry_after = parse_retry_after(response.headers.get("Retry-After")) if throttled else None
+            )
+            if not (throttled or banned) or attempt == attempts - 1:
+                return response
+            response.close()
+        return response
+
+    def close(self):
+        with self.__lock:
+            leases, self.__leases = self.__leases, {}
+        for lease in leases.values():
+            lease.release()
+        super().close()
+
+
+
+class LimitedProxyAdapter(ProxyAdapter, LimitedAdapter):
+    """
+    Proxy adapter with the adaptive rate limiter. Limits are kept per host and proxy, so a throttled
+    proxy does not slow down the others.
+    """
+    pass
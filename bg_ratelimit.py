@@ -0,0 +1,249 @@
+#!/usr/bin/python
+###IMPORTS###
+import sys
+import time
+import threading
+import email.utils
+from collections import deque
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+from requests.adapters import HTTPAdapter
+
+from bg_metrics import METRICS
+
+
+###CONSTANTS###
+THROTTLE_STATUSES = (429, 503)
+
+
+###CLASSES###
+class HostLimiter():
+    """
+    Adaptive limiter of requests to a single host. Combines token bucket (request rate) with
+    concurrency limit, both tuned with AIMD: additive increase after fast successful requests,
+    multiplicative decrease after throttling, errors or slow responses. Retry-After blocks the host.
+
+    ATTRS
+    -----
+    host    [str]   host name
+    rate    [float] current rate in requests per second
+    concurrency [float] current max number of requests in flight
+    in_flight   [int]   number of requests in flight
+    blocked_until   [float] monotonic time until which no request is started
+    """
+    def __init__(self, host, rate = 2.0, burst = 4, concurrency = 4, min_rate = 0.1, max_rate = 50.0,
+            min_concurrency = 1, max_concurrency = 32, target_latency = 2.0, backoff = 1.0, window = 50):
+        """
+        ARGS
+        ----
+        host    [str]   host name
+        rate    [float] initial rate in requests per second
+        burst   [int]   token bucket capacity
+        concurrency [int]   initial concurrency limit
+        min_rate, max_rate  [float] bounds of the rate
+        min_concurrency, max_concurrency    [int]   bounds of the concurrency limit
+        target_latency  [float] latency in seconds above which the limits are decreased
+        backoff [float] seconds the host is blocked after throttling without Retry-After
+        window  [int]   number of last requests used for the error rate
+        """
+        self.host = host
+        self.rate = float(rate)
+        self.burst = burst
+        self.concurrency = float(concurrency)
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+        self.target_latency = target_latency
+        self.backoff = backoff
+        self.in_flight = 0
+        self.blocked_until = 0.0
+        self.__decreased_at = 0.0
+        self.__tokens = float(burst)
+        self.__refilled = time.monotonic()
+        self.__outcomes = deque(maxlen = window)
+        self.__condition = threading.Condition()
+
+    @property
+    def error_rate(self):
+        """Share of throttled or failed requests among the last window of requests."""
+        with self.__condition:
+            return sum(self.__outcomes) / len(self.__outcomes) if self.__outcomes else 0.0
+
+    def _refill_(self, now):
+        self.__tokens = min(self.burst, self.__tokens + (now - self.__refilled) * self.rate)
+        self.__refilled = now
+
+    def acquire(self, timeout = None):
+        """
+        Wait for a token and a free concurrency slot.
+        ARGS
+        ----
+        timeout [float] max seconds to wait. If None then wait indefinitely
+
+        RETURN
+        ------
+        True if acquired, False on timeout
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.__condition:
+            while True:
+                now = time.monotonic()
+                self._refill_(now)
+                if now >= self.blocked_until and self.in_flight < int(self.concurrency) and self.__tokens >= 1:
+                    self.__tokens -= 1
+                    self.in_flight += 1
+                    return True
+                if now < self.blocked_until:
+                    wait = self.blocked_until - now
+                elif self.__tokens < 1:
+                    wait = (1 - self.__tokens) / self.rate
+                else:
+                    #Wait for release of a slot
+                    wait = None
+                if deadline is not None:
+                    if now >= deadline:
+                        return False
+                    wait = deadline - now if wait is None else min(wait, deadline - now)
+                self.__condition.wait(wait)
+
+    def release(self, latency, throttled = False, error = False, retry_after = None):
+        """
+        Return slot and adapt limits to the outcome of the request.
+        ARGS
+        ----
+        latency [float] request time in seconds
+        throttled   [bool]  server answered 429 or 503
+        error   [bool]  request failed
+        retry_after [float] seconds from Retry-After header
+        """
+        with self.__condition:
+            now = time.monotonic()
+            self.in_flight -= 1
+            self.__outcomes.append(1 if throttled or error else 0)
+            #Requests started before the last decrease were sent with the old limits and are not counted again
+            stale = now - latency < self.__decreased_at
+            if throttled or error:
+                if not stale:
+                    self.concurrency = max(self.min_concurrency, self.concurrency / 2)
+                    self.rate = max(self.min_rate, self.rate / 2)
+                    self.__decreased_at = now
+                #Tokens gathered before throttling should not release a burst
+                self.__tokens = min(self.__tokens, 1.0)
+                if throttled:
+                    block = retry_after if retry_after is not None else self.backoff
+                    self.blocked_until = max(self.blocked_until, now + block)
+            elif latency > self.target_latency:
+                if not stale:
+                    self.concurrency = max(self.min_concurrency, self.concurrency * 0.9)
+                    self.rate = max(self.min_rate, self.rate * 0.9)
+                    self.__decreased_at = now
+            else:
+                self.concurrency = min(self.max_concurrency, self.concurrency + 1 / self.concurrency)
+                self.rate = min(self.max_rate, self.rate + 1 / self.rate)
+            self.__condition.notify_all()
+        METRICS.set("limiter_rate", self.rate, host = self.host)
+        METRICS.set("limiter_concurrency", self.concurrency, host = self.host)
+        if throttled:
+            METRICS.inc("throttled", host = self.host)
+
+
+
+class RateLimiter():
+    """
+    Scheduler shared by scrapers with a HostLimiter per host.
+
+    ATTRS
+    -----
+    settings    [dict]  arguments for new HostLimiter instances
+    """
+    def __init__(self, **settings):
+        """
+        ARGS
+        ----
+        settings    arguments of HostLimiter used for every host, e.g. rate = 1.0, concurrency = 2
+        """
+        self.settings = settings
+        self.__hosts = {}
+        self.__lock = threading.Lock()
+
+    def host(self, url, via = None):
+        """Return limiter of the URL host. Requests sent through a proxy given by via are limited separately."""
+        host = urlparse(url).netloc or url
+        if via:
+            host = "{} via {}".format(host, via)
+        with self.__lock:
+            limiter = self.__hosts.get(host)
+            if limiter is None:
+                limiter = self.__hosts[host] = HostLimiter(host, **self.settings)
+            return limiter
+
+    @contextmanager
+    def slot(self, url, via = None):
+        """
+        Context manager holding request slot for the URL host. Outcome is reported through
+        the yielded dictionary: set "throttled" and "retry_after" keys. Exceptions count as errors.
+        """
+        limiter = self.host(url, via)
+        limiter.acquire()
+        outcome = {"throttled" : False, "retry_after" : None}
+        start = time.monotonic()
+        try:
+            yield outcome
+        except Exception:
+            limiter.release(time.monotonic() - start, error = True)
+            raise
+        limiter.release(time.monotonic() - start, throttled = outcome["throttled"], retry_after = outcome["retry_after"])
+
+    def report(self, file = sys.stderr):
+        """Print current limits of hosts."""
+        with self.__lock:
+            limiters = list(self.__hosts.values())
+        for limiter in limiters:
+            print("Host {}: rate {:.2f}/s, concurrency {:.1f}, error rate {:.1%}".format(
+                limiter.host, limiter.rate, limiter.concurrency, limiter.error_rate), file = file)
+
+
+
+class LimitedAdapter(HTTPAdapter):
+    """
+    HTTP adapter sending requests through RateLimiter. Throttled responses (429, 503) are
+    retried by the adapter after the wait requested by the server.
+
+    ATTRS
+    -----
+    limiter [RateLimiter]   shared scheduler
+    throttle_retries    [int]   number of retries after throttled responses
+    """
+    def __init__(self, limiter, throttle_retries = 3, **kwargs):
+        self.limiter = limiter
+        self.throttle_retries = throttle_retries
+        super().__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        via = (kwargs.get("proxies") or {}).get(urlparse(request.url).scheme)
+        for attempt in range(self.throttle_retries + 1):
+            with self.limiter.slot(request.url, via) as outcome:
+                response = super().send(request, **kwargs)
+                if response.status_code in THROTTLE_STATUSES:
+                    outcome["throttled"] = True
+                    outcome["retry_after"] = parse_retry_after(response.headers.get("Retry-After"))
+            if not outcome["throttled"] or attempt == self.throttle_retries:
+                return response
+            response.close()
+        return response
+
+
+###FUNCTIONS###
+def parse_retry_after(value):
+    """Return seconds from Retry-After header given as number of seconds or HTTP date. None if missing."""
+    if value is None:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
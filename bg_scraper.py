@@ -1,38 +1,166 @@
 #!/usr/bin/python
 ###IMPORTS###
 from bs4 import BeautifulSoup as bsp
+from bs4 import SoupStrainer
 import os
 import sys
-import pandas as pd
-import numpy as np
+import logging
 import requests #Communicatrion with web
-from selenium import webdriver # Dynamic scraping for JS websites
-from selenium.webdriver.firefox.options import Options
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import NoSuchElementException
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+import multiprocessing
+#Selenium is imported by the browser scraping functions, requests-only stages start without it
 
 import re
-import csv
-from dotenv import load_dotenv
-from sys import stderr
+import json
+import asyncio
+import time
+import html
+import xml.etree.ElementTree as ET
+import threading
+import queue
+import hashlib
+from urllib.parse import quote, urlparse
 from dataclasses import dataclass, asdict
+from contextlib import ExitStack
+from bg_cache import ResponseCache
+from bg_journal import CrawlJournal
+from bg_metrics import METRICS, BYTES_BUCKETS
+from bg_ratelimit import RateLimiter, LimitedAdapter, THROTTLE_STATUSES
+from bg_proxies import ProxyPool, ProxyAdapter, LimitedProxyAdapter
+from bg_extract import Extractor
+try:
+    import lxml
+    FAST_PARSER = 'lxml'
+except ImportError:
+    FAST_PARSER = 'html.parser'
+
+
+logger = logging.getLogger(__name__)
+
+#Firefox preferences of the lean rendering profile: no images, stylesheets, web fonts, media or prefetching
+LEAN_PREFS = {
+    "permissions.default.image" : 2,
+    "permissions.default.stylesheet" : 2,
+    "gfx.downloadable_fonts.enabled" : False,
+    "browser.display.use_document_fonts" : 0,
+    "media.autoplay.default" : 5,
+    "network.prefetch-next" : False,
+    "network.dns.disablePrefetch" : True,
+    "network.http.speculative-parallel-limit" : 0
+}
+#Closed local port. Requests to hosts outside the allow-list are routed there and fail at once
+BLACKHOLE_PROXY = "127.0.0.1:9"
+#Fields of the rendered game page. See bg_extract.Field for the options
+GAME_SPEC = {
+    #The first container holds the short title, the second one title with release year
+    "title" : {"select" : "div.game-header-title-container h1", "index" : 1, "post" : [("sub", r"\(\d+\)\s*$", ""), "squash"]},
+    "players" : {"select" : "div.gameplay-item-primary", "index" : 0, "post" : [("word", 0)]},
+    "release" : {"select" : "div.game-header-title-container h1", "index" : 1, "post" : [("re", r"\((\d+)\)", 1), "int"]},
+    "tags" : {"select" : "div.feature-description a[href^=/boardgamemechanic/]", "many" : True, "post" : ["squash"]},
+    "age" : {"select" : "div.gameplay-item-primary", "index" : 2, "post" : [("word", 1)]},
+    "time" : {"select" : "div.gameplay-item-primary", "index" : 1, "post" : [("word", 0)]},
+    "category" : {"select" : "div.feature-description a[href^=/boardgamecategory/]", "post" : ["squash"]},
+    "publisher" : {"select" : "div.game-header-credits a[href^=/boardgamepublisher/]", "post" : ["squash"]},
+    "description" : {"select" : "article.game-description-body p", "many" : True, "join" : "\n\n", "post" : ["squash"]},
+    "weight" : {"select" : "div.gameplay-item-primary", "index" : 3, "post" : [("word", 2), "float"]}
+}
+GAME_EXTRACTOR = Extractor(GAME_SPEC)
 
 
 ###CLASSES###
+class RegionStrainer(SoupStrainer):
+    """
+    SoupStrainer building only subtrees of the declared page regions.
+
+    ATTRS
+    -----
+    regions [list]  list of (tag, attribute, value) tuples parsed from selectors like
+                    "table#collectionitems", "div.gameplay-item-primary" or "h1"
+    """
+    SELECTOR = re.compile(r"^([\w-]+)(?:([#.])([\w-]+))?$")
+
+    def __init__(self, regions):
+        self.regions = [RegionStrainer.parse_selector(selector) for selector in regions]
+        super().__init__(name = sorted({tag for tag, _, _ in self.regions}))
+
+    @staticmethod
+    def parse_selector(selector):
+        """Split selector into tag, attribute name (id or class or None) and its value."""
+        match_ = RegionStrainer.SELECTOR.match(selector.strip())
+        if not match_:
+            raise ValueError("Unsupported region selector {}. Expected tag, tag#id or tag.class.".format(selector))
+        tag, kind, value = match_.groups()
+        return tag, {'#' : 'id', '.' : 'class', None : None}[kind], value
+
+    def matches(self, name, attrs):
+        """Check if tag with given name and raw attributes starts one of the regions."""
+        for tag, attr, value in self.regions:
+            if tag != name:
+                continue
+            if attr is None:
+                return True
+            found = (attrs or {}).get(attr)
+            if found is None:
+                continue
+            if attr == 'class':
+                found = found.split() if isinstance(found, str) else found
+                if value in found:
+                    return True
+            elif found == value:
+                return True
+        return False
+
+    def allow_tag_creation(self, nsprefix, name, attrs):
+        #Used by bs4 >= 4.13
+        return self.matches(name, attrs)
+
+    def allow_string_creation(self, string):
+        return False
+
+    def search_tag(self, markup_name = None, markup_attrs = {}):
+        #Used by bs4 < 4.13
+        if hasattr(markup_name, 'attrs'):
+            return markup_name if self.matches(markup_name.name, markup_name.attrs) else None
+        return markup_name if self.matches(markup_name, dict(markup_attrs)) else None
+
+
+
 class SimpleScraper():
     """
     ATTRS
     -----
     page    [str]   URL of the page for scraping
-    page_response    [Response]  response object from the webpage
+    page_response    [bytes]  content of the webpage
     soup    [BeautifulSoup] beautifulSoup object built from the page content
+    session [Session]   pooled keep-alive session shared by all instances unless given explicitly
+    cache   [ResponseCache] on-disk response cache. If None then pages are always fetched
+    regions [RegionStrainer]    page regions which are parsed. If None then the full page is parsed
     """
-    def __init__(self, page):
+    _shared_session = None
+    _shared_cache = None
+    _shared_limiter = None
+    _shared_proxies = None
+    #Settings of the last configure_session() call, kept when the session is rebuilt for a limiter or proxies
+    _session_settings = {"pool_size" : 10, "retries" : 3, "backoff" : 0.5}
+
+    def __init__(self, page, session = None, cache = None, regions = None):
+        """
+        ARGS
+        ----
+        page    [str]   URL of the page for scraping
+        session [Session]   session used for requests. If None then the shared session is used
+        cache   [ResponseCache] response cache. If None then the shared cache is used if configured
+        regions [list]  selectors of the needed page regions, e.g. ["table#collectionitems"]
+        """
         self.__page = page
         self.__page_response = None
         self.__isScraped = False
         self.__soup = None
+        self.__session = session or SimpleScraper.shared_session()
+        self.__cache = cache or SimpleScraper._shared_cache
+        self.__regions = RegionStrainer(regions) if regions else None
         self._set_soup_()
     
     @property
@@ -43,22 +171,149 @@ class SimpleScraper():
     def soup(self):
         return self.__soup
 
+    @property
+    def page_response(self):
+        return self.__page_response
+
+    @property
+    def session(self):
+        return self.__session
+
+    @property
+    def cache(self):
+        return self.__cache
+
+    @property
+    def regions(self):
+        return self.__regions
+
+    @classmethod
+    def configure_cache(cls, path, max_size = 512 * 1024 ** 2, ttls = None, default_ttl = 24 * 3600):
+        """
+        Set response cache shared by scrapers created afterwards.
+        ARGS
+        ----
+        path    [str]   path to the cache file. If None then shared cache is disabled
+        max_size    [int]   max total size of cached pages in bytes
+        ttls    [dict]  URL pattern -> TTL in seconds
+        default_ttl [int]   TTL in seconds for other URLs
+
+        RETURN
+        ------
+        shared ResponseCache or None
+        """
+        if cls._shared_cache is not None:
+            cls._shared_cache.close()
+        cls._shared_cache = ResponseCache(path, max_size, ttls, default_ttl) if path else None
+        return cls._shared_cache
+
+    @classmethod
+    def shared_session(cls):
+        """Return session shared by scrapers. Create it with default settings on first use."""
+        if cls._shared_session is None:
+            cls._shared_session = make_session()
+        return cls._shared_session
+
+    @classmethod
+    def configure_session(cls, pool_size = 10, retries = 3, backoff = 0.5):
+        """
+        Replace shared session with a new one built with given settings.
+        ARGS
+        ----
+        pool_size   [int]   max number of kept-alive connections per host
+        retries [int]   number of retries for failed connections and retriable statuses
+        backoff [float] backoff factor between retries in seconds
+
+        RETURN
+        ------
+        new shared session
+        """
+        if cls._shared_session is not None:
+            cls._shared_session.close()
+        cls._session_settings = {"pool_size" : pool_size, "retries" : retries, "backoff" : backoff}
+        cls._shared_session = make_session(pool_size, retries, backoff, cls._shared_limiter, cls._shared_proxies)
+        return cls._shared_session
+
+    @classmethod
+    def configure_proxies(cls, proxies, **settings):
+        """
+        Set proxy pool shared by sessions and browser drivers created afterwards.
+        Shared session is rebuilt with its last settings to send requests through the pool.
+        ARGS
+        ----
+        proxies [list]  proxy URLs. If empty then proxies are disabled
+        settings    arguments of ProxyPool, e.g. rotate_every = 50
+
+        RETURN
+        ------
+        shared ProxyPool or None
+        """
+        cls._shared_proxies = ProxyPool(proxies, **settings) if proxies else None
+        cls.configure_session(**cls._session_settings)
+        return cls._shared_proxies
+
+    @classmethod
+    def configure_limiter(cls, **settings):
+        """
+        Set adaptive per-host rate limiter shared by sessions and browser scrapers created afterwards.
+        Shared session is rebuilt with its last settings to send requests through the limiter.
+        ARGS
+        ----
+        settings    arguments of HostLimiter, e.g. rate = 1.0, concurrency = 4. If empty then limiter is disabled
+
+        RETURN
+        ------
+        shared RateLimiter or None
+        """
+        cls._shared_limiter = RateLimiter(**settings) if settings else None
+        cls.configure_session(**cls._session_settings)
+        return cls._shared_limiter
+
     def _set_soup_(self):
         """Try to connect to get response from web page and store data to atributes."""
         if not self.__isScraped:
             self.__isScraped = True
             try:
-                self.__page_response = requests.get(self.__page)
+                self.__page_response = fetch_content(self.__session, self.__page, self.__cache)
             except Exception as e:
                 print("Error during connection try: {}".format(e), file = sys.stderr)
                 raise e
-            self.__soup = bsp(self.__page_response.content, 'html.parser')
+            self.__soup = make_soup(self.__page_response, self.__regions)
     
     def set_page(self, page):
         """Set page's URL and get its source and prepare soup."""
         self.__isScraped = False
         self.__page = page
         self._set_soup_()
+
+    def fetch_many(self, urls, workers = None):
+        """
+        Fetch batch of pages through the pooled session and parse them.
+        ARGS
+        ----
+        urls    [list]  URLs of pages to fetch
+        workers [int]   number of concurrent requests. Defaults to the session pool size
+
+        RETURN
+        ------
+        list of BeautifulSoup objects in the same order as urls, restricted to scraper regions if set.
+        Current page and soup of the scraper are not changed.
+        """
+        urls = list(urls)
+        if not urls:
+            return []
+        if workers is None:
+            adapter = self.__session.get_adapter(urls[0])
+            workers = getattr(adapter, '_pool_maxsize', 10)
+        def fetch(url):
+            try:
+                content = fetch_content(self.__session, url, self.__cache)
+            except Exception as e:
+                print("Error during connection try: {}".format(e), file = sys.stderr)
+                raise e
+            return make_soup(content, self.__regions)
+        with ThreadPoolExecutor(max_workers = min(workers, len(urls))) as executor:
+            return list(executor.map(fetch, urls))
     
     def scrape(self, tag, class_ = None, id_ = None, all_results = True, parent = None, get_text = True):
         """
@@ -86,7 +341,8 @@ class SimpleScraper():
             args = [tag, {'id' : id_}]
         else:
             args = [tag]
-        print(args)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Scraping %s", args)
         #Scrape data
         if all_results:
             if parent:
@@ -118,6 +374,117 @@ class SimpleScraper():
 
 
 
+class ListCrawler():
+    """
+    Asynchronous crawler for the paginated games list. Fetches many browse pages at once
+    and yields games links in rank order.
+
+    ATTRS
+    -----
+    gamesURL    [str]   URL of the games list without page number
+    baseURL [str]   URL prepended to relative games links
+    concurrency [int]   max number of pages fetched at once
+    session [Session]   session used for requests
+    cache   [ResponseCache] response cache. If None then the shared cache is used if configured
+    """
+    REGIONS = RegionStrainer(["table#collectionitems"])
+
+    def __init__(self, gamesURL, baseURL, concurrency = 8, session = None, cache = None):
+        self.__gamesURL = gamesURL
+        self.__baseURL = baseURL
+        self.__concurrency = concurrency
+        self.__session = session or SimpleScraper.shared_session()
+        self.__cache = cache or SimpleScraper._shared_cache
+
+    @property
+    def gamesURL(self):
+        return self.__gamesURL
+
+    @property
+    def baseURL(self):
+        return self.__baseURL
+
+    @property
+    def concurrency(self):
+        return self.__concurrency
+
+    def page_url(self, page_no):
+        """Return URL of the browse page with given number."""
+        return self.__gamesURL + "/" + str(page_no)
+
+    @staticmethod
+    def parse_links(content, baseURL = ""):
+        """
+        Extract games links from the browse page source.
+        ARGS
+        ----
+        content [bytes] page source
+        baseURL [str]   URL prepended to relative links
+
+        RETURN
+        ------
+        list of links. Empty list if the page has no games table.
+        """
+        table = make_soup(content, ListCrawler.REGIONS).find('table', id = "collectionitems")
+        if table is None:
+            return []
+        return [baseURL + link.get('href') for link in table.find_all('a', {'class' : "primary"})]
+
+    async def _fetch_links_(self, page_no, semaphore):
+        async with semaphore:
+            try:
+                content = await asyncio.to_thread(
+                    fetch_content, self.__session, self.page_url(page_no), self.__cache, True
+                )
+            except Exception as e:
+                print("Error during connection try: {}".format(e), file = sys.stderr)
+                raise e
+        return await asyncio.to_thread(ListCrawler.parse_links, content, self.__baseURL)
+
+    async def iter_links(self, pages = None, first_page = 1):
+        """
+        Crawl browse pages concurrently and yield games links in rank order.
+        ARGS
+        ----
+        pages   [int]   number of pages to crawl. If None then crawl until page without games
+        first_page  [int]   number of the first page
+
+        RETURN
+        ------
+        async generator of links
+        """
+        semaphore = asyncio.Semaphore(self.__concurrency)
+        window = 2 * self.__concurrency
+        last_page = first_page + pages - 1 if pages is not None else None
+        pending = {}
+        next_page = first_page
+        page_no = first_page
+        try:
+            while True:
+                #Keep fetching ahead, but no further than the window so the buffer stays bounded
+                while (last_page is None or next_page <= last_page) and next_page - page_no < window:
+                    pending[next_page] = asyncio.ensure_future(self._fetch_links_(next_page, semaphore))
+                    next_page += 1
+                if page_no not in pending:
+                    break
+                links = await pending.pop(page_no)
+                if not links:
+                    break
+                for link in links:
+                    yield link
+                page_no += 1
+        finally:
+            for task in pending.values():
+                task.cancel()
+
+    def crawl(self, pages = None, first_page = 1):
+        """Crawl browse pages and return list of games links in rank order."""
+        async def collect():
+            return [link async for link in self.iter_links(pages, first_page)]
+        return asyncio.run(collect())
+
+
+
 class Scraper(SimpleScraper):
     """
     Scraper class using Selenium during scraping. It allows wait for loading js content
@@ -128,28 +495,46 @@ class Scraper(SimpleScraper):
     __page      [str]   URL address to a website
     __page_response [response object]   Response object
     __soup  [bs4]   beautiful soup object based on given URL
+    __cache [ResponseCache] cache of rendered page sources. Browser does not expose response headers,
+                            so rendered pages expire by TTL only. They are kept apart from raw responses
+                            in the namespace of the rendering profile
+    __regions   [RegionStrainer]    page regions which are parsed. If None then the full page is parsed.
+                            Soup is built lazily on the first use after loading or waiting
+    __wait  [list]  CSS selectors which have to be present before page source is taken
     """
     
     
-    def __init__(self, page, timeout, proxy = None):
+    def __init__(self, page, timeout, proxy = None, cache = None, regions = None, limiter = None,
+            lean = False, allowed_hosts = None, wait = None):
         """
         ARGS
         ----
-        page    [str]   URL of the page for scraping
+        page    [str]   URL of the page for scraping. If None then no page is loaded until set_page
         timeout [int]   posiive integer representing max timeout for page content in seconds
+        cache   [ResponseCache] cache of rendered pages. If None then the shared cache is used if configured
+        regions [list]  selectors of the needed page regions, e.g. ["div.gameplay-item-primary"]
+        limiter [RateLimiter]   limiter of page loads. If None then the shared limiter is used if configured
+        lean    [bool]  if True then use lean rendering profile: eager page load, no images, stylesheets and fonts
+        allowed_hosts   [list]  domains which may be loaded in the lean profile (subdomains included).
+                                If None then all hosts are allowed
+        wait    [list]  CSS selectors which have to be present after page load, e.g. Game.REGIONS.
+                        Needed with the eager page load, which returns before scripts fill the page
         """
-        options = Options()
-        options.add_argument("--headless")
-        if proxy:
-            options.add_argument('--proxy-server={}'.format(proxy))
-        self.__driver = webdriver.Firefox(options = options) 
+        from selenium import webdriver # Dynamic scraping for JS websites
+        self.__driver = webdriver.Firefox(options = make_driver_options(proxy, lean, allowed_hosts))
         self.__page = page
         self.__page_response = None
         self.__isScraped = False
         self.__soup = None
         self.__timeout = timeout
         self.__proxy = proxy
-        self._set_soup_()
+        self.__cache = cache or SimpleScraper._shared_cache
+        self.__cache_namespace = "render:lean" if lean else "render:full"
+        self.__regions = RegionStrainer(regions) if regions else None
+        self.__limiter = limiter or SimpleScraper._shared_limiter
+        self.__wait = list(wait) if wait else None
+        if page is not None:
+            self._set_soup_()
     
     @property
     def page(self):
@@ -163,23 +548,49 @@ class Scraper(SimpleScraper):
     def proxy(self):
         return self.__proxy
     
+    @property
+    def regions(self):
+        return self.__regions
+
+    @property
+    def page_response(self):
+        """Rendered page source. Reading it does not build the soup."""
+        return self.__page_response
+
     @property
     def soup(self):
+        if self.__soup is None and self.__page_response is not None:
+            self.__soup = make_soup(self.__page_response, self.__regions)
         return self.__soup
     
     def _set_soup_(self):
         """
-        Set soup, page response and driver. If __isScraped is True then ommit those actions.
+        Set page response and driver. Soup is built on first use. If __isScraped is True then ommit those actions.
         """
         if not self.__isScraped:
             self.__isScraped = True
+            entry = self.__cache.lookup(self.__page, self.__cache_namespace) if self.__cache is not None else None
+            if entry is not None and entry[1]:
+                self.__cache.count("hits")
+                self.__page_response = entry[0]
+                self.__soup = None
+                return
             try:
-                self.__driver.get(self.__page)
+                with ExitStack() as stack:
+                    if self.__limiter is not None:
+                        stack.enter_context(self.__limiter.slot(self.__page))
+                    stack.enter_context(METRICS.timer("render"))
+                    self.__driver.get(self.__page)
+                if self.__wait:
+                    self._wait_for_(self.__wait)
             except Exception as e:
                 print("Error during connection try: {}".format(e), file = sys.stderr)
                 raise e
             self.__page_response = self.__driver.page_source
-            self.__soup = bsp(self.__page_response, 'html.parser')
+            if self.__cache is not None:
+                self.__cache.count("misses")
+                self.__cache.store(self.__page, self.__page_response, namespace = self.__cache_namespace)
+            self.__soup = None
     
     def set_page(self, page):
         """Set page's URL and get its source and prepare soup."""
@@ -187,13 +598,46 @@ class Scraper(SimpleScraper):
         self.__page = page
         self._set_soup_()
     
+    def _wait_for_(self, selectors):
+        """Wait until all CSS selectors match. Each poll checks all of them in a single browser round trip."""
+        from selenium.webdriver.support.ui import WebDriverWait
+        with METRICS.timer("wait"):
+            WebDriverWait(self.__driver, timeout = float(self.__timeout), poll_frequency = 0.1).until(
+                lambda driver: driver.execute_script(
+                    "return arguments[0].every(function(s) { return document.querySelector(s) !== null; });", selectors
+                )
+            )
+
+    def wait_for(self, selectors, verbose = False):
+        """
+        Wait until elements matching all CSS selectors are present and then load page_src.
+        ARGS
+        ----
+        selectors   [list]  CSS selectors, e.g. ["div.gameplay-item-primary", "div.game-header-title-container"]
+        verbose [bool]  print waiting message
+        """
+        if isinstance(selectors, str):
+            selectors = [selectors]
+        if verbose:
+            print("Waiting for elements {}...".format(", ".join(selectors)))
+        self._wait_for_(list(selectors))
+        self.__page_response = self.__driver.page_source
+        if self.__cache is not None:
+            self.__cache.store(self.__page, self.__page_response, namespace = self.__cache_namespace)
+        self.__soup = None
+
     def wait_for_elem(self, class_, verbose = False):
         """Wait for element with provided class name and then load page_src."""
+        from selenium.webdriver.common.by import By
+        from selenium.webdriver.support.ui import WebDriverWait
         if verbose:
             print("Waiting for element {}...".format(class_))
-        WebDriverWait(self.__driver, timeout = self.__timeout).until(lambda x: x.find_element(By.CLASS_NAME, class_))
+        with METRICS.timer("wait"):
+            WebDriverWait(self.__driver, timeout = float(self.__timeout)).until(lambda x: x.find_element(By.CLASS_NAME, class_))
         self.__page_response = self.__driver.page_source
-        self.__soup = bsp(self.__page_response, 'html.parser')
+        if self.__cache is not None:
+            self.__cache.store(self.__page, self.__page_response, namespace = self.__cache_namespace)
+        self.__soup = None
 
     def scrape(self, tag, class_ = None, id_ = None, all_results = True, parent = None, get_text = True):
         """
@@ -231,9 +675,9 @@ class Scraper(SimpleScraper):
                     return [i for i in parent.findChildren(*args)]
             else:
                 if get_text:
-                    return [i.get_text() for i in self.__soup.find_all(*args)]
+                    return [i.get_text() for i in self.soup.find_all(*args)]
                 else:
-                    return [i for i in self.__soup.find_all(*args)]
+                    return [i for i in self.soup.find_all(*args)]
 
         else:
             if parent:
@@ -243,45 +687,435 @@ class Scraper(SimpleScraper):
                     return parent.findChildren(*args)[0]
             else:
                 if get_text:
-                    return self.__soup.find(*args).get_text()
+                    return self.soup.find(*args).get_text()
                 else:
-                    return self.__soup.find(*args)
+                    return self.soup.find(*args)
         
     def quit(self):
         """Close driver"""
         self.__driver.close()
         self.__driver.quit()
 
+
+
+class ScraperPool():
+    """
+    Pool of Scraper instances (headless drivers) processing games links in parallel.
+
+    ATTRS
+    -----
+    size    [int]   number of drivers
+    max_pages   [int]   number of pages after which a driver is restarted to release leaked memory
+    retries [int]   number of attempts for a link whose driver crashed (WebDriverException)
+    failed  [dict]  link -> exception for links which could not be processed
+    proxy_pool  [ProxyPool] pool leasing proxies to drivers or None
+    """
+    def __init__(self, size, timeout, proxy = None, max_pages = 50, retries = 2, factory = None, regions = None,
+            lean = False, allowed_hosts = None, wait = None, proxy_pool = None):
+        """
+        ARGS
+        ----
+        size    [int]   number of drivers
+        timeout [int]   max timeout for page content in seconds
+        proxy   [str]   proxy server passed to drivers
+        max_pages   [int]   number of pages after which a driver is restarted
+        retries [int]   number of attempts for a single link
+        factory [callable]  function returning new scraper. Defaults to headless Scraper.
+                            Called with proxy address when proxy pool is used
+        regions [list]  selectors of the page regions parsed by default scrapers
+        lean    [bool]  use lean rendering profile in default scrapers
+        allowed_hosts   [list]  domains loaded by default scrapers in the lean profile
+        wait    [list]  CSS selectors default scrapers wait for after each page load
+        proxy_pool  [ProxyPool] pool of proxies. If provided then each driver gets a leased proxy and
+                                is restarted with another one when the lease expires. Overrides proxy
+        """
+        self.__size = size
+        self.__max_pages = max_pages
+        self.__retries = retries
+        self.__factory = factory or (lambda proxy = proxy: Scraper(
+            None, timeout = timeout, proxy = proxy, regions = regions, lean = lean, allowed_hosts = allowed_hosts, wait = wait
+        ))
+        self.__lock = threading.Lock()
+        self.failed = {}
+        self.proxy_pool = proxy_pool
+        self.__leases = [None] * size
+        #Start drivers concurrently, browser start-up takes seconds
+        with ThreadPoolExecutor(max_workers = size) as executor:
+            self.__scrapers = list(executor.map(self._start_, range(size)))
+        self.__pages = [0] * size
+
+    @property
+    def size(self):
+        return self.__size
+
+    @property
+    def max_pages(self):
+        return self.__max_pages
+
+    def _start_(self, slot):
+        """Start driver for the given slot, with a fresh proxy lease if proxy pool is used."""
+        if self.proxy_pool is None:
+            return self.__factory()
+        lease = self.__leases[slot]
+        lease = self.proxy_pool.lease() if lease is None else lease.renew()
+        self.__leases[slot] = lease
+        return self.__factory(lease.proxy)
+
+    def _restart_(self, slot):
+        """Quit driver in the given slot and start a new one."""
+        try:
+            self.__scrapers[slot].quit()
+        except Exception as e:
+            print("Error during driver shutdown: {}".format(e), file = sys.stderr)
+        self.__scrapers[slot] = self._start_(slot)
+        self.__pages[slot] = 0
+
+    @staticmethod
+    def _put_(queue_, item, stop):
+        """Put item to the bounded queue unless stop is set while waiting. Return True if the item was put."""
+        while not stop.is_set():
+            try:
+                queue_.put(item, timeout = 0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def _work_(self, slot, tasks, results, handler, stop):
+        """Take links from the queue and process them with the driver from the given slot until stop is set."""
+        from selenium.common.exceptions import WebDriverException
+        while not stop.is_set():
+            try:
+                link = tasks.get(timeout = 0.1)
+            except queue.Empty:
+                continue
+            if link is None:
+                ScraperPool._put_(results, None, stop)
+                return
+            for attempt in range(1, self.__retries + 1):
+                lease = self.__leases[slot]
+                if self.__pages[slot] >= self.__max_pages or (lease is not None and lease.expired):
+                    try:
+                        self._restart_(slot)
+                    except Exception as e:
+                        print("Cannot restart driver: {}".format(e), file = sys.stderr)
+                        with self.__lock:
+                            self.failed[link] = e
+                        ScraperPool._put_(results, None, stop)
+                        return
+                    lease = self.__leases[slot]
+                try:
+                    scraper = self.__scrapers[slot]
+                    start = time.monotonic()
+                    scraper.set_page(link)
+                    self.__pages[slot] += 1
+                    if lease is not None:
+                        lease.record(time.monotonic() - start)
+                except WebDriverException as e:
+                    if lease is not None:
+                        lease.record(error = True)
+                    #Driver crashed or hanged, start a fresh one and try again
+                    print("Driver error for {} (attempt {}): {}".format(link, attempt, e), file = sys.stderr)
+                    if attempt == self.__retries:
+                        with self.__lock:
+                            self.failed[link] = e
+                    try:
+                        self._restart_(slot)
+                    except Exception as e:
+                        print("Cannot restart driver: {}".format(e), file = sys.stderr)
+                        with self.__lock:
+                            self.failed[link] = e
+                        ScraperPool._put_(results, None, stop)
+                        return
+                    continue
+                try:
+                    result = handler(scraper)
+                except Exception as e:
+                    print("Error during scraping {}: {}".format(link, e), file = sys.stderr)
+                    with self.__lock:
+                        self.failed[link] = e
+                    break
+                if not ScraperPool._put_(results, (link, result), stop):
+                    #Consumer stopped early
+                    return
+                break
+
+    def imap(self, handler, links):
+        """
+        Process links with all drivers.
+        ARGS
+        ----
+        handler [callable]  function called with a scraper set to the link page. Its errors are not retried
+        links   [iterable]  links to process
+
+        RETURN
+        ------
+        generator of (link, result) tuples in order of completion.
+        Links which failed after all retries are stored in failed attribute.
+        Links are consumed lazily and queues are bounded, so memory does not grow with the number of links.
+        """
+        tasks = queue.Queue(maxsize = 2 * self.__size)
+        results = queue.Queue(maxsize = 2 * self.__size)
+        stop = threading.Event()
+
+        def feed():
+            for link in links:
+                if not ScraperPool._put_(tasks, link, stop):
+                    #Links left when all drivers died
+                    with self.__lock:
+                        self.failed[link] = RuntimeError("No driver available")
+            for _ in range(self.__size):
+                ScraperPool._put_(tasks, None, stop)
+
+        feeder = threading.Thread(target = feed, daemon = True)
+        workers = [
+            threading.Thread(target = self._work_, args = (slot, tasks, results, handler, stop), daemon = True)
+            for slot in range(self.__size)
+        ]
+        feeder.start()
+        for worker in workers:
+            worker.start()
+        finished = 0
+        try:
+            while finished < self.__size:
+                result = results.get()
+                if result is None:
+                    finished += 1
+                else:
+                    yield result
+        finally:
+            #Consumer may stop early, workers waiting for a free slot in results give up and release their drivers
+            stop.set()
+            while True:
+                try:
+                    results.get_nowait()
+                except queue.Empty:
+                    break
+            for worker in workers:
+                worker.join()
+            feeder.join()
+        while not tasks.empty():
+            link = tasks.get()
+            if link is not None:
+                self.failed[link] = RuntimeError("No driver available")
+
+    def quit(self):
+        """Close all drivers"""
+        for scraper in self.__scrapers:
+            try:
+                scraper.quit()
+            except Exception as e:
+                print("Error during driver shutdown: {}".format(e), file = sys.stderr)
+        self.__scrapers = []
+        for lease in self.__leases:
+            if lease is not None:
+                lease.release()
+        self.__leases = [None] * self.__size
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.quit()
+
+            
+
+class ParsePool():
+    """
+    Pool of processes parsing page sources into games, so parsing is not limited to the core
+    of the thread fetching pages. Fetchers keep loading pages while workers parse the previous ones.
+
+    ATTRS
+    -----
+    workers [int]   number of parsing processes
+    max_pending [int]   max number of pages submitted and not yet consumed. Fetching pauses when it is reached
+    failed  [dict]  link -> exception for pages which could not be parsed
+    """
+    def __init__(self, workers = None, max_pending = None, parser = None):
+        """
+        ARGS
+        ----
+        workers [int]   number of processes. Defaults to the number of CPUs
+        max_pending [int]   max number of pages in flight. Defaults to twice the number of workers
+        parser  [callable]  module level function called with page source in a worker. Defaults to parse_game_page
+        """
+        self.workers = workers or os.cpu_count() or 1
+        self.max_pending = max_pending or 2 * self.workers
+        self.failed = {}
+        self.__parser = parser or parse_game_page
+        #Forked workers would inherit locks held by fetching threads
+        self.__executor = ProcessPoolExecutor(max_workers = self.workers, mp_context = multiprocessing.get_context("spawn"))
+
+    def imap(self, pages):
+        """
+        Parse pages in worker processes.
+        ARGS
+        ----
+        pages   [iterable]  (link, page source) tuples, e.g. ScraperPool.imap(page_source, links)
+
+        RETURN
+        ------
+        generator of (link, result) tuples in order of completion.
+        Pages are consumed by a feeder thread, at most max_pending at once.
+        """
+        results = queue.Queue()
+        slots = threading.BoundedSemaphore(self.max_pending)
+        stop = threading.Event()
+        end = object()
+
+        def done(link, future):
+            results.put((link, future))
+
+        def feed():
+            submitted = 0
+            try:
+                for link, content in pages:
+                    while not slots.acquire(timeout = 0.1):
+                        if stop.is_set():
+                            return
+                    future = self.__executor.submit(_timed_call_, self.__parser, content)
+                    future.add_done_callback(lambda future, link = link: done(link, future))
+                    submitted += 1
+            except Exception as e:
+                results.put((None, e))
+            finally:
+                results.put((end, submitted))
+
+        feeder = threading.Thread(target = feed, daemon = True)
+        feeder.start()
+        received, submitted = 0, None
+        try:
+            while submitted is None or received < submitted:
+                link, item = results.get()
+                if link is end:
+                    submitted = item
+                    continue
+                if link is None:
+                    raise item
+                received += 1
+                slots.release()
+                try:
+                    result, elapsed = item.result()
+                except Exception as e:
+                    print("Error during parsing {}: {}".format(link, e), file = sys.stderr)
+                    self.failed[link] = e
+                    continue
+                METRICS.observe("stage_seconds", elapsed, stage = "extract")
+                yield link, result
+        finally:
+            stop.set()
+        feeder.join()
+
+    def shutdown(self):
+        """Stop worker processes. Pages not parsed yet are dropped."""
+        self.__executor.shutdown(wait = True, cancel_futures = True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
+
             
 
 class JSONLWriter():
-    def __init__(self, output_):
+    """
+    Sink writing records to JSON Lines file. The file stays open between writes and records
+    are buffered and flushed when the buffer reaches max_records or flush_interval passes.
+    Use it as a context manager or call close() to flush remaining records.
+
+    ATTRS
+    -----
+    output  [str]   path to the output file
+    max_records [int]   number of buffered records which triggers flush
+    flush_interval  [float] max number of seconds between flushes
+    written [int]   number of records written to the file
+    """
+    def __init__(self, output_, max_records = 500, flush_interval = 5.0, append = True):
+        """
+        ARGS
+        ----
+        output_ [str]   path to the output file
+        max_records [int]   number of buffered records which triggers flush
+        flush_interval  [float] max number of seconds between flushes
+        append  [bool]  if False then existing file is overwritten when opened
+        """
         self.output = output_
-    
+        self.max_records = max_records
+        self.flush_interval = flush_interval
+        self.written = 0
+        self.__append = append
+        self.__file = None
+        self.__buffer = []
+        self.__last_flush = time.monotonic()
+
+    def _open_(self, mode = None):
+        if self.__file is None:
+            self.__file = open(self.output, mode or ('a' if self.__append else 'w'), encoding = 'utf-8')
+            self.__last_flush = time.monotonic()
+        return self.__file
+
+    @staticmethod
+    def _records_(input_):
+        if isinstance(input_, (dict, Game)):
+            return [input_]
+        elif isinstance(input_, list):
+            return input_
+        raise Exception("Expected dictionary or list of dictionaries.")
+
     def overwrite(self, input_):
         """Write to file. If flie already exists, then overwrite it."""
-        with open(self.output, 'w') as f:
-            writer = jsonlines.Writer(f)
-            if isinstance(input_, dict):
-                writer.write(input_)
-            elif isinstance(input_, list):
-                for line in input_:
-                    writer.write(line)
-            else:
-                raise Exception("Expected dictionary or list of dictionaries.")
-
+        records = JSONLWriter._records_(input_)
+        self.__buffer = []
+        if self.__file is not None:
+            self.__file.seek(0)
+            self.__file.truncate()
+        else:
+            self._open_('w')
+        self.write(records)
 
     def write(self, input_):
         """Write to file. If flie already exists, then append content."""
-        with open(self.output, 'a') as f:
-            writer = jsonlines.Writer(f)
-            if isinstance(input_, dict):
-                writer.write(input_)
-            elif isinstance(input_, list):
-                for line in input_:
-                    writer.write(line)
-            else:
+        for record in JSONLWriter._records_(input_):
+            if isinstance(record, Game):
+                record = asdict(record)
+            elif not isinstance(record, dict):
                 raise Exception("Expected dictionary or list of dictionaries.")
+            self.__buffer.append(json.dumps(record, ensure_ascii = False))
+        if len(self.__buffer) >= self.max_records or time.monotonic() - self.__last_flush >= self.flush_interval:
+            self.flush()
+
+    @property
+    def buffered(self):
+        """Number of records waiting for the next flush."""
+        return len(self.__buffer)
+
+    def flush(self):
+        """Write buffered records to the file."""
+        with METRICS.timer("write"):
+            f = self._open_()
+            if self.__buffer:
+                data = "\n".join(self.__buffer) + "\n"
+                f.write(data)
+                METRICS.observe("write_bytes", len(data), buckets = BYTES_BUCKETS)
+                self.written += len(self.__buffer)
+                self.__buffer = []
+            f.flush()
+        self.__last_flush = time.monotonic()
+
+    def close(self):
+        """Flush buffered records and close the file."""
+        if self.__buffer or self.__file is not None:
+            self.flush()
+            self.__file.close()
+            self.__file = None
+
+    def __enter__(self):
+        self._open_()
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
 
 @dataclass
 class Game():
@@ -296,6 +1130,15 @@ class Game():
     description : str
     weight : float
 
+    #Page regions read by GAME_SPEC and the extraction methods
+    REGIONS = (
+        "div.gameplay-item-primary", "div.game-header-title-container", "div.game-header-credits", "div.game-description"
+    )
+
+    def fingerprint(self):
+        """Return content fingerprint of the game. Equal for Game and its dictionary read back from JSON."""
+        return game_fingerprint(asdict(self))
+
     @staticmethod
     def extract_params(params_list) -> tuple:
         """
@@ -335,110 +1178,712 @@ class Game():
         title = re.sub(r"^ +", "", title)
         return release, title
 
+
+
+class XMLAPIBackend():
+    """
+    Backend reading Game fields from the BGG XML API thing endpoint instead of rendered pages.
+
+    ATTRS
+    -----
+    apiURL  [str]   URL of the XML API, e.g. https://boardgamegeek.com/xmlapi2
+    batch_size  [int]   number of games asked in a single request
+    session [Session]   session used for requests
+    """
+    LINK_ID = re.compile(r"/boardgame(?:expansion)?/(\d+)")
+
+    def __init__(self, apiURL = "https://boardgamegeek.com/xmlapi2", batch_size = 20, session = None, retries = 5, wait = 2.0):
+        """
+        ARGS
+        ----
+        apiURL  [str]   URL of the XML API
+        batch_size  [int]   number of games asked in a single request
+        session [Session]   session used for requests. If None then the shared session is used
+        retries [int]   number of attempts when API answers that request is queued (202)
+        wait    [float] seconds between those attempts
+        """
+        self.__apiURL = apiURL.rstrip("/")
+        self.__batch_size = batch_size
+        self.__session = session or SimpleScraper.shared_session()
+        self.__retries = retries
+        self.__wait = wait
+
+    @property
+    def apiURL(self):
+        return self.__apiURL
+
+    @property
+    def batch_size(self):
+        return self.__batch_size
+
     @staticmethod
-    def get_descriptions(scraper : Scraper) -> tuple:
+    def game_id(link):
+        """Return game id from its link or None if link does not point to a game."""
+        match_ = XMLAPIBackend.LINK_ID.search(link)
+        return match_.group(1) if match_ else None
+
+    @staticmethod
+    def _range_(item, low, high):
+        low = item.find(low)
+        high = item.find(high)
+        low = low.get('value') if low is not None else None
+        high = high.get('value') if high is not None else None
+        if low and high and low != high and high != "0":
+            return "{}–{}".format(low, high)
+        return low or high
+
+    @staticmethod
+    def parse_item(item) -> Game:
         """
-        Get short desription and longer paragraph
+        Build Game from the item element of thing response.
         ARGS
         ----
-        scraper [Scraper]   Scraper with proper URL address settled
-        
+        item    [Element]   item element
+
         RETURN
         ------
-        tuple of strings containing short descroption and the longer one in the given order.
+        Game
         """
-        #Get short description
-        short_desc = scraper.scrape('div', class_ = "game-header-title-container", get_text = False)[1]
-        short_desc = scraper.scrape('p', parent = short_desc, all_results = False)
-        #Remove trailing spaces and tabulations
-        short_desc = re.sub(r'[\t ]+$', '', short_desc)
-        # print(short_desc.get_text())
-        # print(">>>", type(short_desc))
-        # print(short_desc.find('p').get_text())
-        # print(short_desc.findChildren('p')[0].get_text())
-        # print(scraper.scrape("p", parent = short_desc, class_ = "ng-binding ng-scope"))
-        # print(scraper.scrape("p", parent = short_desc))
-        # print(scraper.scrape('p', parent = short_desc))
-        # short_desc = scraper.scrape(
-            # 'p',
-            # parent = scraper.scrape('div', class_ = "game-header-title-info", get_text = False)[1]
-        # )
-        # print(short_desc)
+        def value(tag):
+            elem = item.find(tag)
+            return elem.get('value') if elem is not None else None
+        def links(type_):
+            return [link.get('value') for link in item.iter('link') if link.get('type') == type_]
+        title = item.find("name[@type='primary']")
+        release = value('yearpublished')
+        weight = value('statistics/ratings/averageweight')
+        age = value('minage')
+        description = item.findtext('description')
+        categories = links('boardgamecategory')
+        publishers = links('boardgamepublisher')
+        return Game(
+            title = title.get('value') if title is not None else None,
+            players = XMLAPIBackend._range_(item, 'minplayers', 'maxplayers'),
+            release = int(release) if release else None,
+            tags = links('boardgamemechanic'),
+            age = age + "+" if age else None,
+            time = XMLAPIBackend._range_(item, 'minplaytime', 'maxplaytime'),
+            category = categories[0] if categories else None,
+            publisher = publishers[0] if publishers else None,
+            #Descriptions are escaped twice by the API
+            description = html.unescape(description) if description else None,
+            weight = float(weight) if weight else None
+        )
 
+    @staticmethod
+    def parse_items(stream):
+        """
+        Parse thing response incrementally.
+        ARGS
+        ----
+        stream  [file-like]  response body
 
+        RETURN
+        ------
+        generator of (id, Game) tuples. Parsed items are released from memory.
+        """
+        for _, elem in ET.iterparse(stream, events = ("end",)):
+            if elem.tag == 'item':
+                yield elem.get('id'), XMLAPIBackend.parse_item(elem)
+                elem.clear()
 
+    def _request_(self, ids):
+        """Send thing request for given ids and return streamed response."""
+        params = {'id' : ",".join(ids), 'stats' : 1}
+        for attempt in range(self.__retries):
+            try:
+                response = self.__session.get(self.__apiURL + "/thing", params = params, stream = True)
+            except Exception as e:
+                print("Error during connection try: {}".format(e), file = sys.stderr)
+                raise e
+            #API answers 202 when the request is queued for processing
+            if response.status_code != 202:
+                response.raise_for_status()
+                response.raw.decode_content = True
+                return response
+            response.close()
+            time.sleep(self.__wait)
+        raise requests.exceptions.RetryError("XML API request still queued for ids {}".format(params['id']))
+
+    def iter_games(self, links):
+        """
+        Fetch games in batches.
+        ARGS
+        ----
+        links   [iterable]  games links or ids
+
+        RETURN
+        ------
+        generator of (link, Game) tuples in order of links. Links without game in response are omitted.
+        """
+        batch = {}
+        for link in links:
+            id_ = link if str(link).isdigit() else XMLAPIBackend.game_id(link)
+            if id_ is None:
+                print("Cannot find game id in {}".format(link), file = sys.stderr)
+                continue
+            batch[str(id_)] = link
+            if len(batch) >= self.__batch_size:
+                yield from self._fetch_batch_(batch)
+                batch = {}
+        if batch:
+            yield from self._fetch_batch_(batch)
+
+    def _fetch_batch_(self, batch):
+        with METRICS.timer("fetch", backend = "xmlapi"):
+            response = self._request_(list(batch))
+        #Body is streamed, so parsing time includes reading it
+        with response, METRICS.timer("extract", backend = "xmlapi"):
+            games = dict(XMLAPIBackend.parse_items(response.raw))
+        for id_, link in batch.items():
+            if id_ in games:
+                yield link, games[id_]
 
-        
+
+
+class CountingRetry(Retry):
+    """Retry policy which counts retries in run metrics."""
+    def increment(self, method = None, url = None, response = None, error = None, _pool = None, _stacktrace = None):
+        METRICS.inc("retries", host = _pool.host if _pool is not None else "")
+        return super().increment(method, url, response, error, _pool, _stacktrace)
 
 
 
 ###FUNCTIONS###
-def main():
+def pac_script(allowed_hosts, proxy = None):
+    """
+    Build proxy auto-config script which lets the browser reach only the allowed domains.
+    ARGS
+    ----
+    allowed_hosts   [list]  allowed domains, subdomains included
+    proxy   [str]   proxy used for allowed domains, e.g. "http://10.0.0.1:3128". If None then they are reached directly
+
+    RETURN
+    ------
+    PAC script source
+    """
+    route = "PROXY {}".format(proxy.split("://")[-1].rstrip("/")) if proxy else "DIRECT"
+    conditions = " || ".join(
+        'host == "{0}" || dnsDomainIs(host, ".{0}")'.format(host.lower()) for host in allowed_hosts
+    ) or "false"
+    return (
+        "function FindProxyForURL(url, host) {{ host = host.toLowerCase(); "
+        "if ({}) {{ return \"{}\"; }} return \"PROXY {}\"; }}".format(conditions, route, BLACKHOLE_PROXY)
+    )
+
+def make_driver_options(proxy = None, lean = False, allowed_hosts = None):
+    """
+    Build options of the headless Firefox driver.
+    ARGS
+    ----
+    proxy   [str]   proxy server
+    lean    [bool]  if True then use eager page load strategy and block images, stylesheets, fonts and media
+    allowed_hosts   [list]  in the lean profile requests to other domains are blocked. If None then all are allowed
+
+    RETURN
+    ------
+    selenium Firefox Options
+    """
+    from selenium.webdriver.firefox.options import Options
+    options = Options()
+    options.add_argument("--headless")
+    if lean:
+        #Return from get after DOMContentLoaded, required elements are awaited explicitly
+        options.page_load_strategy = "eager"
+        for name, value in LEAN_PREFS.items():
+            options.set_preference(name, value)
+    if lean and allowed_hosts:
+        options.set_preference("network.proxy.type", 2)
+        options.set_preference(
+            "network.proxy.autoconfig_url",
+            "data:application/x-ns-proxy-autoconfig," + quote(pac_script(allowed_hosts, proxy))
+        )
+    elif proxy:
+        #Firefox ignores command line proxy switches, the proxy is set in the profile
+        host, _, port = proxy.split("://")[-1].rstrip("/").partition(":")
+        options.set_preference("network.proxy.type", 1)
+        for scheme in ("http", "ssl"):
+            options.set_preference("network.proxy.{}".format(scheme), host)
+            options.set_preference("network.proxy.{}_port".format(scheme), int(port or 80))
+    return options
+
+def make_soup(content, regions = None):
+    """
+    Parse page source.
+    ARGS
+    ----
+    content [bytes or str]  page source
+    regions [list]  selectors of the needed regions, e.g. ["table#collectionitems"]. If provided then
+                    only those subtrees are built, with lxml parser when it is installed.
+                    Otherwise the full tree is built with html.parser
+
+    RETURN
+    ------
+    BeautifulSoup
+    """
+    with METRICS.timer("parse"):
+        if not regions:
+            return bsp(content, 'html.parser')
+        strainer = regions if isinstance(regions, RegionStrainer) else RegionStrainer(regions)
+        return bsp(content, FAST_PARSER, parse_only = strainer)
+
+def fetch_content(session, url, cache = None, raise_for_status = False):
+    """
+    Get page source through the response cache if provided, otherwise directly from the web.
+    ARGS
+    ----
+    session [Session]   session used for requests
+    url [str]   URL of the page
+    cache   [ResponseCache] response cache or None
+    raise_for_status    [bool]  if True then raise HTTPError for error responses
+
+    RETURN
+    ------
+    page source as bytes
+    """
+    with METRICS.timer("fetch"):
+        if cache is not None:
+            content = cache.fetch(session, url, raise_for_status = raise_for_status)
+        else:
+            response = session.get(url)
+            if raise_for_status:
+                response.raise_for_status()
+            content = response.content
+    METRICS.observe("fetch_bytes", len(content), buckets = BYTES_BUCKETS)
+    return content
+
+def make_session(pool_size = 10, retries = 3, backoff = 0.5, limiter = None, proxies = None):
+    """
+    Build requests session with keep-alive connection pool and retry policy.
+    ARGS
+    ----
+    pool_size   [int]   max number of kept-alive connections per host
+    retries [int]   number of retries for failed connections and statuses 429, 500, 502, 503, 504
+    backoff [float] backoff factor between retries in seconds
+    limiter [RateLimiter]   adaptive per-host limiter. If provided then throttled responses (429, 503)
+                            are retried by the limiter, which honours Retry-After and slows the host down
+    proxies [ProxyPool] proxy pool. If provided then each thread sends requests through its leased proxy,
+                        failed and throttled requests are repeated through another proxy
+
+    RETURN
+    ------
+    requests.Session
+    """
+    #Throttling is handled by the limiter or by switching proxies, not by urllib3
+    own_throttling = limiter is None and proxies is None
+    retry = CountingRetry(
+        total = retries,
+        connect = retries,
+        read = retries,
+        status = retries,
+        backoff_factor = backoff,
+        status_forcelist = tuple(status for status in (429, 500, 502, 503, 504) if own_throttling or status not in THROTTLE_STATUSES),
+        allowed_methods = frozenset(["GET", "HEAD"]),
+        #Otherwise urllib3 would retry throttled responses with Retry-After behind their back
+        respect_retry_after_header = own_throttling,
+        raise_on_status = False
+    )
+    if proxies is not None and limiter is not None:
+        adapter = LimitedProxyAdapter(
+            proxies, limiter = limiter, throttle_retries = 0,
+            pool_connections = pool_size, pool_maxsize = pool_size, max_retries = retry
+        )
+    elif proxies is not None:
+        adapter = ProxyAdapter(proxies, pool_connections = pool_size, pool_maxsize = pool_size, max_retries = retry)
+    elif limiter is not None:
+        adapter = LimitedAdapter(limiter, retries, pool_connections = pool_size, pool_maxsize = pool_size, max_retries = retry)
+    else:
+        adapter = HTTPAdapter(pool_connections = pool_size, pool_maxsize = pool_size, max_retries = retry)
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+def scrape_game_page(scraper):
+    """
+    Extract game fields from the page currently loaded by the scraper.
+    ARGS
+    ----
+    scraper [Scraper]   Scraper with proper URL address settled
+
+    RETURN
+    ------
+    Game. Fields missing on the page are None.
+    """
+    #Build soup first, so parsing is not counted as extraction
+    scraper.soup
+    with METRICS.timer("extract"):
+        return _extract_game_(scraper)
+
+def _extract_game_(scraper):
+    return Game(**GAME_EXTRACTOR.extract(scraper.soup))
+
+def extract_games(documents):
+    """
+    Extract games from many rendered pages in a single tree walk per page.
+    ARGS
+    ----
+    documents   [iterable]  page sources or soups
+
+    RETURN
+    ------
+    generator of Game, in order of documents
+    """
+    parse = lambda content: make_soup(content, Game.REGIONS)
+    for fields in GAME_EXTRACTOR.extract_many(documents, parse):
+        yield Game(**fields)
+
+def page_source(scraper):
+    """ScraperPool handler returning page source of the loaded page without parsing it."""
+    return scraper.page_response
+
+def parse_game_page(content):
+    """
+    Parse game page source. Used by ParsePool workers.
+    ARGS
+    ----
+    content [bytes or str]  page source
+
+    RETURN
+    ------
+    Game
+    """
+    return Game(**GAME_EXTRACTOR.extract(make_soup(content, Game.REGIONS)))
+
+def _timed_call_(function, content):
+    """Call function in a worker process. Return result and time spent in seconds."""
+    start = time.perf_counter()
+    result = function(content)
+    return result, time.perf_counter() - start
+
+def game_fingerprint(record):
+    """
+    Hash content of the game record.
+    ARGS
+    ----
+    record  [dict or Game]  game record
+
+    RETURN
+    ------
+    32 characters hex digest of the canonical JSON of the record
+    """
+    if isinstance(record, Game):
+        record = asdict(record)
+    canonical = json.dumps(record, sort_keys = True, ensure_ascii = False, separators = (",", ":"))
+    return hashlib.blake2b(canonical.encode("utf-8"), digest_size = 16).hexdigest()
+
+def sink_games(games, writer, journal = None):
+    """
+    Write games to the sink as they are produced.
+    ARGS
+    ----
+    games   [iterable]  (link, Game) tuples
+    writer  [JSONLWriter]   sink for records
+    journal [CrawlJournal]  if provided then games are checkpointed once the writer flushed them to the file
+
+    RETURN
+    ------
+    generator of the same (link, Game) tuples, yielded after they are written
+    """
+    #Games in the writer buffer are not done yet, a crash would lose them from the output
+    pending = []
+    def checkpoint():
+        if pending:
+            journal.mark_done_many(pending)
+            pending.clear()
+    try:
+        for link, game in games:
+            record = asdict(game)
+            #Link is the key of the game in the journal and the stores, records carry it for rebuilds from the output
+            writer.write(dict(link = link, **record))
+            if journal is not None:
+                pending.append((link, record))
+                if not writer.buffered:
+                    checkpoint()
+            yield link, game
+    finally:
+        if pending:
+            writer.flush()
+            checkpoint()
+
+def configure_from_env():
+    """
+    Configure response cache, adaptive rate limiter and proxy pool shared by scrapers
+    from environment variables (CACHE_PATH, RATE_LIMIT, PROXIES and related settings).
+
+    RETURN
+    ------
+    tuple (cache, limiter, proxies). Disabled components are None
+    """
+    CONCURRENCY = int(os.getenv("CONCURRENCY") or 8)
+    DRIVERS = int(os.getenv("DRIVERS") or 1)
+    PROXY = os.getenv("PROXY") or None
+    PROXIES = [proxy.strip() for proxy in (os.getenv("PROXIES") or PROXY or "").split(",") if proxy.strip()]
+    PROXY_ROTATE_EVERY = int(os.getenv("PROXY_ROTATE_EVERY") or 50)
+    CACHE_PATH = os.getenv("CACHE_PATH") or None
+    CACHE_MAX_MB = int(os.getenv("CACHE_MAX_MB") or 512)
+    CACHE_TTLS = {
+        r"/browse/" : int(os.getenv("CACHE_TTL_BROWSE") or 6 * 3600),
+        r"/boardgame/" : int(os.getenv("CACHE_TTL_GAME") or 3 * 24 * 3600)
+    }
+    RATE_LIMIT = float(os.getenv("RATE_LIMIT") or 0)
+    RATE_LIMIT_MAX = float(os.getenv("RATE_LIMIT_MAX") or 10 * (RATE_LIMIT or 1))
+
+    #Initialize response cache
+    cache = SimpleScraper.configure_cache(CACHE_PATH, max_size = CACHE_MAX_MB * 1024 ** 2, ttls = CACHE_TTLS)
+
+    #Initialize adaptive per-host rate limiter shared by requests and browsers
+    limiter = None
+    if RATE_LIMIT > 0:
+        limiter = SimpleScraper.configure_limiter(
+            rate = RATE_LIMIT, max_rate = RATE_LIMIT_MAX,
+            concurrency = max(CONCURRENCY, DRIVERS), max_concurrency = max(CONCURRENCY, DRIVERS)
+        )
+
+    #Initialize proxy pool shared by requests and browsers
+    proxies = SimpleScraper.configure_proxies(PROXIES, rotate_every = PROXY_ROTATE_EVERY)
+    return cache, limiter, proxies
+
+def list_links(pages = None, first_page = 1):
+    """
+    Crawl games links from the ranking pages given by GAMES_URL and BASE_URL environment variables.
+    ARGS
+    ----
+    pages   [int]   number of ranking pages. Defaults to PAGES environment variable or 2
+    first_page  [int]   number of the first page
+
+    RETURN
+    ------
+    list of links in rank order
+    """
+    pages = pages or int(os.getenv("PAGES") or 2)
+    crawler = ListCrawler(os.getenv("GAMES_URL"), os.getenv("BASE_URL"), concurrency = int(os.getenv("CONCURRENCY") or 8))
+    return crawler.crawl(pages, first_page)
+
+def main(links = None, factory = None):
+    """
+    Run the crawl configured by environment variables: links -> pages -> Game -> sinks.
+    ARGS
+    ----
+    links   [list]  games links to scrape. If None then they are crawled from the ranking pages
+    factory [callable]  function returning scrapers of the html backend, see ScraperPool. Defaults to headless Scraper
+    """
     #Load variables
+    from dotenv import load_dotenv
     load_dotenv()
     #Set variables
     baseURL = os.getenv("BASE_URL")
     bggURL = os.getenv("CATEGORIES_URL")
     gamesURL = os.getenv("GAMES_URL")
-    shopURL = os.getenv("SHOP_URL")
-    TIMEOUT = os.getenv("TIMEOUT")
+    TIMEOUT = float(os.getenv("TIMEOUT") or 10)
     PROXY = os.getenv("PROXY") or None
-    pages = 2
-    LIMIT = 2
-    iter = 0
+    CONCURRENCY = int(os.getenv("CONCURRENCY") or 8)
+    DRIVERS = int(os.getenv("DRIVERS") or 1)
+    DRIVER_MAX_PAGES = int(os.getenv("DRIVER_MAX_PAGES") or 50)
+    #Number of parsing processes. If 0 then pages are parsed in the driver threads
+    PARSE_WORKERS = int(os.getenv("PARSE_WORKERS") or 0)
+    PARSE_QUEUE = int(os.getenv("PARSE_QUEUE") or 0) or None
+    BACKEND = os.getenv("BACKEND") or "html"
+    XMLAPI_URL = os.getenv("XMLAPI_URL") or "https://boardgamegeek.com/xmlapi2"
+    XMLAPI_BATCH = int(os.getenv("XMLAPI_BATCH") or 20)
+    OUTPUT = os.getenv("OUTPUT") or "games.jsonl"
+    DELTA_INDEX = os.getenv("DELTA_INDEX") or None
+    DELTA_OUTPUT = os.getenv("DELTA_OUTPUT") or None
+    INDEX_PATH = os.getenv("INDEX_PATH") or None
+    STATS_PATH = os.getenv("STATS_PATH") or None
+    TAGS_PATH = os.getenv("TAGS_PATH") or None
+    SEARCH_INDEX = os.getenv("SEARCH_INDEX") or None
+    PARQUET_DIR = os.getenv("PARQUET_DIR") or None
+    METRICS_PATH = os.getenv("METRICS_PATH") or None
+    LOG_LEVEL = os.getenv("LOG_LEVEL") or "WARNING"
+    JOURNAL_PATH = os.getenv("JOURNAL_PATH") or None
+    JOURNAL_MAX_ATTEMPTS = int(os.getenv("JOURNAL_MAX_ATTEMPTS") or 3)
+    RENDER_PROFILE = os.getenv("RENDER_PROFILE") or "lean"
+    #Game pages load their scripts from geekdo-static.com, other third-party hosts are blocked
+    RENDER_HOSTS = [host.strip() for host in (os.getenv("RENDER_HOSTS") or "").split(",") if host.strip()] or [
+        host for host in (urlparse(baseURL or "").hostname, "geekdo-static.com") if host
+    ]
+    if BACKEND not in ("html", "xmlapi"):
+        raise ValueError("Unknown backend {}. Expected html or xmlapi.".format(BACKEND))
+    if RENDER_PROFILE not in ("lean", "full"):
+        raise ValueError("Unknown render profile {}. Expected lean or full.".format(RENDER_PROFILE))
+    pages = int(os.getenv("PAGES") or 2)
     games_links = []
 
-    #Initialize scraper
-    reqScraper = SimpleScraper(bggURL)
-
-    #Get categories
-    categories = reqScraper.scrape('a', parent = reqScraper.scrape('table', get_text = False, all_results = False))
-
-    #Get games links
-    for page_no in range(1, pages + 1):
-        pageURL = gamesURL + "/" + str(page_no)
-        reqScraper.set_page(pageURL)
-        games_links.extend(
-            reqScraper.scrape(
-                'a',
-                class_ = "primary",
-                get_text = False,
-                parent = reqScraper.scrape('table', id_ = "collectionitems", get_text = False, all_results = False)
+    logging.basicConfig(level = LOG_LEVEL)
+    #Open crawl journal to resume interrupted run
+    journal = CrawlJournal(JOURNAL_PATH) if JOURNAL_PATH else None
+    if journal is not None and journal.links_complete and links is not None and list(dict.fromkeys(links)) != journal.links():
+        #Given links belong to a new run, journal of the unfinished one is dropped
+        journal.reset()
+    resumed = journal is not None and journal.links_complete
+
+    #Initialize response cache, rate limiter and proxy pool shared by requests and browsers
+    cache, limiter, proxies = configure_from_env()
+
+    #Get games links. Resumed crawl takes them from the journal
+    if resumed:
+        games_links = journal.links()
+    else:
+        games_links = list(links) if links is not None else ListCrawler(gamesURL, baseURL, concurrency = CONCURRENCY).crawl(pages)
+        if journal is not None:
+            journal.add_links(games_links, complete = True)
+    print("Games links: {}".format(len(games_links)))
+    #Links are listed in rank order, a game moving between pages keeps its better rank
+    ranks = {}
+    for rank, link in enumerate(games_links, 1):
+        ranks.setdefault(link, rank)
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Games links: %s", games_links)
+    #Skip games which are already scraped
+    if journal is not None:
+        games_links = journal.pending_links(max_attempts = JOURNAL_MAX_ATTEMPTS)
+        print("Games to scrape: {}, journal: {}".format(len(games_links), journal.counts()))
+
+    #Open index of games, categories and tags queried by dashboards
+    index = None
+    if INDEX_PATH:
+        from bg_index import GameIndex, index_games
+        index = GameIndex(INDEX_PATH)
+        #Get categories
+        reqScraper = SimpleScraper(bggURL)
+        categories = reqScraper.scrape('a', parent = reqScraper.scrape('table', get_text = False, all_results = False))
+        print("Categories indexed: {}".format(index.add_categories(categories)))
+
+    #Open aggregate statistics served to dashboards
+    stats = None
+    if STATS_PATH:
+        from bg_stats import GameStats, update_stats
+        stats = GameStats(STATS_PATH)
+
+    #Load tag similarity engine of the previous runs
+    tags = None
+    if TAGS_PATH:
+        from bg_tags import TagSimilarity, track_tags
+        tags = TagSimilarity.load(TAGS_PATH) if os.path.exists(TAGS_PATH) else TagSimilarity()
+
+    #Open full-text search index of titles and descriptions
+    search = None
+    if SEARCH_INDEX:
+        from bg_search import SearchIndex, index_records
+        search = SearchIndex(SEARCH_INDEX)
+
+    #Open index of the previous run to emit only changed games
+    delta = None
+    if DELTA_INDEX:
+        from bg_delta import DeltaIndex, delta_path, track_changes, finish_delta
+        DELTA_OUTPUT = DELTA_OUTPUT or delta_path(OUTPUT)
+        delta = DeltaIndex(DELTA_INDEX)
+        delta.begin()
+
+    #Stream games through the pipeline: links -> pages -> Game -> sink
+    with ExitStack() as stack:
+        writer = stack.enter_context(JSONLWriter(OUTPUT, append = resumed))
+        if delta is not None:
+            delta_writer = stack.enter_context(JSONLWriter(DELTA_OUTPUT, append = False))
+
+        def to_sinks(games):
+            #Chain the enabled stores after the output
+            if index is not None:
+                games = index_games(games, index, ranks)
+            if stats is not None:
+                games = update_stats(games, stats, ranks)
+            if tags is not None:
+                games = track_tags(games, tags)
+            if search is not None:
+                games = index_records(games, search)
+            if delta is not None:
+                games = track_changes(games, delta, delta_writer)
+            return games
+
+        if resumed:
+            #Games scraped before the run was interrupted are not scraped again, but the stores may have lost
+            #their uncommitted batches. Sinks replace games with the same keys, so replayed records are stored once
+            for _ in to_sinks(journal.records()):
+                pass
+        pool = parser = None
+        if BACKEND == "xmlapi":
+            #Read games from the XML API in batches
+            games = XMLAPIBackend(XMLAPI_URL, batch_size = XMLAPI_BATCH).iter_games(games_links)
+        else:
+            #Initialize scrapers for dynamically filled webpage and render games in parallel
+            pool = stack.enter_context(
+                ScraperPool(
+                    DRIVERS, timeout = TIMEOUT, proxy = PROXY, max_pages = DRIVER_MAX_PAGES, regions = Game.REGIONS,
+                    lean = RENDER_PROFILE == "lean", allowed_hosts = RENDER_HOSTS, wait = Game.REGIONS, proxy_pool = proxies,
+                    factory = factory
+                )
             )
-        )
-    games_links = [ baseURL + link.get('href') for link in games_links]
-    print(games_links)
+            if PARSE_WORKERS > 0:
+                #Drivers only render pages, parsing runs in worker processes
+                parser = stack.enter_context(ParsePool(PARSE_WORKERS, max_pending = PARSE_QUEUE))
+                games = parser.imap(pool.imap(page_source, games_links))
+            else:
+                games = pool.imap(scrape_game_page, games_links)
+        done = set()
+        debug = logger.isEnabledFor(logging.DEBUG)
+        games = to_sinks(sink_games(games, writer, journal))
+        for link, game in games:
+            if debug:
+                logger.debug("Scraped %s: %s", link, game.title)
+            done.add(link)
+        if pool is not None:
+            failed = dict(pool.failed)
+            if parser is not None:
+                failed.update(parser.failed)
+        else:
+            failed = {link : "Game missing in XML API response" for link in games_links if link not in done}
+        for link, e in failed.items():
+            print("Failed to scrape {}: {}".format(link, e), file = sys.stderr)
+            if journal is not None:
+                journal.mark_failed(link, e)
+        if delta is not None:
+            #Games of this run which were not scraped, failed or out of attempts, are not known to be deleted
+            print("Delta written to {}: {}".format(DELTA_OUTPUT, finish_delta(delta, delta_writer, keep = ranks)))
+            delta.close()
+    print("Games written to {}: {}".format(OUTPUT, writer.written))
+    if index is not None:
+        #Games which dropped out of the ranking are removed, the others get their current rank
+        removed = index.retain(ranks)
+        print("Games indexed in {}: {}, removed: {}".format(INDEX_PATH, len(index), removed))
+        index.close()
+    if stats is not None:
+        stats.retain(ranks)
+        print("Statistics written to {}: {} groups".format(STATS_PATH, len(stats.groups())))
+        stats.close()
+    if tags is not None:
+        removed = tags.retain(ranks)
+        tags.save(TAGS_PATH)
+        print("Tags of {} games written to {}: {} tags, removed: {}".format(len(tags), TAGS_PATH, len(tags.tags), removed))
+    if search is not None:
+        removed = search.retain(ranks)
+        print("Search index {}: {} games in {} segments, removed: {}".format(SEARCH_INDEX, len(search), search.segments, removed))
+    #Export typed columnar snapshot for dashboards
+    if PARQUET_DIR:
+        from bg_export import export_parquet, read_jsonl
+        print("Games exported to {}".format(export_parquet(read_jsonl(OUTPUT), PARQUET_DIR)))
 
-    #Initialize scraper for dynamically filled webpage
-    dynamic_scraper = Scraper(bggURL, timeout = TIMEOUT, proxy = PROXY)
-    
-    #Scrape data for games individually
-    for link in games_links:
-        # print(link)
-        dynamic_scraper.set_page(link)
-        
-        #Get game parameters
-        params = dynamic_scraper.scrape('div', class_ = "gameplay-item-primary", get_text = False)
-        #Split paragraphs to single words
-        params = [re.split(r'[\t ]+', par.get_text()) for par in params]
-        #Remove empty elements
-        params = [list(filter(lambda t: t != "", par)) for par in params]
-        print(params)
-        #Parse games parameters
-        extracted_params = Game.extract_params(params)
-        print(extracted_params)
-        #Get release date and game title
-        release, title = Game.get_title_and_release_date(dynamic_scraper)
-        print(release, title)
-        #Get description
-        description = Game.get_descriptions(dynamic_scraper)
+    if cache is not None:
+        cache.report()
+        for key, value in cache.stats.items():
+            METRICS.set("cache_" + key, value)
+    if limiter is not None:
+        limiter.report()
+    if proxies is not None:
+        proxies.report()
+    if METRICS_PATH:
+        METRICS.export(METRICS_PATH)
+        print("Metrics written to {}".format(METRICS_PATH))
+    if journal is not None:
+        print("Journal: {}".format(journal.counts()))
+        if journal.finished(max_attempts = JOURNAL_MAX_ATTEMPTS):
+            #Nothing is left to retry, the next run starts a new crawl
+            journal.reset()
+        journal.close()
 
 if __name__ == "__main__":
     # pass
     main()
-    iter = 0
-    #Load variables
-    load_dotenv()
 
     # baseURL = os.getenv("BASE_URL")
     # bggURL = "https://boardgamegeek.com/browse/boardgamecategory"
@@ -0,0 +1,461 @@
+#!/usr/bin/python
+###IMPORTS###
+import os
+import re
+import sys
+import json
+import shutil
+from collections import Counter
+from dataclasses import asdict, is_dataclass
+
+import numpy as np
+
+
+###CONSTANTS###
+TOKEN_PATTERN = re.compile(r"\w+")
+#Title words are counted as if they occurred this many times
+TITLE_BOOST = 3
+#BM25 parameters
+K1 = 1.2
+B = 0.75
+FORMAT_VERSION = 1
+
+
+###CLASSES###
+class StringArray():
+    """
+    Read-only array of strings stored as UTF-8 blob and offsets, both memory-mapped.
+    Sorted arrays support binary search of terms and prefixes.
+    """
+    def __init__(self, blob_path, offsets_path):
+        self.__offsets = np.load(offsets_path, mmap_mode = "r")
+        size = os.path.getsize(blob_path)
+        #Empty files cannot be mapped
+        self.__blob = np.memmap(blob_path, dtype = np.uint8, mode = "r") if size else np.zeros(0, dtype = np.uint8)
+
+    @staticmethod
+    def write(strings, blob_path, offsets_path):
+        encoded = [string.encode("utf-8") for string in strings]
+        offsets = np.zeros(len(encoded) + 1, dtype = np.int64)
+        np.cumsum([len(value) for value in encoded], out = offsets[1:])
+        with open(blob_path, "wb") as f:
+            f.write(b"".join(encoded))
+        np.save(offsets_path, offsets)
+
+    def __len__(self):
+        return len(self.__offsets) - 1
+
+    def raw(self, index):
+        return self.__blob[self.__offsets[index]:self.__offsets[index + 1]].tobytes()
+
+    def __getitem__(self, index):
+        return self.raw(index).decode("utf-8")
+
+    def bisect(self, value):
+        """Return index of the first string not lower than value, given as bytes. UTF-8 keeps code point order."""
+        low, high = 0, len(self)
+        while low < high:
+            middle = (low + high) // 2
+            if self.raw(middle) < value:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def find(self, string):
+        """Return index of the string or None."""
+        value = string.encode("utf-8")
+        index = self.bisect(value)
+        return index if index < len(self) and self.raw(index) == value else None
+
+    def prefix_range(self, prefix):
+        """Return (start, stop) range of strings starting with prefix."""
+        value = prefix.encode("utf-8")
+        #Byte 0xff never occurs in UTF-8
+        return self.bisect(value), self.bisect(value + b"\xff")
+
+
+
+class Segment():
+    """
+    Immutable part of the index: sorted lexicon, postings (document ids and term frequencies
+    grouped by term), document lengths, keys and titles. Deleted documents are marked in
+    the live mask, which is the only file rewritten after the segment is created.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.terms = StringArray(os.path.join(path, "terms.bin"), os.path.join(path, "terms.npy"))
+        self.keys = StringArray(os.path.join(path, "keys.bin"), os.path.join(path, "keys.npy"))
+        self.titles = StringArray(os.path.join(path, "titles.bin"), os.path.join(path, "titles.npy"))
+        self.term_ptr = np.load(os.path.join(path, "term_ptr.npy"), mmap_mode = "r")
+        self.docs = np.load(os.path.join(path, "docs.npy"), mmap_mode = "r")
+        self.tf = np.load(os.path.join(path, "tf.npy"), mmap_mode = "r")
+        self.doc_len = np.load(os.path.join(path, "doc_len.npy"), mmap_mode = "r")
+        self.live = np.load(os.path.join(path, "live.npy"))
+
+    def __len__(self):
+        return len(self.doc_len)
+
+    @staticmethod
+    def write(path, terms, term_ptr, docs, tf, doc_len, keys, titles):
+        """Write segment files into new directory."""
+        os.makedirs(path)
+        StringArray.write(terms, os.path.join(path, "terms.bin"), os.path.join(path, "terms.npy"))
+        StringArray.write(keys, os.path.join(path, "keys.bin"), os.path.join(path, "keys.npy"))
+        StringArray.write(titles, os.path.join(path, "titles.bin"), os.path.join(path, "titles.npy"))
+        np.save(os.path.join(path, "term_ptr.npy"), np.asarray(term_ptr, dtype = np.int64))
+        np.save(os.path.join(path, "docs.npy"), np.asarray(docs, dtype = np.int32))
+        np.save(os.path.join(path, "tf.npy"), np.asarray(tf, dtype = np.int32))
+        np.save(os.path.join(path, "doc_len.npy"), np.asarray(doc_len, dtype = np.int32))
+        np.save(os.path.join(path, "live.npy"), np.ones(len(keys), dtype = bool))
+
+    def save_live(self):
+        tmp_path = os.path.join(self.path, "live.tmp.npy")
+        np.save(tmp_path, self.live)
+        os.replace(tmp_path, os.path.join(self.path, "live.npy"))
+
+    def postings(self, term_index):
+        start, stop = self.term_ptr[term_index], self.term_ptr[term_index + 1]
+        return self.docs[start:stop], self.tf[start:stop]
+
+    def document_frequency(self, term_indices):
+        """Return numbers of live documents containing any of the terms, per term."""
+        return np.array([int(self.live[self.postings(index)[0]].sum()) for index in term_indices], dtype = np.int64)
+
+
+
+class SearchIndex():
+    """
+    Full-text index of game titles and descriptions ranked with BM25. The index is a directory of
+    segments whose arrays are memory-mapped, so a reader opens it without loading postings into RAM.
+    Updates write new segments and mark replaced documents as deleted. Segments are merged
+    when there are more than max_segments of them.
+
+    ATTRS
+    -----
+    path    [str]   index directory
+    """
+    def __init__(self, path, max_segments = 8):
+        """
+        ARGS
+        ----
+        path    [str]   index directory. Created if it does not exist
+        max_segments    [int]   number of segments above which all segments are merged into one
+        """
+        self.path = path
+        self.__max_segments = max_segments
+        os.makedirs(path, exist_ok = True)
+        meta_path = os.path.join(path, "meta.json")
+        if os.path.exists(meta_path):
+            with open(meta_path, encoding = 'utf-8') as f:
+                self.__meta = json.load(f)
+            if self.__meta["version"] != FORMAT_VERSION:
+                raise ValueError("Unsupported search index version {}.".format(self.__meta["version"]))
+        else:
+            self.__meta = {"version" : FORMAT_VERSION, "segments" : [], "next" : 1}
+        self.__segments = [Segment(os.path.join(path, name)) for name in self.__meta["segments"]]
+        self.__locations = None
+
+    def __len__(self):
+        return sum(int(segment.live.sum()) for segment in self.__segments)
+
+    @property
+    def segments(self):
+        return len(self.__segments)
+
+    def _save_meta_(self):
+        self.__meta["segments"] = [os.path.basename(segment.path) for segment in self.__segments]
+        tmp_path = os.path.join(self.path, "meta.tmp.json")
+        with open(tmp_path, "w", encoding = 'utf-8') as f:
+            json.dump(self.__meta, f)
+        os.replace(tmp_path, os.path.join(self.path, "meta.json"))
+
+    def _locations_(self):
+        """Return key -> (segment, document) of live documents. Built on first write."""
+        if self.__locations is None:
+            self.__locations = {}
+            for segment in self.__segments:
+                for doc in np.flatnonzero(segment.live):
+                    self.__locations[segment.keys[doc]] = (segment, doc)
+        return self.__locations
+
+    def _new_segment_path_(self):
+        name = "segment-{:06d}".format(self.__meta["next"])
+        self.__meta["next"] += 1
+        return os.path.join(self.path, name)
+
+    def update(self, records):
+        """
+        Add documents or replace documents with the same keys.
+        ARGS
+        ----
+        records [iterable]  (key, Game or dict) tuples
+
+        RETURN
+        ------
+        number of indexed documents
+        """
+        documents = {}
+        for key, record in records:
+            if is_dataclass(record):
+                record = asdict(record)
+            documents[key] = (record.get("title") or "", document_terms(record))
+        if not documents:
+            return 0
+        locations = self._locations_()
+        changed = set()
+        for key in documents:
+            location = locations.pop(key, None)
+            if location is not None:
+                location[0].live[location[1]] = False
+                changed.add(location[0])
+        keys = list(documents)
+        segment = self._write_segment_(keys, [documents[key][0] for key in keys], [documents[key][1] for key in keys])
+        for doc, key in enumerate(keys):
+            locations[key] = (segment, doc)
+        #New segment is referenced before old documents are deleted, so a crash leaves duplicates and not gaps
+        self._save_meta_()
+        for old in changed:
+            old.save_live()
+        if len(self.__segments) > self.__max_segments:
+            self.merge()
+        return len(keys)
+
+    def remove(self, keys):
+        """Mark documents as deleted. Return number of removed documents."""
+        locations = self._locations_()
+        changed = set()
+        removed = 0
+        for key in set(keys):
+            location = locations.pop(key, None)
+            if location is not None:
+                location[0].live[location[1]] = False
+                changed.add(location[0])
+                removed += 1
+        for segment in changed:
+            segment.save_live()
+        return removed
+
+    def retain(self, keys):
+        """
+        Remove documents whose keys are missing from keys, e.g. games which dropped out of the ranking.
+        ARGS
+        ----
+        keys    [container] keys of the games to keep
+
+        RETURN
+        ------
+        number of removed documents
+        """
+        return self.remove([key for key in self._locations_() if key not in keys])
+
+    def rebuild(self, records):
+        """Replace the whole index with given records."""
+        segments = self.__segments
+        self.__segments = []
+        self.__locations = {}
+        self._save_meta_()
+        for segment in segments:
+            shutil.rmtree(segment.path, ignore_errors = True)
+        return self.update(records)
+
+    def _write_segment_(self, keys, titles, counters):
+        """Invert term counters of documents and write them as a new segment. Return the segment."""
+        terms = sorted(set().union(*counters)) if counters else []
+        term_ids = {term : index for index, term in enumerate(terms)}
+        lengths = [sum(counter.values()) for counter in counters]
+        term_column, doc_column, tf_column = [], [], []
+        for doc, counter in enumerate(counters):
+            for term, count in counter.items():
+                term_column.append(term_ids[term])
+                doc_column.append(doc)
+                tf_column.append(count)
+        term_column = np.array(term_column, dtype = np.int64)
+        order = np.lexsort((np.array(doc_column, dtype = np.int64), term_column))
+        term_ptr = np.zeros(len(terms) + 1, dtype = np.int64)
+        np.cumsum(np.bincount(term_column, minlength = len(terms)), out = term_ptr[1:])
+        path = self._new_segment_path_()
+        Segment.write(
+            path, terms, term_ptr, np.array(doc_column, dtype = np.int32)[order], np.array(tf_column, dtype = np.int32)[order],
+            lengths, keys, titles
+        )
+        segment = Segment(path)
+        self.__segments.append(segment)
+        return segment
+
+    def merge(self):
+        """Merge live documents of all segments into a single segment."""
+        if len(self.__segments) <= 1 and all(segment.live.all() for segment in self.__segments):
+            return
+        terms, term_columns, doc_columns, tf_columns = set(), [], [], []
+        keys, titles, lengths = [], [], []
+        for segment in self.__segments:
+            terms.update(segment.terms[index] for index in range(len(segment.terms)))
+        terms = sorted(terms)
+        term_ids = {term : index for index, term in enumerate(terms)}
+        for segment in self.__segments:
+            live = np.flatnonzero(segment.live)
+            #New ids of live documents, -1 for deleted ones
+            remap = np.full(len(segment), -1, dtype = np.int64)
+            remap[live] = len(keys) + np.arange(len(live))
+            keys.extend(segment.keys[doc] for doc in live)
+            titles.extend(segment.titles[doc] for doc in live)
+            lengths.append(np.asarray(segment.doc_len)[live])
+            global_terms = np.array([term_ids[segment.terms[index]] for index in range(len(segment.terms))], dtype = np.int64)
+            counts = np.diff(segment.term_ptr)
+            term_column = np.repeat(global_terms, counts)
+            docs = remap[np.asarray(segment.docs)]
+            keep = docs >= 0
+            term_columns.append(term_column[keep])
+            doc_columns.append(docs[keep])
+            tf_columns.append(np.asarray(segment.tf)[keep])
+        term_column = np.concatenate(term_columns) if term_columns else np.zeros(0, dtype = np.int64)
+        doc_column = np.concatenate(doc_columns) if doc_columns else np.zeros(0, dtype = np.int64)
+        tf_column = np.concatenate(tf_columns) if tf_columns else np.zeros(0, dtype = np.int32)
+        #Drop terms which occur only in deleted documents
+        used = np.zeros(len(terms), dtype = bool)
+        used[term_column] = True
+        new_ids = np.cumsum(used) - 1
+        terms = [term for term, keep in zip(terms, used) if keep]
+        term_column = new_ids[term_column]
+        order = np.lexsort((doc_column, term_column))
+        term_ptr = np.zeros(len(terms) + 1, dtype = np.int64)
+        np.cumsum(np.bincount(term_column, minlength = len(terms)), out = term_ptr[1:])
+        old = self.__segments
+        path = self._new_segment_path_()
+        Segment.write(
+            path, terms, term_ptr, doc_column[order], tf_column[order],
+            np.concatenate(lengths) if lengths else np.zeros(0, dtype = np.int32), keys, titles
+        )
+        self.__segments = [Segment(path)]
+        self.__locations = None
+        self._save_meta_()
+        for segment in old:
+            shutil.rmtree(segment.path, ignore_errors = True)
+
+    def _expand_(self, tokens, prefix):
+        """Return per segment lists of term indices of the query, last token expanded as prefix if requested."""
+        expanded = []
+        for segment in self.__segments:
+            indices = []
+            for position, token in enumerate(tokens):
+                if prefix and position == len(tokens) - 1:
+                    start, stop = segment.terms.prefix_range(token)
+                    indices.append(list(range(start, stop)))
+                else:
+                    index = segment.terms.find(token)
+                    indices.append([] if index is None else [index])
+            expanded.append(indices)
+        return expanded
+
+    def search(self, query, n = 10, prefix = False):
+        """
+        Find documents matching the query, ranked with BM25.
+        ARGS
+        ----
+        query   [str]   words of the query
+        n   [int]   max number of results
+        prefix  [bool]  treat the last word as prefix, e.g. "gloom" matches "gloomhaven"
+
+        RETURN
+        ------
+        list of (key, score, title) tuples, best first
+        """
+        tokens = tokenize(query)
+        if not tokens or not self.__segments:
+            return []
+        expanded = self._expand_(tokens, prefix)
+        documents = sum(int(segment.live.sum()) for segment in self.__segments)
+        if documents == 0:
+            return []
+        average_length = sum(float(np.asarray(segment.doc_len)[segment.live].sum()) for segment in self.__segments) / documents
+        #Document frequency of each query token over all segments. Prefix token counts its terms separately
+        frequencies = []
+        for position in range(len(tokens)):
+            terms = {}
+            for segment, indices in zip(self.__segments, expanded):
+                for index, frequency in zip(indices[position], segment.document_frequency(indices[position])):
+                    term = segment.terms[index]
+                    terms[term] = terms.get(term, 0) + int(frequency)
+            frequencies.append(terms)
+        candidates = []
+        for segment, indices in zip(self.__segments, expanded):
+            scores = np.zeros(len(segment), dtype = np.float64)
+            norm = K1 * (1 - B + B * np.asarray(segment.doc_len, dtype = np.float64) / max(average_length, 1e-9))
+            for position, term_indices in enumerate(indices):
+                for index in term_indices:
+                    docs, tf = segment.postings(index)
+                    df = frequencies[position][segment.terms[index]]
+                    idf = np.log(1 + (documents - df + 0.5) / (df + 0.5))
+                    tf = np.asarray(tf, dtype = np.float64)
+                    scores[docs] += idf * tf * (K1 + 1) / (tf + norm[docs])
+            scores[~segment.live] = 0
+            hits = np.flatnonzero(scores > 0)
+            if len(hits) > n:
+                hits = hits[np.argpartition(-scores[hits], n)[:n]]
+            candidates.extend((float(scores[doc]), segment, int(doc)) for doc in hits)
+        candidates.sort(key = lambda candidate: -candidate[0])
+        return [(segment.keys[doc], score, segment.titles[doc]) for score, segment, doc in candidates[:n]]
+
+    def complete(self, prefix, n = 10):
+        """
+        Return terms starting with prefix, most frequent first, e.g. for search box suggestions.
+        RETURN
+        ------
+        list of (term, number of documents) tuples
+        """
+        prefix = prefix.lower()
+        counts = Counter()
+        for segment in self.__segments:
+            start, stop = segment.terms.prefix_range(prefix)
+            for index, frequency in zip(range(start, stop), segment.document_frequency(range(start, stop))):
+                if frequency:
+                    counts[segment.terms[index]] += int(frequency)
+        return sorted(counts.items(), key = lambda item: (-item[1], item[0]))[:n]
+
+
+###FUNCTIONS###
+def tokenize(text):
+    """Return lowercase words of the text."""
+    return TOKEN_PATTERN.findall(text.lower()) if text else []
+
+def document_terms(record):
+    """Return Counter of terms of the game title and description. Title words are boosted."""
+    counter = Counter(tokenize(record.get("description")))
+    for term in tokenize(record.get("title")):
+        counter[term] += TITLE_BOOST
+    return counter
+
+def index_records(games, index, batch_size = 1000):
+    """
+    Update the search index in batches as games pass.
+    RETURN
+    ------
+    generator of the same (key, game) tuples
+    """
+    batch = []
+    for key, game in games:
+        batch.append((key, game))
+        if len(batch) >= batch_size:
+            index.update(batch)
+            batch = []
+        yield key, game
+    if batch:
+        index.update(batch)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 4 or sys.argv[1] not in ("build", "search"):
+        print("Usage: bg_search.py build GAMES_JSONL INDEX_DIR | search INDEX_DIR QUERY", file = sys.stderr)
+        sys.exit(1)
+    if sys.argv[1] == "build":
+        with open(sys.argv[2], encoding = 'utf-8') as f:
+            records = [json.loads(line) for line in f if line.strip()]
+        #Games are keyed by link like in the crawl, so the crawl updates the rebuilt index in place
+        missing = sum(1 for record in records if not record.get("link"))
+        if missing:
+            print("Skipped {} records without link".format(missing), file = sys.stderr)
+        print(SearchIndex(sys.argv[3]).rebuild((record["link"], record) for record in records if record.get("link")))
+    else:
+        for key, score, title in SearchIndex(sys.argv[2]).search(" ".join(sys.argv[3:]), prefix = True):
+            print("{:.3f}\t{}\t{}".format(score, title, key))
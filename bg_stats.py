@@ -0,0 +1,398 @@
+#!/usr/bin/python
+###IMPORTS###
+import os
+import json
+import sqlite3
+import threading
+from dataclasses import asdict, is_dataclass
+
+import numpy as np
+import pandas as pd
+
+
+###CONSTANTS###
+#Bump when layout of aggregates changes, so cached values of older layouts are not served
+SCHEMA_VERSION = 1
+#Group holding statistics of all games
+ALL = "__all__"
+#Numeric columns of the statistics table
+COLUMNS = ("category", "rank", "weight", "time_min", "time_max", "players_min", "players_max", "release")
+#Histogram bins. Last bin is open
+HISTOGRAMS = {
+    "weight" : ("weight", [1, 1.5, 2, 2.5, 3, 3.5, 4, 4.5, np.inf]),
+    "time" : ("time_max", [0, 30, 60, 90, 120, 180, 240, np.inf]),
+    "rank" : ("rank", [1, 101, 501, 1001, 5001, 10001, np.inf])
+}
+#Summary values which are whole numbers
+INTEGER_SUMMARIES = ("games", "rank_best", "release_min", "release_max")
+#Player counts of the player count distribution. Last one counts games for this many players or more
+PLAYER_COUNTS = range(1, 9)
+RANGE_PATTERN = r"(\d+)(?:\s*[–-]\s*(\d+))?"
+
+
+###CLASSES###
+class GameStats():
+    """
+    Aggregate statistics of games per category, materialized once per batch of records and stored
+    in SQLite with versioned keys. A batch reads and invalidates only the categories its records belong to
+    (before and after the update), other groups keep their cached aggregates. ALL group needs every game,
+    so update_stats() refreshes it once after the last batch.
+    Dashboards read aggregates through get(), which serves them from memory while their version holds.
+
+    ATTRS
+    -----
+    path    [str]   path to the statistics file
+    """
+    def __init__(self, path, memo_size = 256):
+        """
+        ARGS
+        ----
+        path    [str]   path to the statistics file. Parent directories are created
+        memo_size   [int]   max number of aggregates kept in memory by get()
+        """
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok = True)
+        self.__path = path
+        self.__lock = threading.Lock()
+        self.__db = sqlite3.connect(path, check_same_thread = False)
+        self.__db.executescript(
+            """
+            PRAGMA journal_mode = WAL;
+            CREATE TABLE IF NOT EXISTS games (
+                key TEXT PRIMARY KEY,
+                category TEXT,
+                rank INTEGER,
+                weight REAL,
+                time_min REAL,
+                time_max REAL,
+                players_min REAL,
+                players_max REAL,
+                release INTEGER
+            );
+            CREATE INDEX IF NOT EXISTS games_category ON games (category);
+            CREATE TABLE IF NOT EXISTS groups (name TEXT PRIMARY KEY, version INTEGER NOT NULL);
+            CREATE TABLE IF NOT EXISTS aggregates (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+            """
+        )
+        self.__db.commit()
+        self.__memo = {}
+        self.__memo_size = memo_size
+
+    @property
+    def path(self):
+        return self.__path
+
+    def __len__(self):
+        with self.__lock:
+            return self.__db.execute("SELECT COUNT(*) FROM games").fetchone()[0]
+
+    def _categories_(self, keys):
+        """Return categories of stored games with given keys. Caller holds the lock."""
+        categories = set()
+        keys = list(keys)
+        for start in range(0, len(keys), 500):
+            chunk = keys[start:start + 500]
+            categories.update(row[0] for row in self.__db.execute(
+                "SELECT DISTINCT category FROM games WHERE key IN ({})".format(",".join("?" * len(chunk))), chunk
+            ))
+        return categories
+
+    def update(self, games, ranks = None, all_group = True):
+        """
+        Store batch of games and recompute aggregates of the groups it touches.
+        ARGS
+        ----
+        games   [iterable]  (key, Game or dict) tuples
+        ranks   [dict]  key -> rank of the game. Games without rank keep the stored one
+        all_group   [bool]  refresh ALL group too. If False then call refresh([ALL]) after the last batch
+
+        RETURN
+        ------
+        set of refreshed groups
+        """
+        frame = stats_frame(games, ranks)
+        if frame.empty:
+            return set()
+        rows = [
+            tuple(None if pd.isna(value) else value.item() if isinstance(value, np.generic) else value for value in row)
+            for row in frame[list(COLUMNS)].itertuples(name = None)
+        ]
+        with self.__lock:
+            touched = self._categories_(frame.index) | set(frame["category"].dropna())
+            self.__db.executemany(
+                """
+                INSERT INTO games (key, {columns}) VALUES (?, {marks})
+                ON CONFLICT (key) DO UPDATE SET {updates}
+                """.format(
+                    columns = ", ".join(COLUMNS), marks = ", ".join("?" * len(COLUMNS)),
+                    updates = ", ".join(
+                        "{0} = COALESCE(excluded.{0}, games.{0})".format(column) if column == "rank" else "{0} = excluded.{0}".format(column)
+                        for column in COLUMNS
+                    )
+                ),
+                rows
+            )
+            return self._refresh_(touched, all_group)
+
+    def remove(self, keys):
+        """Remove games and recompute aggregates of their groups. Return set of refreshed groups."""
+        keys = list(keys)
+        with self.__lock:
+            touched = self._categories_(keys)
+            self.__db.executemany("DELETE FROM games WHERE key = ?", [(key,) for key in keys])
+            return self._refresh_(touched)
+
+    def retain(self, ranks):
+        """
+        Match statistics with the ranking of a finished run. Games missing from the ranking are removed,
+        ranks of the others are set from it.
+        ARGS
+        ----
+        ranks   [dict]  key -> rank of every game of the run
+
+        RETURN
+        ------
+        set of refreshed groups
+        """
+        with self.__lock:
+            stored = self.__db.execute("SELECT key, rank FROM games").fetchall()
+            removed = [key for key, _ in stored if key not in ranks]
+            changed = [(ranks[key], key) for key, rank in stored if key in ranks and rank != ranks[key]]
+            if not removed and not changed:
+                return set()
+            touched = self._categories_(removed + [key for _, key in changed])
+            self.__db.executemany("DELETE FROM games WHERE key = ?", [(key,) for key in removed])
+            self.__db.executemany("UPDATE games SET rank = ? WHERE key = ?", changed)
+            return self._refresh_(touched)
+
+    def refresh(self, groups = None):
+        """
+        Recompute aggregates of groups.
+        ARGS
+        ----
+        groups  [iterable]  group names, ALL included. If None then all groups are refreshed, e.g. after SCHEMA_VERSION change
+
+        RETURN
+        ------
+        set of refreshed groups
+        """
+        with self.__lock:
+            if groups is None:
+                groups = {row[0] for row in self.__db.execute("SELECT name FROM groups")}
+                groups |= {row[0] for row in self.__db.execute("SELECT DISTINCT category FROM games")} | {ALL}
+            groups = set(groups)
+            return self._refresh_(groups - {ALL}, ALL in groups)
+
+    def _read_(self, categories = None):
+        """Read COLUMNS of games in given categories, of all games if None. Caller holds the lock."""
+        query = "SELECT {} FROM games".format(", ".join(COLUMNS))
+        params = ()
+        if categories is not None:
+            query += " WHERE category IN (SELECT value FROM json_each(?))"
+            params = (json.dumps(sorted(categories)),)
+        frame = pd.read_sql_query(query, self.__db, params = params)
+        #Columns holding only NULLs are read as objects
+        return frame.astype({column : float for column in COLUMNS if column != "category"})
+
+    def _refresh_(self, categories, all_group = True):
+        """Recompute and store aggregates of given categories and, if all_group is True, of ALL. Caller holds the lock."""
+        categories = {category for category in categories if category is not None and category != ALL}
+        groups = categories | {ALL} if all_group else categories
+        values = aggregate(self._read_(categories)) if categories else {}
+        if all_group:
+            values.update(aggregate(self._read_().assign(category = ALL)))
+        for group in groups:
+            value = values.get(group)
+            version = self.__db.execute("SELECT version FROM groups WHERE name = ?", (group,)).fetchone()
+            if version is not None:
+                self.__db.execute("DELETE FROM aggregates WHERE key = ?", (cache_key(group, version[0]),))
+            if value is None:
+                #All games of the group are gone
+                self.__db.execute("DELETE FROM groups WHERE name = ?", (group,))
+                continue
+            version = (version[0] if version is not None else 0) + 1
+            self.__db.execute("INSERT OR REPLACE INTO groups VALUES (?, ?)", (group, version))
+            self.__db.execute("INSERT INTO aggregates VALUES (?, ?)", (cache_key(group, version), json.dumps(value)))
+        self.__db.commit()
+        return groups
+
+    def key(self, group = ALL):
+        """Return current cache key of the group or None if it has no aggregates."""
+        with self.__lock:
+            row = self.__db.execute("SELECT version FROM groups WHERE name = ?", (group,)).fetchone()
+        return cache_key(group, row[0]) if row else None
+
+    def get(self, group = ALL):
+        """
+        Return aggregates of the group.
+        ARGS
+        ----
+        group   [str]   category name or ALL
+
+        RETURN
+        ------
+        dictionary with number of games, summary values and distributions, or None for unknown group
+        """
+        key = self.key(group)
+        if key is None:
+            return None
+        value = self.__memo.get(key)
+        if value is None:
+            with self.__lock:
+                row = self.__db.execute("SELECT value FROM aggregates WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            value = json.loads(row[0])
+            with self.__lock:
+                if len(self.__memo) >= self.__memo_size:
+                    self.__memo.pop(next(iter(self.__memo)))
+                self.__memo[key] = value
+        return value
+
+    def groups(self):
+        """Return dictionary group -> number of games, ALL included."""
+        with self.__lock:
+            names = [row[0] for row in self.__db.execute("SELECT name FROM groups ORDER BY name")]
+        return {name : self.get(name)["games"] for name in names}
+
+    def distribution(self, group, name):
+        """Return distribution of the group, e.g. distribution("Adventure", "weight"). None for unknown group."""
+        value = self.get(group)
+        return None if value is None else value["distributions"][name]
+
+    def close(self):
+        with self.__lock:
+            self.__db.commit()
+            self.__db.close()
+
+
+###FUNCTIONS###
+def cache_key(group, version):
+    """Return versioned cache key of the group aggregates."""
+    return "v{}/{}/{}".format(SCHEMA_VERSION, group, version)
+
+def _range_columns_(values):
+    """Parse ranges like "1–4", "60" or "14+" to float columns (low, high)."""
+    parts = pd.Series(values, dtype = object).astype("string").str.extract(RANGE_PATTERN)
+    low = pd.to_numeric(parts[0], errors = "coerce")
+    high = pd.to_numeric(parts[1], errors = "coerce").fillna(low)
+    return low.to_numpy(dtype = float), high.to_numpy(dtype = float)
+
+def stats_frame(games, ranks = None):
+    """
+    Build numeric table of games used by the aggregates.
+    ARGS
+    ----
+    games   [iterable]  (key, Game or dict) tuples. Later record of the same key wins
+    ranks   [dict]  key -> rank of the game
+
+    RETURN
+    ------
+    pandas.DataFrame indexed by key with COLUMNS
+    """
+    ranks = ranks or {}
+    records = {}
+    for key, game in games:
+        records[key] = asdict(game) if is_dataclass(game) else game
+    keys = list(records)
+    records = list(records.values())
+    frame = pd.DataFrame(index = pd.Index(keys, dtype = object, name = "key"))
+    frame["category"] = pd.Series([record.get("category") for record in records], index = frame.index, dtype = object)
+    frame["rank"] = pd.to_numeric(pd.Series([ranks.get(key) for key in keys], index = frame.index, dtype = object), errors = "coerce")
+    frame["weight"] = pd.to_numeric(pd.Series([record.get("weight") for record in records], index = frame.index, dtype = object), errors = "coerce")
+    frame["time_min"], frame["time_max"] = _range_columns_([record.get("time") for record in records])
+    frame["players_min"], frame["players_max"] = _range_columns_([record.get("players") for record in records])
+    frame["release"] = pd.to_numeric(pd.Series([record.get("release") for record in records], index = frame.index, dtype = object), errors = "coerce")
+    return frame
+
+def _json_value_(value):
+    """Convert NumPy scalar to JSON value, NaN to None."""
+    if value is None or pd.isna(value):
+        return None
+    value = value.item() if isinstance(value, np.generic) else value
+    return round(value, 4) if isinstance(value, float) else value
+
+def _bin_labels_(bins):
+    return [
+        "{:g}+".format(low) if np.isinf(high) else "{:g}-{:g}".format(low, high)
+        for low, high in zip(bins[:-1], bins[1:])
+    ]
+
+def aggregate(frame):
+    """
+    Compute aggregates of all categories of the frame with vectorized group-bys.
+    ARGS
+    ----
+    frame   [DataFrame] table with COLUMNS
+
+    RETURN
+    ------
+    dictionary category -> aggregates
+    """
+    frame = frame[frame["category"].notna()]
+    if frame.empty:
+        return {}
+    groups = frame.groupby("category", sort = True)
+    summary = groups.agg(
+        games = ("category", "size"),
+        weight_mean = ("weight", "mean"),
+        weight_median = ("weight", "median"),
+        time_median = ("time_max", "median"),
+        rank_best = ("rank", "min"),
+        rank_median = ("rank", "median"),
+        release_min = ("release", "min"),
+        release_max = ("release", "max")
+    )
+    histograms = {}
+    for name, (column, bins) in HISTOGRAMS.items():
+        labels = _bin_labels_(bins)
+        binned = pd.cut(frame[column], bins, right = False, labels = labels)
+        histograms[name] = (
+            pd.crosstab(frame["category"], binned, dropna = False).reindex(index = summary.index, columns = labels, fill_value = 0)
+        )
+    #Game supports n players if n is in its range, the last count includes larger groups
+    counts = np.array(PLAYER_COUNTS, dtype = float)
+    low = frame["players_min"].to_numpy()[:, None]
+    high = frame["players_max"].to_numpy()[:, None]
+    supports = (low <= counts) & (high >= counts)
+    supports[:, -1] = high[:, 0] >= counts[-1]
+    players = pd.DataFrame(supports, index = frame.index, columns = [str(n) for n in PLAYER_COUNTS]).groupby(frame["category"]).sum()
+    players.columns = players.columns[:-1].tolist() + ["{}+".format(PLAYER_COUNTS[-1])]
+    result = {}
+    for category, row in summary.to_dict(orient = "index").items():
+        value = {name : _json_value_(row[name]) for name in summary.columns}
+        for name in INTEGER_SUMMARIES:
+            value[name] = None if value[name] is None else int(value[name])
+        value["distributions"] = {
+            name : {label : int(count) for label, count in histogram.loc[category].items()}
+            for name, histogram in histograms.items()
+        }
+        value["distributions"]["players"] = {label : int(count) for label, count in players.loc[category].items()}
+        result[category] = value
+    return result
+
+def update_stats(games, stats, ranks = None, batch_size = 500):
+    """
+    Update statistics in batches as games pass.
+    ARGS
+    ----
+    games   [iterable]  (key, Game or dict) tuples
+    stats   [GameStats] statistics store
+    ranks   [dict]  key -> rank of the game
+    batch_size  [int]   number of games stored at once. Each batch refreshes the categories it touches,
+                        ALL group is refreshed once after the last batch
+
+    RETURN
+    ------
+    generator of the same (key, game) tuples
+    """
+    batch = []
+    for key, game in games:
+        batch.append((key, game))
+        if len(batch) >= batch_size:
+            stats.update(batch, ranks, all_group = False)
+            batch = []
+        yield key, game
+    if batch:
+        stats.update(batch, ranks, all_group = False)
+    stats.refresh([ALL])
@@ -0,0 +1,270 @@
+#!/usr/bin/python
+###IMPORTS###
+import sys
+import time
+from dataclasses import fields, asdict
+
+import numpy as np
+import pandas as pd
+
+from bg_scraper import Game
+
+
+###CLASSES###
+class StringPool():
+    """
+    Interned strings of a single column. Each distinct value is stored once and
+    referenced by its integer code. Missing value has code -1.
+
+    ATTRS
+    -----
+    values  [list]  distinct strings in order of first occurrence
+    """
+    __slots__ = ("values", "__codes")
+
+    def __init__(self):
+        self.values = []
+        self.__codes = {}
+
+    def code(self, value):
+        """Return code of the value, adding it to the pool if it is new."""
+        if value is None:
+            return -1
+        value = str(value)
+        code = self.__codes.get(value)
+        if code is None:
+            code = len(self.values)
+            self.__codes[value] = code
+            self.values.append(sys.intern(value))
+        return code
+
+    def lookup(self, value):
+        """Return code of the value or None if it is not in the pool."""
+        return self.__codes.get(value)
+
+    def __len__(self):
+        return len(self.values)
+
+
+
+class GameTable():
+    """
+    Compact columnar store of Game records. Numeric fields are kept in NumPy arrays, repeated
+    strings (category, publisher, players, age, time and tags) are interned and stored as codes,
+    tags are kept as flat codes array with row offsets.
+
+    ATTRS
+    -----
+    pools   [dict]  column name -> StringPool of interned columns. Tags use the "tags" pool
+    """
+    INTERNED = ("players", "age", "time", "category", "publisher")
+    TEXT = ("title", "description")
+
+    def __init__(self, capacity = 1024):
+        """
+        ARGS
+        ----
+        capacity    [int]   initial number of rows. Arrays grow by doubling
+        """
+        self.__size = 0
+        self.__capacity = max(capacity, 1)
+        self.__text = {name : [] for name in GameTable.TEXT}
+        self.__codes = {name : np.full(self.__capacity, -1, dtype = np.int32) for name in GameTable.INTERNED}
+        self.__release = np.zeros(self.__capacity, dtype = np.int64)
+        self.__release_mask = np.ones(self.__capacity, dtype = bool)
+        self.__weight = np.full(self.__capacity, np.nan, dtype = np.float64)
+        self.__tag_codes = np.zeros(self.__capacity, dtype = np.int32)
+        self.__tag_offsets = np.zeros(self.__capacity + 1, dtype = np.int64)
+        self.pools = {name : StringPool() for name in GameTable.INTERNED + ("tags",)}
+
+    def __len__(self):
+        return self.__size
+
+    @property
+    def nbytes(self):
+        """Approximate memory used by the stored rows in bytes."""
+        size = self.__release.nbytes + self.__release_mask.nbytes + self.__weight.nbytes
+        size += self.__tag_codes.nbytes + self.__tag_offsets.nbytes
+        size += sum(codes.nbytes for codes in self.__codes.values())
+        for values in self.__text.values():
+            size += sys.getsizeof(values) + sum(sys.getsizeof(value) for value in values if value is not None)
+        for pool in self.pools.values():
+            size += sum(sys.getsizeof(value) for value in pool.values)
+        return size
+
+    def _reserve_(self, rows, tags):
+        """Grow arrays to fit given number of rows and tags."""
+        if rows > self.__capacity:
+            capacity = max(rows, 2 * self.__capacity)
+            for name, codes in self.__codes.items():
+                self.__codes[name] = np.concatenate([codes, np.full(capacity - self.__capacity, -1, dtype = np.int32)])
+            self.__release = np.resize(self.__release, capacity)
+            self.__release_mask = np.concatenate([self.__release_mask, np.ones(capacity - self.__capacity, dtype = bool)])
+            self.__weight = np.concatenate([self.__weight, np.full(capacity - self.__capacity, np.nan)])
+            self.__tag_offsets = np.resize(self.__tag_offsets, capacity + 1)
+            self.__capacity = capacity
+        if tags > len(self.__tag_codes):
+            self.__tag_codes = np.resize(self.__tag_codes, max(tags, 2 * len(self.__tag_codes)))
+
+    def append(self, record):
+        """Add single Game or dictionary with Game fields."""
+        self.extend([record])
+
+    def extend(self, records):
+        """
+        Add records in bulk.
+        ARGS
+        ----
+        records [iterable]  Game instances or dictionaries with Game fields
+        """
+        records = [asdict(record) if isinstance(record, Game) else record for record in records]
+        if not records:
+            return
+        start, end = self.__size, self.__size + len(records)
+        tags = [[self.pools["tags"].code(tag) for tag in (record.get("tags") or [])] for record in records]
+        tag_start = self.__tag_offsets[start]
+        tag_counts = np.fromiter((len(row) for row in tags), dtype = np.int64, count = len(tags))
+        self._reserve_(end, int(tag_start + tag_counts.sum()))
+        for name in GameTable.TEXT:
+            self.__text[name].extend(record.get(name) for record in records)
+        for name in GameTable.INTERNED:
+            pool = self.pools[name]
+            self.__codes[name][start:end] = [pool.code(record.get(name)) for record in records]
+        release = [record.get("release") for record in records]
+        self.__release_mask[start:end] = [value in (None, "") for value in release]
+        self.__release[start:end] = [int(value) if value not in (None, "") else 0 for value in release]
+        self.__weight[start:end] = [float(value) if value not in (None, "") else np.nan for value in (record.get("weight") for record in records)]
+        self.__tag_offsets[start + 1:end + 1] = tag_start + np.cumsum(tag_counts)
+        flat = [code for row in tags for code in row]
+        self.__tag_codes[tag_start:tag_start + len(flat)] = flat
+        self.__size = end
+
+    def tags(self, row):
+        """Return list of tags of the given row."""
+        pool = self.pools["tags"].values
+        return [pool[code] for code in self.__tag_codes[self.__tag_offsets[row]:self.__tag_offsets[row + 1]]]
+
+    def __getitem__(self, row):
+        """Return Game stored in the given row."""
+        if not -self.__size <= row < self.__size:
+            raise IndexError("Row {} out of range".format(row))
+        row %= self.__size
+        values = {name : self.__text[name][row] for name in GameTable.TEXT}
+        for name in GameTable.INTERNED:
+            code = self.__codes[name][row]
+            values[name] = self.pools[name].values[code] if code >= 0 else None
+        values["release"] = None if self.__release_mask[row] else int(self.__release[row])
+        values["weight"] = None if np.isnan(self.__weight[row]) else float(self.__weight[row])
+        values["tags"] = self.tags(row)
+        return Game(**values)
+
+    def __iter__(self):
+        for row in range(self.__size):
+            yield self[row]
+
+    def tag_matrix(self):
+        """Return CSR parts of the game x tag relation: (tag codes, row offsets, tag names)."""
+        n = self.__size
+        return self.__tag_codes[:self.__tag_offsets[n]], self.__tag_offsets[:n + 1], self.pools["tags"].values
+
+    def to_dataframe(self, tags_as_lists = True):
+        """
+        Build pandas DataFrame with Game columns. Interned columns become categoricals built from
+        the stored codes and numeric columns wrap the stored arrays without copying.
+        ARGS
+        ----
+        tags_as_lists   [bool]  if True then tags column holds lists. Otherwise tags are joined with "###"
+
+        RETURN
+        ------
+        pandas.DataFrame
+        """
+        n = self.__size
+        columns = {}
+        for f in fields(Game):
+            name = f.name
+            if name in GameTable.TEXT:
+                columns[name] = pd.Series(self.__text[name], dtype = object)
+            elif name in GameTable.INTERNED:
+                columns[name] = pd.Categorical.from_codes(
+                    self.__codes[name][:n], categories = pd.Index(self.pools[name].values, dtype = object)
+                )
+            elif name == "release":
+                columns[name] = pd.arrays.IntegerArray(self.__release[:n], self.__release_mask[:n])
+            elif name == "weight":
+                columns[name] = self.__weight[:n]
+            elif name == "tags":
+                rows = [self.tags(row) for row in range(n)]
+                columns[name] = pd.Series(rows if tags_as_lists else ["###".join(row) for row in rows], dtype = object)
+        return pd.DataFrame(columns, copy = False)
+
+
+###FUNCTIONS###
+def memory_benchmark(n = 500, seed = 0):
+    """
+    Compare the legacy per-row DataFrame appends with GameTable.
+    ARGS
+    ----
+    n   [int]   number of synthetic games
+    seed    [int]   seed of generated data
+
+    RETURN
+    ------
+    dictionary with time in seconds and retained memory in bytes for each approach
+    """
+    rng = np.random.default_rng(seed)
+    categories = ["Category {}".format(i) for i in range(80)]
+    publishers = ["Publisher {}".format(i) for i in range(500)]
+    mechanics = ["Mechanic {}".format(i) for i in range(180)]
+    games = [
+        Game(
+            title = "Game {}".format(i),
+            players = "{}–{}".format(1 + i % 2, 2 + i % 4),
+            release = int(1990 + i % 34),
+            tags = [mechanics[j] for j in rng.choice(len(mechanics), size = 1 + i % 6, replace = False)],
+            age = "{}+".format(8 + i % 7),
+            time = "{}".format(30 * (1 + i % 5)),
+            category = categories[i % len(categories)],
+            publisher = publishers[int(rng.integers(len(publishers)))],
+            description = "Description of game {} ".format(i) * 20,
+            weight = float(rng.uniform(1, 5))
+        )
+        for i in range(n)
+    ]
+    results = {}
+
+    start = time.perf_counter()
+    frame = pd.DataFrame({f.name : [] for f in fields(Game)})
+    for game in games:
+        record = asdict(game)
+        record["tags"] = "###".join(record["tags"])
+        frame.loc[len(frame)] = record
+    results["dataframe_appends"] = {
+        "seconds" : time.perf_counter() - start,
+        "bytes" : int(frame.memory_usage(deep = True).sum())
+    }
+    del frame
+
+    start = time.perf_counter()
+    table = GameTable()
+    table.extend(games)
+    results["game_table"] = {"seconds" : time.perf_counter() - start, "bytes" : table.nbytes}
+    start = time.perf_counter()
+    frame = table.to_dataframe(tags_as_lists = False)
+    results["game_table_dataframe"] = {
+        "seconds" : time.perf_counter() - start,
+        "bytes" : int(frame.memory_usage(deep = True).sum())
+    }
+    results["game_objects"] = {
+        "bytes" : sum(
+            sys.getsizeof(game) + sys.getsizeof(game.__dict__) + sys.getsizeof(game.tags)
+            + sum(sys.getsizeof(value) for value in game.__dict__.values())
+            for game in games
+        )
+    }
+    return results
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    for name, result in memory_benchmark(n).items():
+        print(name, result)
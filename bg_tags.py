@@ -0,0 +1,296 @@
+#!/usr/bin/python
+###IMPORTS###
+import os
+import json
+from dataclasses import asdict, is_dataclass
+
+import numpy as np
+
+try:
+    import scipy.sparse as sp
+except ImportError:
+    sp = None
+
+
+###CLASSES###
+class TagSimilarity():
+    """
+    Sparse game x tag matrix with tag co-occurrence and game similarity computed with sparse
+    linear algebra. Co-occurrence counts are updated incrementally from each batch of games,
+    weighted matrix used by similarity queries is rebuilt lazily after changes.
+
+    ATTRS
+    -----
+    keys    [list]  game keys in row order
+    tags    [list]  tag names in column order
+    """
+    def __init__(self):
+        _require_scipy_()
+        self.keys = []
+        self.tags = []
+        self.__rows = {}
+        self.__codes = {}
+        self.__row_tags = []
+        self.__cooccurrence = sp.csr_matrix((0, 0), dtype = np.int64)
+        self.__matrix = None
+        self.__weighted = None
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __contains__(self, key):
+        return key in self.__rows
+
+    def _code_(self, tag):
+        code = self.__codes.get(tag)
+        if code is None:
+            code = self.__codes[tag] = len(self.tags)
+            self.tags.append(tag)
+        return code
+
+    def _block_(self, rows):
+        """Build binary matrix of given tag code arrays with all current tag columns."""
+        lengths = np.fromiter((len(row) for row in rows), dtype = np.int64, count = len(rows))
+        indptr = np.zeros(len(rows) + 1, dtype = np.int64)
+        np.cumsum(lengths, out = indptr[1:])
+        indices = np.concatenate(rows) if rows else np.zeros(0, dtype = np.int32)
+        return sp.csr_matrix(
+            (np.ones(len(indices), dtype = np.int64), indices, indptr), shape = (len(rows), len(self.tags))
+        )
+
+    def update(self, games):
+        """
+        Add games or replace tags of known ones.
+        ARGS
+        ----
+        games   [iterable]  (key, Game, dict or list of tags) tuples
+
+        RETURN
+        ------
+        number of updated games
+        """
+        new_rows, old_rows = [], []
+        batch = {}
+        for key, game in games:
+            if is_dataclass(game):
+                game = asdict(game)
+            tags = game.get("tags") if isinstance(game, dict) else game
+            batch[key] = np.unique(np.array([self._code_(tag) for tag in (tags or []) if tag], dtype = np.int32))
+        for key, codes in batch.items():
+            row = self.__rows.get(key)
+            if row is None:
+                self.__rows[key] = len(self.keys)
+                self.keys.append(key)
+                self.__row_tags.append(codes)
+            else:
+                old_rows.append(self.__row_tags[row])
+                self.__row_tags[row] = codes
+            new_rows.append(codes)
+        if not batch:
+            return 0
+        size = len(self.tags)
+        cooccurrence = self.__cooccurrence.copy()
+        cooccurrence.resize((size, size))
+        new = self._block_(new_rows)
+        cooccurrence = cooccurrence + (new.T @ new).tocsr()
+        if old_rows:
+            old = self._block_(old_rows)
+            cooccurrence = cooccurrence - (old.T @ old).tocsr()
+            cooccurrence.eliminate_zeros()
+        self.__cooccurrence = cooccurrence
+        self.__matrix = None
+        self.__weighted = None
+        return len(batch)
+
+    def remove(self, keys):
+        """
+        Remove games and subtract their tags from co-occurrence. Tag columns are kept.
+        RETURN
+        ------
+        number of removed games
+        """
+        rows = sorted({self.__rows[key] for key in keys if key in self.__rows})
+        if not rows:
+            return 0
+        old = self._block_([self.__row_tags[row] for row in rows])
+        cooccurrence = self.__cooccurrence - (old.T @ old).tocsr()
+        cooccurrence.eliminate_zeros()
+        self.__cooccurrence = cooccurrence
+        removed = set(rows)
+        kept = [row for row in range(len(self.keys)) if row not in removed]
+        self.keys = [self.keys[row] for row in kept]
+        self.__row_tags = [self.__row_tags[row] for row in kept]
+        self.__rows = {key : row for row, key in enumerate(self.keys)}
+        self.__matrix = None
+        self.__weighted = None
+        return len(rows)
+
+    def retain(self, keys):
+        """Remove games missing from keys, e.g. games which dropped out of the ranking. Return number of removed games."""
+        return self.remove([key for key in self.keys if key not in keys])
+
+    @property
+    def matrix(self):
+        """Binary game x tag CSR matrix."""
+        if self.__matrix is None:
+            self.__matrix = self._block_(self.__row_tags)
+        return self.__matrix
+
+    @property
+    def cooccurrence(self):
+        """Tag x tag CSR matrix of numbers of games having both tags. Diagonal holds numbers of games per tag."""
+        return self.__cooccurrence
+
+    def _weighted_(self):
+        """Rows of the TF-IDF weighted game x tag matrix normalized to unit length."""
+        if self.__weighted is None:
+            matrix = self.matrix.astype(np.float64)
+            frequency = self.__cooccurrence.diagonal().astype(np.float64)
+            idf = np.log((1 + len(self.keys)) / (1 + frequency)) + 1
+            weighted = matrix @ sp.diags(idf)
+            norms = np.sqrt(np.asarray(weighted.multiply(weighted).sum(axis = 1)).ravel())
+            norms[norms == 0] = 1
+            self.__weighted = (sp.diags(1 / norms) @ weighted).tocsr()
+        return self.__weighted
+
+    @staticmethod
+    def _top_(scores, indices, n):
+        """Return (index, score) pairs of n highest positive scores."""
+        keep = scores > 0
+        scores, indices = scores[keep], indices[keep]
+        if len(scores) > n:
+            part = np.argpartition(-scores, n)[:n]
+            scores, indices = scores[part], indices[part]
+        order = np.lexsort((indices, -scores))
+        return [(int(indices[i]), float(scores[i])) for i in order]
+
+    def similar(self, key, n = 10):
+        """
+        Find games like the given one by cosine similarity of their TF-IDF weighted tags.
+        ARGS
+        ----
+        key [str]   game key
+        n   [int]   max number of games
+
+        RETURN
+        ------
+        list of (key, score) tuples, most similar first. Games without common tags are left out
+        """
+        row = self.__rows[key]
+        weighted = self._weighted_()
+        scores = (weighted @ weighted[row].T).toarray().ravel()
+        scores[row] = 0
+        return [(self.keys[index], score) for index, score in TagSimilarity._top_(scores, np.arange(len(scores)), n)]
+
+    def like_tags(self, tags, n = 10):
+        """Find games most similar to the set of tags. Return list of (key, score) tuples."""
+        codes = [self.__codes[tag] for tag in tags if tag in self.__codes]
+        if not codes:
+            return []
+        frequency = self.__cooccurrence.diagonal()[codes].astype(np.float64)
+        query = np.zeros(len(self.tags))
+        query[codes] = np.log((1 + len(self.keys)) / (1 + frequency)) + 1
+        scores = self._weighted_() @ (query / np.linalg.norm(query))
+        return [(self.keys[index], score) for index, score in TagSimilarity._top_(scores, np.arange(len(scores)), n)]
+
+    def all_similar(self, n = 10, chunk_size = 2048):
+        """
+        Find n most similar games of every game. Products are computed for chunks of rows,
+        so memory depends on chunk size and not on the square of the number of games.
+        RETURN
+        ------
+        generator of (key, [(key, score), ...]) tuples in row order
+        """
+        weighted = self._weighted_()
+        transposed = weighted.T.tocsr()
+        for start in range(0, len(self.keys), chunk_size):
+            scores = (weighted[start:start + chunk_size] @ transposed).tocsr()
+            for offset in range(scores.shape[0]):
+                row = start + offset
+                begin, end = scores.indptr[offset], scores.indptr[offset + 1]
+                indices, values = scores.indices[begin:end], scores.data[begin:end].copy()
+                values[indices == row] = 0
+                yield self.keys[row], [(self.keys[index], score) for index, score in TagSimilarity._top_(values, indices, n)]
+
+    def related_tags(self, tag, n = 10):
+        """
+        Find tags which occur together with the given one, ranked by Jaccard index of their games.
+        RETURN
+        ------
+        list of (tag, score) tuples
+        """
+        code = self.__codes[tag]
+        row = self.__cooccurrence[code]
+        frequency = self.__cooccurrence.diagonal()
+        indices, counts = row.indices, row.data.astype(np.float64)
+        scores = counts / (frequency[code] + frequency[indices] - counts)
+        scores[indices == code] = 0
+        return [(self.tags[index], score) for index, score in TagSimilarity._top_(scores, indices, n)]
+
+    def save(self, path):
+        """Save tags of games to NumPy archive. Co-occurrence is recomputed on load."""
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok = True)
+        matrix = self.matrix
+        tmp_path = path + ".tmp.npz"
+        np.savez_compressed(
+            tmp_path, indptr = matrix.indptr, indices = matrix.indices,
+            names = np.array(json.dumps({"keys" : self.keys, "tags" : self.tags}))
+        )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """Load engine saved by save()."""
+        with np.load(path) as archive:
+            names = json.loads(str(archive["names"]))
+            indptr, indices = archive["indptr"], archive["indices"]
+        engine = cls()
+        #Tags keep their columns, unused ones included
+        for tag in names["tags"]:
+            engine._code_(tag)
+        engine.update(
+            (key, [names["tags"][code] for code in indices[indptr[row]:indptr[row + 1]]])
+            for row, key in enumerate(names["keys"])
+        )
+        return engine
+
+    @classmethod
+    def from_table(cls, table, keys = None):
+        """
+        Build engine from GameTable.
+        ARGS
+        ----
+        table   [GameTable] stored games
+        keys    [list]  keys of table rows. Defaults to row numbers
+        """
+        codes, offsets, names = table.tag_matrix()
+        keys = keys if keys is not None else list(range(len(table)))
+        engine = cls()
+        engine.update(
+            (key, [names[code] for code in codes[offsets[row]:offsets[row + 1]]]) for row, key in enumerate(keys)
+        )
+        return engine
+
+
+###FUNCTIONS###
+def _require_scipy_():
+    if sp is None:
+        raise ImportError("scipy is required for the tag similarity engine. Install it with: pip install scipy")
+
+def track_tags(games, engine, batch_size = 500):
+    """
+    Update the engine in batches as games pass.
+    RETURN
+    ------
+    generator of the same (key, game) tuples
+    """
+    batch = []
+    for key, game in games:
+        batch.append((key, game))
+        if len(batch) >= batch_size:
+            engine.update(batch)
+            batch = []
+        yield key, game
+    if batch:
+        engine.update(batch)
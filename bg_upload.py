@@ -0,0 +1,304 @@
+#!/usr/bin/python
+###IMPORTS###
+import os
+import sys
+import json
+import gzip
+import time
+import shutil
+import hashlib
+import logging
+import datetime
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from bg_metrics import METRICS, BYTES_BUCKETS
+from bg_ratelimit import parse_retry_after
+
+
+###CONSTANTS###
+CONTENT_URL = "https://content.dropboxapi.com/2"
+#Dropbox requires chunks of upload sessions to be multiples of 4 MB
+CHUNK_SIZE = 8 * 1024 ** 2
+#Files up to this size are sent in a single request
+SINGLE_UPLOAD_LIMIT = 32 * 1024 ** 2
+#Formats which are compressed already and are sent as they are
+COMPRESSED_EXTENSIONS = (".gz", ".zst", ".zip", ".bz2", ".xz", ".parquet")
+
+logger = logging.getLogger(__name__)
+
+
+###CLASSES###
+class UploadManifest():
+    """
+    Record of uploaded files kept between runs. Files whose content hash did not change since
+    the last upload are skipped.
+
+    ATTRS
+    -----
+    path    [str]   path to the JSON manifest file. If None then manifest is kept in memory only
+    entries [dict]  local file path -> {"sha256", "remote", "size", "uploaded_at"}
+    """
+    def __init__(self, path = None):
+        self.path = path
+        self.entries = {}
+        self.__lock = threading.Lock()
+        if path and os.path.exists(path):
+            with open(path, encoding = 'utf-8') as f:
+                self.entries = json.load(f)
+
+    def unchanged(self, file, digest):
+        """Return True if the file with given content hash was uploaded already."""
+        with self.__lock:
+            entry = self.entries.get(os.path.abspath(file))
+        return entry is not None and entry["sha256"] == digest
+
+    def update(self, file, digest, remote, size):
+        """Record upload of the file and save the manifest."""
+        with self.__lock:
+            self.entries[os.path.abspath(file)] = {
+                "sha256" : digest,
+                "remote" : remote,
+                "size" : size,
+                "uploaded_at" : datetime.datetime.now().isoformat(timespec = "seconds")
+            }
+            self.save()
+
+    def save(self):
+        """Write manifest atomically. Caller holds the lock."""
+        if not self.path:
+            return
+        if os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok = True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding = 'utf-8') as f:
+            json.dump(self.entries, f, indent = 2)
+        os.replace(tmp_path, self.path)
+
+
+
+class DropboxUploader():
+    """
+    Upload stage sending output files to Dropbox. Unchanged files are skipped, files are gzipped
+    before sending, large files go through chunked upload sessions and several files are sent in parallel.
+
+    ATTRS
+    -----
+    api_url [str]   content API URL
+    workers [int]   number of files uploaded at once
+    compress    [bool]  gzip files before sending
+    chunk_size  [int]   size of upload session chunks in bytes
+    single_limit    [int]   files up to this size are sent in a single request
+    manifest    [UploadManifest]    record of uploaded files
+    """
+    def __init__(self, token, api_url = CONTENT_URL, workers = 4, compress = True, chunk_size = CHUNK_SIZE,
+            single_limit = SINGLE_UPLOAD_LIMIT, manifest = None, retries = 5, session = None):
+        """
+        ARGS
+        ----
+        token   [str]   Dropbox access token
+        api_url [str]   content API URL
+        workers [int]   number of files uploaded at once
+        compress    [bool]  gzip files before sending
+        chunk_size  [int]   size of upload session chunks in bytes
+        single_limit    [int]   files up to this size are sent in a single request
+        manifest    [UploadManifest]    record of uploaded files. If None then nothing is skipped
+        retries [int]   number of retries of throttled or failed requests
+        session [Session]   session used for requests
+        """
+        if not token:
+            raise ValueError("Dropbox token is required.")
+        self.__token = token
+        self.api_url = api_url.rstrip("/")
+        self.workers = workers
+        self.compress = compress
+        self.chunk_size = chunk_size
+        self.single_limit = single_limit
+        self.manifest = manifest or UploadManifest()
+        self.__retries = retries
+        self.__session = session or make_upload_session(workers)
+
+    def _post_(self, endpoint, arg, data = b""):
+        """
+        Send request to the content API. Throttled requests are repeated after Retry-After.
+        RETURN
+        ------
+        decoded JSON response or None
+        """
+        headers = {
+            "Authorization" : "Bearer {}".format(self.__token),
+            "Dropbox-API-Arg" : json.dumps(arg),
+            "Content-Type" : "application/octet-stream"
+        }
+        for attempt in range(self.__retries + 1):
+            response = self.__session.post(self.api_url + endpoint, headers = headers, data = data)
+            if response.status_code in (429, 503) and attempt < self.__retries:
+                METRICS.inc("upload_retries")
+                wait = parse_retry_after(response.headers.get("Retry-After"))
+                time.sleep(wait if wait is not None else min(2 ** attempt, 30))
+                continue
+            if response.status_code != 200:
+                raise RuntimeError("Dropbox {} failed with status {}: {}".format(endpoint, response.status_code, response.text[:200]))
+            return response.json() if response.content and response.content != b"null" else None
+
+    def _send_(self, path, remote, size):
+        """Send file in a single request or in an upload session, depending on its size."""
+        with open(path, "rb") as f:
+            if size <= self.single_limit:
+                return self._post_("/files/upload", {"path" : remote, "mode" : "overwrite", "mute" : True}, f.read())
+            session_id = self._post_("/files/upload_session/start", {"close" : False}, f.read(self.chunk_size))["session_id"]
+            offset = f.tell()
+            while offset + self.chunk_size < size:
+                self._post_(
+                    "/files/upload_session/append_v2",
+                    {"cursor" : {"session_id" : session_id, "offset" : offset}, "close" : False},
+                    f.read(self.chunk_size)
+                )
+                offset = f.tell()
+            return self._post_(
+                "/files/upload_session/finish",
+                {
+                    "cursor" : {"session_id" : session_id, "offset" : offset},
+                    "commit" : {"path" : remote, "mode" : "overwrite", "mute" : True}
+                },
+                f.read()
+            )
+
+    def upload_file(self, path, remote):
+        """
+        Upload single file unless it is unchanged since the last upload.
+        ARGS
+        ----
+        path    [str]   local file
+        remote  [str]   Dropbox path, ".gz" is appended if the file is compressed
+
+        RETURN
+        ------
+        dictionary with file, remote, status ("uploaded" or "unchanged") and sent bytes
+        """
+        digest = file_digest(path)
+        if self.manifest.unchanged(path, digest):
+            logger.info("Skipping unchanged %s", path)
+            METRICS.inc("upload_files", status = "unchanged")
+            return {"file" : path, "remote" : remote, "status" : "unchanged", "bytes" : 0}
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            source = path
+            if self.compress and not path.endswith(COMPRESSED_EXTENSIONS):
+                source = compress_file(path, tmp_dir)
+                remote += ".gz"
+            size = os.path.getsize(source)
+            with METRICS.timer("upload"):
+                self._send_(source, remote, size)
+        METRICS.inc("upload_files", status = "uploaded")
+        METRICS.observe("upload_bytes", size, buckets = BYTES_BUCKETS)
+        self.manifest.update(path, digest, remote, size)
+        logger.info("Uploaded %s to %s (%d bytes)", path, remote, size)
+        return {"file" : path, "remote" : remote, "status" : "uploaded", "bytes" : size}
+
+    def upload_dir(self, directory, remote_dir = "/", date = None):
+        """
+        Upload all files of the directory in parallel, hidden files excepted. Remote names are
+        name before the first dot, date and the original extension.
+        ARGS
+        ----
+        directory   [str]   local directory
+        remote_dir  [str]   Dropbox directory
+        date    [date or str]   date added to remote names. Defaults to today. If False then names are kept
+
+        RETURN
+        ------
+        list of upload_file results. Failed uploads have status "failed" and error message
+        """
+        date = str(datetime.date.today()) if date is None else date
+        files = sorted(
+            os.path.join(directory, name) for name in os.listdir(directory)
+            #Hidden files hold upload state, e.g. the default manifest
+            if os.path.isfile(os.path.join(directory, name)) and not name.startswith(".")
+        )
+
+        def upload(path):
+            remote = remote_path(path, remote_dir, date)
+            try:
+                return self.upload_file(path, remote)
+            except Exception as e:
+                print("Error during upload of {}: {}".format(path, e), file = sys.stderr)
+                METRICS.inc("upload_files", status = "failed")
+                return {"file" : path, "remote" : remote, "status" : "failed", "bytes" : 0, "error" : str(e)}
+
+        with ThreadPoolExecutor(max_workers = self.workers) as executor:
+            return list(executor.map(upload, files))
+
+
+###FUNCTIONS###
+def make_upload_session(pool_size = 4):
+    """Build session with keep-alive connections and retries of failed connections."""
+    #Throttled responses are retried by the uploader, uploads are not idempotent for urllib3
+    retry = Retry(
+        total = 3, connect = 3, read = 0, status = 0, backoff_factor = 0.5, allowed_methods = None,
+        respect_retry_after_header = False, raise_on_status = False
+    )
+    adapter = HTTPAdapter(pool_connections = pool_size, pool_maxsize = pool_size, max_retries = retry)
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+def file_digest(path, block_size = 1024 ** 2):
+    """Return SHA-256 hex digest of the file content."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def compress_file(path, directory, level = 6):
+    """
+    Gzip file into the directory. Output does not depend on file time, so equal files give equal archives.
+    RETURN
+    ------
+    path to the compressed file
+    """
+    target = os.path.join(directory, os.path.basename(path) + ".gz")
+    with open(path, "rb") as source, open(target, "wb") as raw:
+        with gzip.GzipFile(filename = "", mode = "wb", compresslevel = level, fileobj = raw, mtime = 0) as f:
+            shutil.copyfileobj(source, f, 1024 ** 2)
+    return target
+
+def remote_path(path, remote_dir = "/", date = None):
+    """Return Dropbox path of the file: remote_dir/NAME + date + extension, e.g. /games2024-01-01.jsonl"""
+    name, dot, extension = os.path.basename(path).partition(".")
+    return "{}/{}{}{}{}".format(remote_dir.rstrip("/"), name, date or "", dot, extension)
+
+
+def upload_from_env(data_dir, remote_dir = "/"):
+    """
+    Upload directory with uploader configured by DROPBOX_TOKEN, UPLOAD_WORKERS and UPLOAD_MANIFEST environment variables.
+    RETURN
+    ------
+    list of upload results, see DropboxUploader.upload_dir
+    """
+    uploader = DropboxUploader(
+        os.getenv("DROPBOX_TOKEN"),
+        workers = int(os.getenv("UPLOAD_WORKERS") or 4),
+        manifest = UploadManifest(os.getenv("UPLOAD_MANIFEST") or os.path.join(data_dir, ".uploaded.json"))
+    )
+    return uploader.upload_dir(data_dir, remote_dir)
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+    load_dotenv()
+    logging.basicConfig(level = os.getenv("LOG_LEVEL") or "INFO")
+    data_dir = sys.argv[1] if len(sys.argv) > 1 else os.getenv("DATA_DIR")
+    if not data_dir:
+        print("Usage: bg_upload.py DATA_DIR [REMOTE_DIR]", file = sys.stderr)
+        sys.exit(1)
+    results = upload_from_env(data_dir, sys.argv[2] if len(sys.argv) > 2 else "/")
+    for result in results:
+        print("{status}: {file} -> {remote} ({bytes} bytes)".format(**result))
+    sys.exit(1 if any(result["status"] == "failed" for result in results) else 0)
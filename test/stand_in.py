@@ -0,0 +1,129 @@
+"""Local stand-ins used by tests instead of boardgamegeek and Dropbox."""
+import json
+import time
+import threading
+
+#Server and crawl settings are shared with the benchmarks
+from bench.stand_in import StandInServer, StandInDriver, CRAWL_SETTINGS, crawl_environment
+
+
+class ThrottledRoute():
+    """
+    Route simulating a server which throttles clients: requests over the concurrency limit
+    get 429 with optional Retry-After header.
+
+    ATTRS
+    -----
+    served  [int]   number of requests answered with the body
+    throttled   [int]   number of requests answered with 429
+    peak    [int]   max number of requests in progress at once
+    """
+    def __init__(self, body, concurrency = 2, delay = 0.05, retry_after = None):
+        self.body = body
+        self.concurrency = concurrency
+        self.delay = delay
+        self.retry_after = retry_after
+        self.served = 0
+        self.throttled = 0
+        self.peak = 0
+        self.__active = 0
+        self.__lock = threading.Lock()
+
+    def __call__(self, handler):
+        with self.__lock:
+            if self.__active >= self.concurrency:
+                self.throttled += 1
+                headers = {"Retry-After" : str(self.retry_after)} if self.retry_after is not None else {}
+                return 429, headers, b"slow down"
+            self.__active += 1
+            self.peak = max(self.peak, self.__active)
+        time.sleep(self.delay)
+        with self.__lock:
+            self.__active -= 1
+            self.served += 1
+        return 200, {"Content-Type" : "text/html"}, self.body
+
+
+
+class DropboxStandIn():
+    """
+    Routes emulating upload endpoints of the Dropbox content API. Serve with StandInServer(stand_in.routes)
+    and use server.url + "/2" as API URL.
+
+    ATTRS
+    -----
+    files   [dict]  Dropbox path -> uploaded bytes
+    calls   [list]  called endpoints in order
+    throttle    [int]   number of first requests answered with 429
+    """
+    def __init__(self, token = "token", throttle = 0):
+        self.token = token
+        self.throttle = throttle
+        self.files = {}
+        self.calls = []
+        self.__sessions = {}
+        self.__lock = threading.Lock()
+
+    @property
+    def routes(self):
+        return {
+            "/2/files/upload" : self._upload,
+            "/2/files/upload_session/start" : self._start,
+            "/2/files/upload_session/append_v2" : self._append,
+            "/2/files/upload_session/finish" : self._finish
+        }
+
+    def _read(self, handler, endpoint):
+        body = handler.rfile.read(int(handler.headers.get("Content-Length") or 0))
+        with self.__lock:
+            self.calls.append(endpoint)
+            if self.throttle > 0:
+                self.throttle -= 1
+                return None, None, (429, {"Retry-After" : "0"}, b'{"error_summary": "too_many_requests/"}')
+        if handler.headers.get("Authorization") != "Bearer {}".format(self.token):
+            return None, None, (401, {}, b'{"error_summary": "invalid_access_token/"}')
+        return json.loads(handler.headers["Dropbox-API-Arg"]), body, None
+
+    @staticmethod
+    def _json(value):
+        return 200, {"Content-Type" : "application/json"}, json.dumps(value).encode("utf-8")
+
+    def _append_chunk(self, cursor, body):
+        data = self.__sessions[cursor["session_id"]]
+        if cursor["offset"] != len(data):
+            return 409, {}, b'{"error_summary": "lookup_failed/incorrect_offset/"}'
+        data.extend(body)
+        return None
+
+    def _upload(self, handler):
+        arg, body, error = self._read(handler, "upload")
+        if error:
+            return error
+        self.files[arg["path"]] = body
+        return self._json({"path_display" : arg["path"], "size" : len(body)})
+
+    def _start(self, handler):
+        arg, body, error = self._read(handler, "start")
+        if error:
+            return error
+        with self.__lock:
+            session_id = "session-{}".format(len(self.__sessions))
+            self.__sessions[session_id] = bytearray(body)
+        return self._json({"session_id" : session_id})
+
+    def _append(self, handler):
+        arg, body, error = self._read(handler, "append")
+        if error:
+            return error
+        return self._append_chunk(arg["cursor"], body) or self._json(None)
+
+    def _finish(self, handler):
+        arg, body, error = self._read(handler, "finish")
+        if error:
+            return error
+        error = self._append_chunk(arg["cursor"], body)
+        if error:
+            return error
+        path = arg["commit"]["path"]
+        self.files[path] = bytes(self.__sessions.pop(arg["cursor"]["session_id"]))
+        return self._json({"path_display" : path, "size" : len(self.files[path])})
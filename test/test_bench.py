@@ -0,0 +1,11 @@
+import unittest
+from bench import run
+
+
+class BenchmarkSuiteTest(unittest.TestCase):
+    def test_suite_runs_offline(self):
+        results = run.run(repeat = 1)
+        self.assertIn("main_end_to_end", results)
+        self.assertTrue(all(metrics["throughput"] > 0 for metrics in results.values()))
+        rows = run.compare(results, {"main_end_to_end" : {"throughput" : results["main_end_to_end"]["throughput"] * 10}})
+        self.assertTrue([row for row in rows if row[0] == "main_end_to_end"][0][4])
@@ -0,0 +1,78 @@
+import unittest
+import os
+import time
+import tempfile
+import bg_scraper as bgs
+from bg_cache import ResponseCache
+from test.stand_in import StandInServer
+
+
+class ResponseCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "cache", "pages.sqlite")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_conditional_revalidation(self):
+        def page(request):
+            if request.headers.get("If-None-Match") == '"v1"':
+                return 304, {"ETag" : '"v1"'}, b""
+            return 200, {"ETag" : '"v1"', "Content-Type" : "text/html"}, "<html><p>page</p></html>"
+        cache = ResponseCache(self.path, ttls = {r"/stale" : 0, r"/fresh" : 3600})
+        with StandInServer({"/stale" : page, "/fresh" : page}) as server:
+            session = bgs.make_session(retries = 0)
+            for _ in range(3):
+                scraper = bgs.SimpleScraper(server.url + "/stale", session = session, cache = cache)
+                self.assertEqual(scraper.scrape('p', all_results = False), "page")
+                bgs.SimpleScraper(server.url + "/fresh", session = session, cache = cache)
+            #Stale page is requested every time but downloaded once, fresh page is requested once
+            self.assertEqual(server.hits["/stale"], 3)
+            self.assertEqual(server.hits["/fresh"], 1)
+        self.assertEqual(cache.stats["revalidated"], 2)
+        self.assertEqual(cache.stats["misses"], 2)
+        self.assertAlmostEqual(cache.hit_rate, 4 / 6)
+        cache.close()
+        #Entries survive reopening
+        cache = ResponseCache(self.path, default_ttl = 3600)
+        self.assertTrue(cache.lookup(server.url + "/fresh")[1])
+        cache.close()
+
+    def test_lru_eviction(self):
+        cache = ResponseCache(self.path, max_size = 300)
+        for i in range(3):
+            cache.store("http://bgg/{}".format(i), b"x" * 100)
+            time.sleep(0.01)
+        cache.lookup("http://bgg/0")
+        time.sleep(0.01)
+        cache.store("http://bgg/3", b"x" * 100)
+        self.assertIsNone(cache.lookup("http://bgg/1"))
+        self.assertIsNotNone(cache.lookup("http://bgg/0"))
+        self.assertEqual(cache.size, 300)
+        self.assertEqual(cache.stats["evictions"], 1)
+        cache.close()
+
+    def test_access_times_are_batched(self):
+        import sqlite3
+        cache = ResponseCache(self.path)
+        cache.store("http://bgg/0", b"x")
+        reader = sqlite3.connect(self.path)
+        stored = reader.execute("SELECT accessed_at FROM entries").fetchone()[0]
+        time.sleep(0.01)
+        cache.lookup("http://bgg/0")
+        #Hits do not write to the file
+        self.assertEqual(reader.execute("SELECT accessed_at FROM entries").fetchone()[0], stored)
+        cache.close()
+        self.assertGreater(reader.execute("SELECT accessed_at FROM entries").fetchone()[0], stored)
+        reader.close()
+
+    def test_namespaces(self):
+        cache = ResponseCache(self.path)
+        cache.store("http://bgg/boardgame/1", b"raw")
+        cache.store("http://bgg/boardgame/1", b"rendered", namespace = "render:lean")
+        self.assertEqual(cache.lookup("http://bgg/boardgame/1")[0], b"raw")
+        self.assertEqual(cache.lookup("http://bgg/boardgame/1", "render:lean")[0], b"rendered")
+        self.assertIsNone(cache.lookup("http://bgg/boardgame/1", "render:full"))
+        self.assertEqual(cache.size, 11)
+        cache.close()
@@ -0,0 +1,51 @@
+import unittest
+import os
+import sys
+import json
+import tempfile
+import subprocess
+from contextlib import redirect_stdout, redirect_stderr
+from io import StringIO
+import bg_cli
+import bench.run
+from test.stand_in import StandInServer, crawl_environment
+
+
+class CLITest(unittest.TestCase):
+    def test_import_is_lazy(self):
+        code = (
+            "import sys, bg_cli, bg_scraper;"
+            "print(sorted({m.split('.')[0] for m in sys.modules} & {'selenium', 'pandas', 'numpy', 'dotenv'}))"
+        )
+        result = subprocess.run(
+            [sys.executable, "-c", code], capture_output = True, text = True,
+            cwd = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        )
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertEqual(result.stdout.strip(), "[]")
+
+    def test_links_file(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "out", "links.txt")
+            bg_cli.write_links(["a", "b"], path)
+            with open(path, "a", encoding = 'utf-8') as f:
+                f.write("\n# comment\nc\n")
+            self.assertEqual(bg_cli.read_links(path), ["a", "b", "c"])
+
+    def test_stages(self):
+        with StandInServer(bench.run.routes()) as server, tempfile.TemporaryDirectory() as tmp, crawl_environment(server):
+            links, games = os.path.join(tmp, "links.txt"), os.path.join(tmp, "games.jsonl")
+            with redirect_stdout(StringIO()):
+                self.assertEqual(bg_cli.main(["list-links", "--pages", "1", "--output", links]), 0)
+                self.assertEqual(
+                    bg_cli.main(["scrape-games", "--links", links, "--output", games, "--backend", "xmlapi"]), 0
+                )
+            self.assertEqual(len(bg_cli.read_links(links)), 100)
+            with open(games, encoding = 'utf-8') as f:
+                records = [json.loads(line) for line in f]
+            self.assertEqual(len(records), 100)
+            self.assertIn("Game 100001", {record["title"] for record in records})
+
+    def test_requires_command(self):
+        with redirect_stderr(StringIO()), self.assertRaises(SystemExit):
+            bg_cli.make_parser().parse_args([])
@@ -0,0 +1,73 @@
+import unittest
+import os
+import json
+import tempfile
+from dataclasses import asdict, replace
+import bg_scraper as bgs
+from bg_delta import DeltaIndex, track_changes, finish_delta, delta_path, apply_delta
+from test.test_writer import make_game
+
+
+def read_lines(path):
+    with open(path, encoding = 'utf-8') as f:
+        return [json.loads(line) for line in f]
+
+
+class DeltaIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.index_path = os.path.join(self.tmp.name, "state", "delta.sqlite")
+        self.output = os.path.join(self.tmp.name, "games.delta.jsonl")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def run_delta(self, games, keep = ()):
+        index = DeltaIndex(self.index_path)
+        index.begin()
+        with bgs.JSONLWriter(self.output, append = False) as writer:
+            passed = list(track_changes(games, index, writer))
+            counts = finish_delta(index, writer, keep)
+        index.close()
+        self.assertEqual(passed, list(games))
+        return counts, read_lines(self.output)
+
+    def test_fingerprint(self):
+        game = make_game(1)
+        self.assertEqual(game.fingerprint(), bgs.game_fingerprint(json.loads(json.dumps(asdict(game)))))
+        self.assertNotEqual(game.fingerprint(), replace(game, weight = 2.6).fingerprint())
+        self.assertNotEqual(game.fingerprint(), replace(game, tags = ["Dice Rolling", "Trading"]).fingerprint())
+
+    def test_runs(self):
+        games = [("link-{}".format(i), make_game(i)) for i in range(5)]
+        counts, delta = self.run_delta(games)
+        self.assertEqual(counts, {"insert" : 5, "update" : 0, "delete" : 0, "unchanged" : 0})
+        snapshot = apply_delta({}, delta)
+        self.assertEqual(snapshot["link-3"], asdict(make_game(3)))
+
+        #Second run: one game changed, one is gone, one failed, one is new
+        games = [(link, game) for link, game in games if link not in ("link-0", "link-1")]
+        games[0] = (games[0][0], replace(games[0][1], weight = 3.1))
+        games.append(("link-9", make_game(9)))
+        counts, delta = self.run_delta(games, keep = ["link-1"])
+        self.assertEqual(counts, {"insert" : 1, "update" : 1, "delete" : 1, "unchanged" : 2})
+        self.assertEqual([(entry["op"], entry["key"]) for entry in delta], [
+            ("update", "link-2"), ("insert", "link-9"), ("delete", "link-0")
+        ])
+        self.assertEqual(delta[0]["fingerprint"], games[0][1].fingerprint())
+        snapshot = apply_delta(snapshot, delta)
+        self.assertEqual(sorted(snapshot), ["link-1", "link-2", "link-3", "link-4", "link-9"])
+        self.assertEqual(snapshot["link-2"]["weight"], 3.1)
+
+        #Interrupted run does not change the index
+        index = DeltaIndex(self.index_path)
+        index.begin()
+        index.diff("link-2", make_game(2))
+        index.close()
+        counts, delta = self.run_delta(games, keep = ["link-1"])
+        self.assertEqual(delta, [])
+        self.assertEqual(counts["unchanged"], 4)
+
+    def test_delta_path(self):
+        self.assertEqual(delta_path("out/games.jsonl"), "out/games.delta.jsonl")
+        self.assertEqual(delta_path("games"), "games.delta.jsonl")
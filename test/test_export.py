@@ -0,0 +1,35 @@
+import unittest
+import os
+import tempfile
+import bg_export
+from test.test_writer import make_game
+
+
+@unittest.skipIf(bg_export.pa is None, "pyarrow is not installed")
+class ParquetExportTest(unittest.TestCase):
+    def test_schema_from_game(self):
+        pa = bg_export.pa
+        schema = bg_export.game_schema()
+        self.assertEqual(schema.names, [f.name for f in bg_export.fields(bg_export.Game)])
+        self.assertEqual(schema.field("tags").type, pa.list_(pa.string()))
+        self.assertEqual(schema.field("release").type, pa.int64())
+        self.assertEqual(schema.field("weight").type, pa.float64())
+        self.assertTrue(pa.types.is_dictionary(schema.field("category").type))
+        self.assertTrue(pa.types.is_dictionary(schema.field("publisher").type))
+
+    def test_export_partitioned(self):
+        records = [make_game(i) for i in range(5)]
+        #Records read back from JSON Lines and rendered pages use strings
+        records.append({"title" : "Legacy", "release" : "2017", "tags" : "A###B", "weight" : "n/a"})
+        with tempfile.TemporaryDirectory() as tmp:
+            bg_export.export_parquet(records[:3], tmp, "2024-01-01", batch_size = 2)
+            path = bg_export.export_parquet(records, tmp, "2024-01-02", batch_size = 2)
+            self.assertTrue(path.endswith(os.path.join("scrape_date=2024-01-02", "games.parquet")))
+            table = bg_export.read_history(tmp)
+            self.assertEqual(table.num_rows, 9)
+            day = bg_export.read_history(tmp, filters = [("scrape_date", "=", "2024-01-02")]).to_pylist()
+            legacy = [row for row in day if row["title"] == "Legacy"][0]
+            self.assertEqual(legacy["release"], 2017)
+            self.assertEqual(legacy["tags"], ["A", "B"])
+            self.assertIsNone(legacy["weight"])
+            self.assertEqual(day[0]["publisher"], "KOSMOS")
@@ -0,0 +1,62 @@
+import unittest
+import os
+import bg_scraper as bgs
+from bg_extract import Extractor, Selector
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
+
+PAGE = """
+<div id="main" class="box wide">
+    <h2> Games </h2>
+    <ul>
+        <li class="item"><a href="/game/1">  First   game </a><span>Rank 7</span></li>
+        <li class="item"><a href="/game/2">Second</a><span>Rank x</span></li>
+        <li class="other"><a href="https://example.com">External</a></li>
+    </ul>
+</div>
+<p class="item">Outside</p>
+"""
+
+
+class ExtractorTest(unittest.TestCase):
+    def test_selector(self):
+        soup = bgs.make_soup(PAGE)
+        matches = lambda selector: [tag.get_text(strip = True) for tag in soup.find_all(True) if Selector(selector).match(tag)]
+        self.assertEqual(matches("div#main li.item a"), ["First   game", "Second"])
+        self.assertEqual(matches("a[href^=/game/]"), ["First   game", "Second"])
+        self.assertEqual(matches("div.wide a[href*=example]"), ["External"])
+        self.assertEqual(matches(".item"), ["First   gameRank 7", "SecondRank x", "Outside"])
+        self.assertEqual(matches("ul p"), [])
+        for selector in ("div > p", "a:first-child", ""):
+            with self.assertRaises(ValueError):
+                Selector(selector)
+
+    def test_spec(self):
+        extractor = Extractor({
+            "heading" : {"select" : "h2", "post" : ["strip"]},
+            "links" : {"select" : "li.item a", "many" : True, "post" : ["squash"]},
+            "second" : {"select" : "li.item a", "index" : 1, "attr" : "href"},
+            "ranks" : {"select" : "li span", "many" : True, "post" : [("word", 1), "int"]},
+            "joined" : {"select" : "li a", "many" : True, "join" : ", ", "post" : [("sub", r"\s+", "")]},
+            "missing" : {"select" : "table", "default" : "n/a"},
+            "id" : {"select" : "li a", "index" : 1, "attr" : "href", "post" : [("re", r"/game/(\d+)", 1), "int"]}
+        })
+        self.assertEqual(extractor.extract(bgs.make_soup(PAGE)), {
+            "heading" : "Games", "links" : ["First game", "Second"], "second" : "/game/2",
+            "ranks" : [7], "joined" : "Firstgame, Second, External", "missing" : "n/a", "id" : 2
+        })
+        with self.assertRaises(ValueError):
+            Extractor({"x" : {"select" : "p", "post" : ["upper"]}})
+
+    def test_game_pages(self):
+        with open(os.path.join(FIXTURES, "game_page.html"), encoding = 'utf-8') as f:
+            page = f.read()
+        games = list(bgs.extract_games([page, page.encode('utf-8'), bgs.make_soup(page)]))
+        self.assertEqual(len(games), 3)
+        self.assertEqual(games[0], games[1])
+        self.assertEqual(games[0], games[2])
+        self.assertEqual(sorted(bgs.GAME_SPEC), sorted(bgs.Game.__dataclass_fields__))
+        self.assertEqual(games[0].tags, ["Action Queue", "Cooperative Game", "Grid Movement"])
+        self.assertIsInstance(games[0].release, int)
+        empty = next(bgs.extract_games(["<html><body></body></html>"]))
+        self.assertEqual(empty, bgs.Game(*[None] * len(bgs.GAME_SPEC)))
@@ -0,0 +1,58 @@
+import unittest
+import os
+import tempfile
+from dataclasses import replace
+from bg_index import GameIndex, index_games
+from test.test_writer import make_game
+
+
+class GameIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "state", "index.sqlite")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_queries_and_updates(self):
+        games = [
+            ("link-1", replace(make_game(1), category = "Adventure", tags = ["Cooperative Game", "Grid Movement"])),
+            ("link-2", replace(make_game(2), tags = ["Dice Rolling", "Trading"])),
+            ("link-3", replace(make_game(3), category = "Adventure", tags = ["Cooperative Game"], publisher = "Z-Man")),
+            ("link-4", replace(make_game(4), category = "Adventure", tags = ["Grid Movement"]))
+        ]
+        index = GameIndex(self.path, commit_every = 2)
+        self.assertEqual(index.add_categories(["Adventure", " Economic ", "Wargame", ""]), 3)
+        passed = list(index_games(reversed(games), index, {"link-1" : 1, "link-2" : 2, "link-3" : 3}))
+        self.assertEqual(len(passed), 4)
+        titles = lambda **filters: [game["title"] for game in index.games(**filters)]
+        self.assertEqual(titles(category = "Adventure"), ["Game 1", "Game 3", "Game 4"])
+        self.assertEqual(titles(category = "Adventure", tags = ["Cooperative Game"]), ["Game 1", "Game 3"])
+        self.assertEqual(titles(category = "Adventure", tags = ["Cooperative Game", "Grid Movement"]), ["Game 1"])
+        self.assertEqual(titles(tags = ["Grid Movement"], limit = 1), ["Game 1"])
+        self.assertEqual(titles(publisher = "Z-Man"), ["Game 3"])
+        self.assertEqual(titles(category = "Unknown"), [])
+        self.assertEqual(index.games(limit = 1)[0], {"key" : "link-1", "title" : "Game 1", "release" : 2001, "rank" : 1, "weight" : 2.5})
+        self.assertEqual(index.counts("category"), {"Adventure" : 3, "Economic" : 1, "Wargame" : 0})
+        index.close()
+
+        #Reopened index is updated incrementally, ranks are kept when not given
+        index = GameIndex(self.path)
+        index.update("link-3", replace(games[2][1], category = "Wargame", tags = ["Dice Rolling"]))
+        self.assertTrue(index.remove("link-4"))
+        self.assertFalse(index.remove("link-9"))
+        self.assertEqual(titles(category = "Adventure"), ["Game 1"])
+        self.assertEqual(index.games(category = "Wargame")[0]["rank"], 3)
+        self.assertEqual(index.counts("tag"), {"Cooperative Game" : 1, "Dice Rolling" : 2, "Grid Movement" : 1, "Trading" : 1})
+        self.assertEqual(len(index), 3)
+        index.close()
+
+    def test_retain_ranking(self):
+        index = GameIndex(self.path)
+        for number in range(1, 5):
+            index.update("link-{}".format(number), replace(make_game(number), category = "Adventure"), number)
+        #Next run ranks game 4 first, game 3 dropped out and game 2 failed but is still ranked
+        self.assertEqual(index.retain({"link-4" : 1, "link-1" : 2, "link-2" : 3}), 1)
+        self.assertEqual([game["key"] for game in index.games(category = "Adventure")], ["link-4", "link-1", "link-2"])
+        self.assertEqual(index.counts("category"), {"Adventure" : 3})
+        index.close()
@@ -0,0 +1,206 @@
+import unittest
+import os
+import sys
+import json
+import tempfile
+import subprocess
+from contextlib import redirect_stdout, redirect_stderr
+from io import StringIO
+import bench.run
+import bg_scraper
+from bg_journal import CrawlJournal
+from test.stand_in import StandInServer, StandInDriver, crawl_environment
+
+
+class CrawlJournalTest(unittest.TestCase):
+    def test_resume(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "journal.sqlite")
+            journal = CrawlJournal(path)
+            self.assertFalse(journal.links_complete)
+            journal.add_links(["a", "b"])
+            journal.add_links(["c", "a"], complete = True)
+            journal.mark_done("b", {"title" : "B"})
+            journal.mark_failed("a", RuntimeError("timeout"))
+            journal.close()
+
+            #Restarted run skips done links and retries failed ones
+            journal = CrawlJournal(path)
+            self.assertTrue(journal.links_complete)
+            self.assertEqual(journal.links(), ["a", "b", "c"])
+            self.assertEqual(journal.pending_links(), ["a", "c"])
+            self.assertEqual(journal.pending_links(retry_failed = False), ["c"])
+            self.assertEqual(journal.pending_links(max_attempts = 1), ["c"])
+            journal.mark_done("a", {"title" : "A"})
+            self.assertEqual(list(journal.records()), [("a", {"title" : "A"}), ("b", {"title" : "B"})])
+            self.assertEqual(journal.counts(), {"done" : 2, "pending" : 1})
+            self.assertFalse(journal.finished())
+            journal.mark_failed("c", RuntimeError("timeout"))
+            self.assertFalse(journal.finished())
+            self.assertTrue(journal.finished(max_attempts = 1))
+            journal.close()
+
+
+
+class CrawlRunTest(unittest.TestCase):
+    """Runs of bg_scraper.main() with a journal against the stand-in site."""
+    def setUp(self):
+        self.server = StandInServer(bench.run.routes()).__enter__()
+        self.tmp = tempfile.TemporaryDirectory()
+        self.output = os.path.join(self.tmp.name, "games.jsonl")
+        self.journal_path = os.path.join(self.tmp.name, "journal.sqlite")
+        self.links = [self.server.url + path for path in bench.run.routes() if path.startswith("/boardgame/")][:10]
+
+    def tearDown(self):
+        self.server.__exit__(None, None, None)
+        self.tmp.cleanup()
+
+    def crawl(self, links = None, factory = None, **values):
+        with crawl_environment(self.server, OUTPUT = self.output, JOURNAL_PATH = self.journal_path, **values):
+            with redirect_stdout(StringIO()), redirect_stderr(StringIO()):
+                bg_scraper.main(links, factory = factory)
+
+    def read_output(self):
+        with open(self.output, encoding = 'utf-8') as f:
+            return [json.loads(line) for line in f]
+
+    def test_finished_run_is_not_resumed(self):
+        self.crawl(self.links)
+        self.crawl(self.links)
+        #Second run scrapes all games again and replaces the output
+        self.assertEqual(len(self.read_output()), 10)
+        journal = CrawlJournal(self.journal_path)
+        self.assertFalse(journal.links_complete)
+        self.assertEqual(journal.counts(), {})
+        journal.close()
+
+    def test_html_backend(self):
+        self.crawl(self.links, factory = StandInDriver, BACKEND = "html", DRIVERS = 2)
+        records = self.read_output()
+        self.assertEqual(sorted(record["link"] for record in records), sorted(self.links))
+        self.assertEqual({record["title"] for record in records}, {"Gloomhaven"})
+        self.assertEqual({record["release"] for record in records}, {2017})
+
+    def test_resume(self):
+        journal = CrawlJournal(self.journal_path)
+        journal.add_links(self.links, complete = True)
+        with open(self.output, "w", encoding = 'utf-8') as f:
+            for link in self.links[:4]:
+                journal.mark_done(link, {"title" : link})
+                f.write(json.dumps({"title" : link}) + "\n")
+        journal.close()
+        self.crawl(self.links)
+        records = self.read_output()
+        self.assertEqual(len(records), 10)
+        self.assertEqual([record["title"] for record in records[:4]], self.links[:4])
+
+    def test_other_links_start_new_run(self):
+        journal = CrawlJournal(self.journal_path)
+        journal.add_links(self.links, complete = True)
+        journal.mark_done(self.links[0], {"title" : "old"})
+        journal.close()
+        self.crawl(self.links[5:])
+        self.assertEqual(len(self.read_output()), 5)
+
+    def test_resume_after_crash_before_flush(self):
+        journal = CrawlJournal(self.journal_path)
+        journal.add_links(self.links, complete = True)
+        journal.close()
+        #Run is killed with three games in the writer buffer, cleanup code does not run
+        code = (
+            "import os, sys, bg_scraper;"
+            "from bg_journal import CrawlJournal;"
+            "from test.test_writer import make_game;"
+            "links = sys.argv[3:];"
+            "writer = bg_scraper.JSONLWriter(sys.argv[1], max_records = 100, flush_interval = 3600, append = False);"
+            "games = bg_scraper.sink_games(((link, make_game(i)) for i, link in enumerate(links)), writer, CrawlJournal(sys.argv[2]));"
+            "[next(games) for _ in links];"
+            "os._exit(1)"
+        )
+        result = subprocess.run(
+            [sys.executable, "-c", code, self.output, self.journal_path] + self.links[:3],
+            capture_output = True, text = True, cwd = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        )
+        self.assertEqual(result.returncode, 1, result.stderr)
+        journal = CrawlJournal(self.journal_path)
+        self.assertNotIn(CrawlJournal.DONE, journal.counts())
+        journal.close()
+        self.assertFalse(os.path.exists(self.output) and os.path.getsize(self.output))
+        self.crawl(self.links)
+        self.assertEqual(sorted(record["link"] for record in self.read_output()), sorted(self.links))
+
+    def test_flushed_games_are_done(self):
+        from test.test_writer import make_game
+        journal = CrawlJournal(self.journal_path)
+        journal.add_links(self.links, complete = True)
+        with bg_scraper.JSONLWriter(self.output, max_records = 2, flush_interval = 3600, append = False) as writer:
+            games = bg_scraper.sink_games(((link, make_game(i)) for i, link in enumerate(self.links[:3])), writer, journal)
+            for _ in range(3):
+                next(games)
+            self.assertEqual(journal.counts()[CrawlJournal.DONE], 2)
+            games.close()
+            self.assertEqual(journal.counts()[CrawlJournal.DONE], 3)
+        self.assertEqual(len(self.read_output()), 3)
+        journal.close()
+
+    def test_stores_follow_ranking(self):
+        from bg_search import SearchIndex
+        from bg_tags import TagSimilarity
+        paths = {"SEARCH_INDEX" : os.path.join(self.tmp.name, "search"), "TAGS_PATH" : os.path.join(self.tmp.name, "tags.npz")}
+        self.crawl(self.links, **paths)
+        #Next ranking lost the first three games
+        self.crawl(self.links[3:], **paths)
+        search = SearchIndex(paths["SEARCH_INDEX"])
+        self.assertEqual(len(search), 7)
+        self.assertEqual({key for key, _, _ in search.search("game", n = 20)}, set(self.links[3:]))
+        tags = TagSimilarity.load(paths["TAGS_PATH"])
+        self.assertEqual(sorted(tags.keys), sorted(self.links[3:]))
+        matrix = tags.matrix.toarray()
+        self.assertTrue((tags.cooccurrence.toarray() == matrix.T @ matrix).all())
+
+    def test_resume_keeps_exhausted_links_in_delta(self):
+        delta_index = os.path.join(self.tmp.name, "delta.sqlite")
+        delta_output = os.path.join(self.tmp.name, "games.delta.jsonl")
+        links = self.links[:3]
+        self.crawl(links, DELTA_INDEX = delta_index)
+        #Interrupted run where the last link used all its attempts
+        journal = CrawlJournal(self.journal_path)
+        journal.add_links(links, complete = True)
+        for _ in range(3):
+            journal.mark_failed(links[2], RuntimeError("timeout"))
+        journal.close()
+        os.remove(self.output)
+        self.crawl(links, DELTA_INDEX = delta_index, JOURNAL_MAX_ATTEMPTS = 3)
+        with open(delta_output, encoding = 'utf-8') as f:
+            operations = [json.loads(line)["op"] for line in f]
+        self.assertNotIn("delete", operations)
+        self.assertEqual(len(self.read_output()), 2)
+
+    def test_resume_replays_records_to_stores(self):
+        from bg_index import GameIndex
+        from bg_stats import GameStats, ALL
+        from bg_tags import TagSimilarity
+        from bg_search import SearchIndex
+        paths = {
+            name : os.path.join(self.tmp.name, file)
+            for name, file in (("INDEX_PATH", "index.sqlite"), ("STATS_PATH", "stats.sqlite"), ("TAGS_PATH", "tags.npz"), ("SEARCH_INDEX", "search"))
+        }
+        #Interrupted run which scraped four games, the stores lost them
+        journal = CrawlJournal(self.journal_path)
+        journal.add_links(self.links, complete = True)
+        for number, link in enumerate(self.links[:4]):
+            journal.mark_done(link, {"title" : "Replayed {}".format(number), "category" : "Replayed", "tags" : ["Old"], "weight" : "2.5"})
+        journal.close()
+        self.crawl(self.links, **paths)
+        index = GameIndex(paths["INDEX_PATH"])
+        self.assertEqual(len(index), 10)
+        self.assertEqual(index.counts("category")["Replayed"], 4)
+        index.close()
+        stats = GameStats(paths["STATS_PATH"])
+        self.assertEqual(stats.get(ALL)["games"], 10)
+        self.assertEqual(stats.get("Replayed")["games"], 4)
+        stats.close()
+        self.assertEqual(len(TagSimilarity.load(paths["TAGS_PATH"])), 10)
+        search = SearchIndex(paths["SEARCH_INDEX"])
+        self.assertEqual(len(search), 10)
+        self.assertEqual(len(search.search("replayed")), 4)
@@ -0,0 +1,51 @@
+import unittest
+import os
+import json
+import tempfile
+import bg_scraper as bgs
+from bg_metrics import Metrics, METRICS
+from test.stand_in import StandInServer
+
+
+class MetricsTest(unittest.TestCase):
+    def test_histograms_and_export(self):
+        metrics = Metrics()
+        for value in (0.002, 0.02, 3.0):
+            metrics.observe("stage_seconds", value, stage = "fetch")
+        with metrics.timer("parse"):
+            pass
+        metrics.inc("retries", host = "bgg")
+        metrics.inc("retries", 2, host = "bgg")
+        histogram = metrics.histogram("stage_seconds", stage = "fetch")
+        self.assertEqual(histogram.count, 3)
+        self.assertEqual(histogram.to_dict()["buckets"]["0.005"], 1)
+        self.assertEqual(histogram.to_dict()["buckets"]["+Inf"], 3)
+        self.assertEqual(metrics.counter("retries", host = "bgg"), 3)
+        text = metrics.to_prometheus()
+        self.assertIn('bgg_stage_seconds_bucket{stage="fetch",le="0.05"} 2', text)
+        self.assertIn('bgg_stage_seconds_count{stage="parse"} 1', text)
+        self.assertIn('bgg_retries_total{host="bgg"} 3', text)
+        self.assertIn("# TYPE bgg_retries_total counter", text)
+        with tempfile.TemporaryDirectory() as tmp:
+            metrics.export(os.path.join(tmp, "run.json"))
+            metrics.export(os.path.join(tmp, "run.prom"))
+            with open(os.path.join(tmp, "run.json")) as f:
+                self.assertEqual(len(json.load(f)["histograms"]), 2)
+            with open(os.path.join(tmp, "run.prom")) as f:
+                self.assertEqual(f.read(), text)
+
+    def test_pipeline_stages_are_recorded(self):
+        calls = {"n" : 0}
+        def flaky(request):
+            calls["n"] += 1
+            if calls["n"] == 1:
+                return 503, {}, b""
+            return 200, {"Content-Type" : "text/html"}, "<table id='collectionitems'></table>"
+        METRICS.reset()
+        with StandInServer({"/page" : flaky}) as server:
+            session = bgs.make_session(retries = 2, backoff = 0)
+            bgs.SimpleScraper(server.url + "/page", session = session, regions = ["table#collectionitems"])
+        self.assertEqual(METRICS.histogram("stage_seconds", stage = "fetch").count, 1)
+        self.assertEqual(METRICS.histogram("stage_seconds", stage = "parse").count, 1)
+        self.assertEqual(METRICS.histogram("fetch_bytes").sum, len("<table id='collectionitems'></table>"))
+        self.assertEqual(METRICS.counter("retries", host = "127.0.0.1"), 1)
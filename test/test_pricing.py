@@ -0,0 +1,31 @@
+import unittest
+import numpy as np
+import pandas as pd
+import bg_pricing
+
+
+class PricingTest(unittest.TestCase):
+    def test_matches_legacy_loop(self):
+        rng = np.random.default_rng(0)
+        offers = [list(rng.uniform(10, 400, size = count)) for count in rng.integers(0, 12, size = 300)]
+        offers += [[], [np.nan], [40.0], [250.0], [119.99, 120.0]]
+        pd.testing.assert_frame_equal(bg_pricing.price_games(offers), bg_pricing.price_games_loop(offers))
+        #Skewed offers counts use the sort fallback
+        offers.append(list(rng.uniform(10, 400, size = 20000)))
+        pd.testing.assert_frame_equal(bg_pricing.price_games(offers), bg_pricing.price_games_loop(offers))
+
+    def test_no_offers(self):
+        prices = bg_pricing.price_games(bg_pricing.RaggedPrices([30.0, 50.0], [0, 0, 2]))
+        self.assertEqual(prices["offers"].tolist(), [0, 2])
+        self.assertTrue(np.isnan(prices["price_warehouse"][0]))
+        self.assertIs(prices["price_borrow"][0], pd.NA)
+        self.assertEqual(prices["price_warehouse"][1], 40.0)
+        self.assertEqual(prices["price_sell"][1], 45.0)
+        self.assertEqual(prices["price_borrow"][1], 10)
+        with self.assertRaises(ValueError):
+            bg_pricing.RaggedPrices([1.0], [0, 2])
+
+    def test_parse_prices(self):
+        parsed = bg_pricing.parse_prices(["129,99", "1 299,00 zł", "brak"])
+        self.assertEqual(parsed[:2].tolist(), [129.99, 1299.0])
+        self.assertTrue(np.isnan(parsed[2]))
@@ -0,0 +1,131 @@
+import unittest
+import time
+import socket
+import gc
+import weakref
+import bg_scraper as bgs
+from bg_proxies import ProxyPool, ProxyAdapter
+from bg_ratelimit import RateLimiter
+from test.stand_in import StandInServer
+
+
+def closed_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return "http://127.0.0.1:{}".format(s.getsockname()[1])
+
+
+class FakeProxyScraper():
+    """Stand-in for Scraper which records its proxy instead of starting a browser."""
+    def __init__(self, proxy):
+        self.proxy = proxy
+        self.page = None
+        self.pages = 0
+
+    def set_page(self, page):
+        self.page = page
+        self.pages += 1
+
+    def quit(self):
+        pass
+
+
+class ProxyPoolTest(unittest.TestCase):
+    def test_health_scoring(self):
+        pool = ProxyPool(["http://a", "http://b", "http://c"], min_requests = 3, max_latency = 1.0, ban_time = 0.2)
+        #Least used proxies are assigned first
+        self.assertEqual(len({pool.acquire(), pool.acquire(), pool.acquire()}), 3)
+        for proxy in ("http://a", "http://b", "http://c"):
+            pool.release(proxy)
+        pool.record("http://a", 0.5)
+        pool.record("http://b", 0.1)
+        pool.record("http://c", 0.3)
+        self.assertEqual(pool.acquire(), "http://b")
+        self.assertEqual(pool.acquire(exclude = ("http://b",)), "http://c")
+        #Throttled proxy is banned, failing and slow proxies are removed
+        pool.record("http://b", throttled = True)
+        self.assertEqual(pool.acquire(), "http://a")
+        for _ in range(3):
+            pool.record("http://c", error = True)
+            pool.record("http://a", 3.0)
+        self.assertEqual(pool.healthy(), ["http://b"])
+        start = time.monotonic()
+        self.assertEqual(pool.acquire(), "http://b")
+        self.assertGreaterEqual(time.monotonic() - start, 0.1)
+        pool.record("http://b", error = True)
+        pool.record("http://b", error = True)
+        pool.record("http://b", error = True)
+        with self.assertRaises(RuntimeError):
+            pool.acquire()
+        with self.assertRaises(ValueError):
+            ProxyPool([])
+
+    def test_lease_rotation(self):
+        pool = ProxyPool(["http://a", "http://b"], rotate_every = 2)
+        lease = pool.lease()
+        lease.record(0.1)
+        self.assertFalse(lease.expired)
+        lease.record(0.1)
+        self.assertTrue(lease.expired)
+        renewed = lease.renew()
+        self.assertNotEqual(renewed.proxy, lease.proxy)
+        renewed.record(error = True)
+        self.assertTrue(renewed.expired)
+        renewed.release()
+        renewed.release()
+        self.assertEqual(pool.stats("http://a").in_use + pool.stats("http://b").in_use, 0)
+
+    def test_adapter_keeps_current_leases(self):
+        pool = ProxyPool(["http://a", "http://b"], rotate_every = 1)
+        adapter = ProxyAdapter(pool)
+        first = adapter._lease_()
+        first.record(0.1)
+        expired = weakref.ref(first)
+        del first
+        for _ in range(50):
+            adapter._lease_().record(0.1)
+        gc.collect()
+        #Renewed leases are released and not referenced by the adapter
+        self.assertIsNone(expired())
+        self.assertEqual(pool.stats("http://a").in_use + pool.stats("http://b").in_use, 1)
+        adapter.close()
+        self.assertEqual(pool.stats("http://a").in_use + pool.stats("http://b").in_use, 0)
+
+
+class ProxySessionTest(unittest.TestCase):
+    def test_requests_avoid_bad_proxies(self):
+        page = "<html><p>page</p></html>"
+        with StandInServer({"/page" : page}) as good, \
+                StandInServer({"/page" : lambda handler: (403, {}, b"banned")}) as banned, \
+                StandInServer({"/page" : lambda handler: (429, {"Retry-After" : "60"}, b"slow down")}) as throttled:
+            dead = closed_port()
+            pool = ProxyPool([good.url, banned.url, throttled.url, dead], min_requests = 1, max_failure_rate = 0.4, rotate_every = 5)
+            for limiter in (None, RateLimiter(rate = 100, concurrency = 8)):
+                session = bgs.make_session(pool_size = 4, retries = 0, limiter = limiter, proxies = pool)
+                urls = ["http://bgg.invalid/page?i={}".format(i) for i in range(20)]
+                soups = bgs.SimpleScraper(urls[0], session = session).fetch_many(urls, workers = 4)
+                self.assertEqual([soup.p.text for soup in soups], ["page"] * 20)
+                session.close()
+        self.assertEqual(pool.healthy(), [good.url, throttled.url])
+        self.assertGreater(pool.stats(throttled.url).banned_until, time.monotonic())
+        self.assertEqual(sum(good.hits.values()), 42)
+        self.assertEqual(pool.stats(good.url).in_use, 0)
+
+
+class ProxyDriverTest(unittest.TestCase):
+    def test_drivers_rotate_proxies(self):
+        pool = ProxyPool(["http://a", "http://b", "http://c"], rotate_every = 3)
+        started = []
+        def factory(proxy):
+            started.append(FakeProxyScraper(proxy))
+            return started[-1]
+        links = ["link-{}".format(i) for i in range(12)]
+        with bgs.ScraperPool(2, timeout = 1, factory = factory, proxy_pool = pool) as scrapers:
+            results = dict(scrapers.imap(lambda s: s.proxy, links))
+        self.assertEqual(set(results), set(links))
+        #Each driver serves at most rotate_every pages and is restarted with a new proxy
+        self.assertTrue(all(scraper.pages <= 3 for scraper in started))
+        self.assertGreaterEqual(len(started), 12 // 3)
+        self.assertEqual({scraper.proxy for scraper in started}, {"http://a", "http://b", "http://c"})
+        self.assertEqual(sum(pool.stats(proxy).in_use for proxy in ("http://a", "http://b", "http://c")), 0)
+        self.assertEqual(sum(pool.stats(proxy).requests for proxy in ("http://a", "http://b", "http://c")), 12)
@@ -0,0 +1,86 @@
+import unittest
+import time
+import bg_scraper as bgs
+from bg_ratelimit import RateLimiter, HostLimiter, parse_retry_after
+from test.stand_in import StandInServer, ThrottledRoute
+
+
+class RateLimiterTest(unittest.TestCase):
+    def test_aimd(self):
+        limiter = HostLimiter("example.com", rate = 10, concurrency = 8, min_concurrency = 1, target_latency = 1.0)
+        for _ in range(3):
+            self.assertTrue(limiter.acquire(timeout = 1))
+        limiter.release(0.1, throttled = True, retry_after = 0.2)
+        self.assertEqual(limiter.concurrency, 4)
+        self.assertEqual(limiter.rate, 5)
+        #Host is blocked for the Retry-After period
+        start = time.monotonic()
+        self.assertTrue(limiter.acquire(timeout = 1))
+        self.assertGreaterEqual(time.monotonic() - start, 0.15)
+        for _ in range(3):
+            limiter.release(0.1)
+        self.assertGreater(limiter.concurrency, 4)
+        self.assertGreater(limiter.rate, 5)
+        self.assertAlmostEqual(limiter.error_rate, 1 / 4)
+        #Slow responses decrease limits
+        limiter = HostLimiter("example.com", rate = 10, concurrency = 8, target_latency = 1.0)
+        limiter.acquire(timeout = 1)
+        limiter.release(5.0)
+        self.assertLess(limiter.concurrency, 8)
+        self.assertLess(limiter.rate, 10)
+
+    def test_concurrency_limit(self):
+        limiter = HostLimiter("example.com", rate = 100, concurrency = 2)
+        self.assertTrue(limiter.acquire(timeout = 0.1))
+        self.assertTrue(limiter.acquire(timeout = 0.1))
+        self.assertFalse(limiter.acquire(timeout = 0.1))
+
+    def test_retry_after(self):
+        self.assertEqual(parse_retry_after("3"), 3.0)
+        self.assertIsNone(parse_retry_after(None))
+        self.assertIsNone(parse_retry_after("soon"))
+        self.assertEqual(parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT"), 0.0)
+
+    def test_throttling_server(self):
+        route = ThrottledRoute("<html><p>page</p></html>", concurrency = 2)
+        limiter = RateLimiter(rate = 50, burst = 8, concurrency = 8, backoff = 0.1)
+        session = bgs.make_session(pool_size = 8, retries = 5, limiter = limiter)
+        with StandInServer({"/page" : route}) as server:
+            urls = ["{}/page?i={}".format(server.url, i) for i in range(24)]
+            soups = bgs.SimpleScraper(urls[0], session = session).fetch_many(urls, workers = 8)
+        self.assertEqual([soup.p.text for soup in soups], ["page"] * 24)
+        self.assertEqual(route.served, 25)
+        self.assertGreater(route.throttled, 0)
+        #Limiter backs off, so most requests are not wasted on throttled responses
+        self.assertLess(route.throttled, route.served)
+        host = limiter.host(server.url)
+        self.assertLess(host.concurrency, 8)
+        self.assertEqual(host.in_flight, 0)
+
+    def test_shared_limiter(self):
+        route = ThrottledRoute("<html><p>page</p></html>", concurrency = 0, retry_after = 1)
+        limiter = bgs.SimpleScraper.configure_limiter(rate = 10, concurrency = 2)
+        try:
+            self.assertIs(bgs.SimpleScraper._shared_limiter, limiter)
+            with StandInServer({"/page" : route}) as server:
+                start = time.monotonic()
+                response = bgs.SimpleScraper.shared_session().get(server.url + "/page")
+            #Throttled response is returned after the retries honouring Retry-After
+            self.assertEqual(response.status_code, 429)
+            self.assertGreaterEqual(time.monotonic() - start, 3)
+            self.assertEqual(route.throttled, 4)
+        finally:
+            bgs.SimpleScraper.configure_limiter()
+        self.assertIsNone(bgs.SimpleScraper._shared_limiter)
+
+    def test_limiter_keeps_session_settings(self):
+        bgs.SimpleScraper.configure_session(pool_size = 3, retries = 1, backoff = 0)
+        try:
+            bgs.SimpleScraper.configure_limiter(rate = 10, concurrency = 2)
+            adapter = bgs.SimpleScraper.shared_session().get_adapter("https://example.com")
+            self.assertIsInstance(adapter, bgs.LimitedAdapter)
+            self.assertEqual(adapter.max_retries.total, 1)
+            self.assertEqual(adapter._pool_maxsize, 3)
+        finally:
+            bgs.SimpleScraper.configure_limiter()
+            bgs.SimpleScraper.configure_session()
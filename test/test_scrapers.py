@@ -3,8 +3,13 @@ import logging
 import bg_scraper as bgs
 import requests
 import re
+from selenium.common.exceptions import WebDriverException
+import os
+import time
+import threading
 
 TESTCASE = "GLOBAL"
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
 
 class ContextFilter(logging.Filter):
     """
@@ -61,4 +66,229 @@ class SimpleScraper(unittest.TestCase):
         self.assertTrue(str(cm.exception) != None)
 
         self.logger.info("Test done!")
-        
\ No newline at end of file
+        
+
+class SessionPool(unittest.TestCase):
+    def test_fetch_many(self):
+        from test.stand_in import StandInServer
+        routes = {"/{}".format(i) : "<html><p id='n'>{}</p></html>".format(i) for i in range(20)}
+        with StandInServer(routes) as server:
+            session = bgs.make_session(pool_size = 4, retries = 0)
+            scraper = bgs.SimpleScraper(server.url + "/0", session = session)
+            soups = scraper.fetch_many([server.url + "/{}".format(i) for i in range(20)])
+            self.assertEqual([s.find('p', id = 'n').get_text() for s in soups], [str(i) for i in range(20)])
+            self.assertEqual(scraper.page, server.url + "/0")
+            self.assertEqual(scraper.fetch_many([]), [])
+
+
+def browse_page(page_no, per_page = 3):
+    """Render browse page fixture with games ranked from the given page."""
+    with open(os.path.join(FIXTURES, "browse_page.html")) as f:
+        template = f.read()
+    rows = "".join(
+        '<tr><td>{0}</td><td><a class="primary" href="/boardgame/{0}/game-{0}">Game {0}</a></td></tr>\n'.format(rank)
+        for rank in range((page_no - 1) * per_page + 1, page_no * per_page + 1)
+    )
+    return template.replace("{rows}", rows)
+
+
+class ListCrawler(unittest.TestCase):
+    def test_crawl_in_rank_order(self):
+        from test.stand_in import StandInServer
+        state = {"inflight" : 0, "max_inflight" : 0}
+        lock = threading.Lock()
+        def page(page_no):
+            def handler(request):
+                with lock:
+                    state["inflight"] += 1
+                    state["max_inflight"] = max(state["max_inflight"], state["inflight"])
+                #Later pages answer faster so they arrive out of order
+                time.sleep(0.01 * (12 - page_no))
+                with lock:
+                    state["inflight"] -= 1
+                return 200, {"Content-Type" : "text/html"}, browse_page(page_no) if page_no <= 10 else "<html></html>"
+            return handler
+        routes = {"/browse/{}".format(i) : page(i) for i in range(1, 13)}
+        with StandInServer(routes) as server:
+            session = bgs.make_session(pool_size = 4, retries = 0)
+            crawler = bgs.ListCrawler(server.url + "/browse", "http://bgg", concurrency = 4, session = session)
+            links = crawler.crawl()
+            self.assertEqual(links, ["http://bgg/boardgame/{0}/game-{0}".format(i) for i in range(1, 31)])
+            self.assertLessEqual(state["max_inflight"], 4)
+            self.assertGreater(state["max_inflight"], 1)
+            self.assertEqual(len(crawler.crawl(pages = 2)), 6)
+            self.assertEqual(crawler.crawl(pages = 1, first_page = 3)[0], "http://bgg/boardgame/7/game-7")
+
+
+class FakeDriverScraper():
+    """Stand-in for Scraper which does not start a browser."""
+    started = 0
+    lock = threading.Lock()
+
+    def __init__(self, crash_on = None):
+        with FakeDriverScraper.lock:
+            FakeDriverScraper.started += 1
+        #Shared between drivers so a link crashes only once
+        self.crash_on = crash_on if crash_on is not None else set()
+        self.page = None
+        self.closed = False
+
+    def set_page(self, page):
+        if page in self.crash_on:
+            self.crash_on.discard(page)
+            raise WebDriverException("driver crashed")
+        self.page = page
+
+    def quit(self):
+        self.closed = True
+
+
+class ScraperPool(unittest.TestCase):
+    def test_pool_restarts_and_quits(self):
+        FakeDriverScraper.started = 0
+        scrapers = []
+        crash_on = {"link-3"}
+        def factory():
+            scraper = FakeDriverScraper(crash_on = crash_on)
+            scrapers.append(scraper)
+            return scraper
+        links = ["link-{}".format(i) for i in range(20)]
+        with bgs.ScraperPool(3, timeout = 1, max_pages = 4, factory = factory) as pool:
+            results = dict(pool.imap(lambda s: s.page.upper(), links))
+            self.assertEqual(results, {link : link.upper() for link in links})
+            self.assertEqual(pool.failed, {})
+            #Restarts for page limits and the crashed driver
+            self.assertGreater(FakeDriverScraper.started, 3 + 20 // (3 * 4))
+            results = dict(pool.imap(lambda s: 1 / 0 if s.page == "bad" else 1, ["ok", "bad"]))
+            self.assertEqual(results, {"ok" : 1})
+            self.assertIsInstance(pool.failed["bad"], ZeroDivisionError)
+        self.assertTrue(all(scraper.closed for scraper in scrapers))
+
+    def test_consumer_stops_early(self):
+        before = set(threading.enumerate())
+        with bgs.ScraperPool(2, timeout = 1, factory = FakeDriverScraper) as pool:
+            results = pool.imap(lambda s: s.page, ["link-{}".format(i) for i in range(50)])
+            next(results)
+            #Workers blocked on the full results queue give up when the generator is closed
+            results.close()
+            self.assertEqual(set(threading.enumerate()) - before, set())
+
+
+class ParsePool(unittest.TestCase):
+    def test_parse_in_processes(self):
+        with open(os.path.join(FIXTURES, "game_page.html"), encoding = 'utf-8') as f:
+            page = f.read()
+        pulled = []
+        def pages():
+            for i in range(12):
+                pulled.append(i)
+                yield "link-{}".format(i), page
+        with bgs.ParsePool(2, max_pending = 3) as parser:
+            ahead = 0
+            games = {}
+            for link, game in parser.imap(pages()):
+                games[link] = game
+                ahead = max(ahead, len(pulled) - len(games))
+            self.assertEqual(len(games), 12)
+            self.assertEqual(games["link-5"], bgs.parse_game_page(page))
+            #Pages in flight plus the one waiting for a free slot
+            self.assertLessEqual(ahead, 4)
+        self.assertEqual(parser.failed, {})
+        with bgs.ParsePool(1, parser = int) as parser:
+            results = dict(parser.imap([("a", "1"), ("b", "x")]))
+        self.assertEqual(results, {"a" : 1})
+        self.assertIsInstance(parser.failed["b"], ValueError)
+
+
+class XMLAPIBackend(unittest.TestCase):
+    def test_iter_games_in_batches(self):
+        from test.stand_in import StandInServer
+        from urllib.parse import urlparse, parse_qs
+        import xml.etree.ElementTree as ET
+        with open(os.path.join(FIXTURES, "thing.xml"), "rb") as f:
+            recorded = f.read()
+        requested = []
+        def thing(request):
+            ids = parse_qs(urlparse(request.path).query)['id'][0].split(",")
+            requested.append(ids)
+            root = ET.fromstring(recorded)
+            for item in list(root):
+                if item.get('id') not in ids:
+                    root.remove(item)
+            return 200, {"Content-Type" : "text/xml"}, ET.tostring(root)
+        with StandInServer({"/xmlapi2/thing" : thing}) as server:
+            backend = bgs.XMLAPIBackend(server.url + "/xmlapi2", batch_size = 2, session = bgs.make_session(retries = 0))
+            links = ["/boardgame/13/catan", "/boardgame/174430/gloomhaven", "/boardgame/999/missing", "822"]
+            games = list(backend.iter_games(links))
+        self.assertEqual(requested, [["13", "174430"], ["999", "822"]])
+        self.assertEqual([link for link, _ in games], ["/boardgame/13/catan", "/boardgame/174430/gloomhaven", "822"])
+        gloomhaven = games[1][1]
+        self.assertEqual(gloomhaven.title, "Gloomhaven")
+        self.assertEqual(gloomhaven.release, 2017)
+        self.assertEqual(gloomhaven.players, "1–4")
+        self.assertEqual(gloomhaven.time, "60–120")
+        self.assertEqual(gloomhaven.age, "14+")
+        self.assertEqual(gloomhaven.category, "Adventure")
+        self.assertEqual(gloomhaven.publisher, "Cephalofair Games")
+        self.assertEqual(gloomhaven.tags, ["Action Queue", "Cooperative Game"])
+        self.assertAlmostEqual(gloomhaven.weight, 3.8911)
+        self.assertIn("\n\nPlayers", gloomhaven.description)
+        self.assertEqual(games[2][1].publisher, "Hans im Glück")
+
+
+class RegionParsing(unittest.TestCase):
+    def test_regions_match_full_parse(self):
+        from test.stand_in import StandInServer
+        with open(os.path.join(FIXTURES, "game_page.html")) as f:
+            page = f.read()
+        with StandInServer({"/boardgame/174430/gloomhaven" : page}) as server:
+            url = server.url + "/boardgame/174430/gloomhaven"
+            session = bgs.make_session(retries = 0)
+            full = bgs.SimpleScraper(url, session = session)
+            targeted = bgs.SimpleScraper(url, session = session, regions = bgs.Game.REGIONS)
+            for scraper in (full, targeted):
+                game = bgs.scrape_game_page(scraper)
+                self.assertEqual(
+                    (game.players, game.time, game.age, game.weight, game.release, game.title),
+                    ("1–4", "60–120", "14+", 3.86, 2017, "Gloomhaven")
+                )
+                self.assertEqual(game.tags, ["Action Queue", "Cooperative Game", "Grid Movement"])
+                self.assertEqual((game.category, game.publisher), ("Adventure", "Cephalofair Games"))
+                self.assertTrue(game.description.startswith("Gloomhaven is a game"))
+                self.assertIn("\n\nPlayers will take", game.description)
+        self.assertIsNone(targeted.soup.find('nav'))
+        self.assertIsNotNone(full.soup.find('nav'))
+
+    def test_parsers_and_selectors(self):
+        page = browse_page(2)
+        for parser in ('html.parser', bgs.FAST_PARSER):
+            soup = bgs.bsp(page, parser, parse_only = bgs.RegionStrainer(["table#collectionitems"]))
+            self.assertEqual(len(soup.find_all('a', {'class' : "primary"})), 3)
+        self.assertEqual(bgs.ListCrawler.parse_links(page, "x")[0], "x/boardgame/4/game-4")
+        with self.assertRaises(ValueError):
+            bgs.RegionStrainer(["div > p"])
+
+
+class LeanRendering(unittest.TestCase):
+    def test_driver_options(self):
+        from urllib.parse import unquote
+        full = bgs.make_driver_options(proxy = "10.0.0.1:3128")
+        self.assertEqual(full.page_load_strategy, "normal")
+        self.assertNotIn("permissions.default.image", full.preferences)
+        self.assertEqual(full.preferences["network.proxy.type"], 1)
+        self.assertEqual(full.preferences["network.proxy.http"], "10.0.0.1")
+        self.assertEqual(full.preferences["network.proxy.ssl_port"], 3128)
+        self.assertFalse(any(argument.startswith("--proxy-server") for argument in full.arguments))
+        lean = bgs.make_driver_options(proxy = "http://10.0.0.1:3128", lean = True, allowed_hosts = ["boardgamegeek.com"])
+        self.assertEqual(lean.page_load_strategy, "eager")
+        self.assertEqual(lean.preferences["permissions.default.image"], 2)
+        self.assertFalse(lean.preferences["gfx.downloadable_fonts.enabled"])
+        self.assertEqual(lean.preferences["network.proxy.type"], 2)
+        script = unquote(lean.preferences["network.proxy.autoconfig_url"].split(",", 1)[1])
+        self.assertEqual(script, bgs.pac_script(["boardgamegeek.com"], "http://10.0.0.1:3128"))
+        self.assertIn('dnsDomainIs(host, ".boardgamegeek.com")) { return "PROXY 10.0.0.1:3128"; }', script)
+        self.assertIn('return "PROXY {}"'.format(bgs.BLACKHOLE_PROXY), script)
+        #Without allow-list the proxy is set directly
+        lean = bgs.make_driver_options(proxy = "10.0.0.1:3128", lean = True)
+        self.assertEqual(lean.preferences["network.proxy.http"], "10.0.0.1")
+        self.assertEqual(lean.preferences["network.proxy.ssl_port"], 3128)
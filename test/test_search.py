@@ -0,0 +1,86 @@
+import unittest
+import os
+import json
+import tempfile
+import subprocess
+import sys
+from dataclasses import replace
+from bg_search import SearchIndex, index_records, tokenize
+from test.test_writer import make_game
+
+GAMES = {
+    "gloomhaven" : {"title" : "Gloomhaven", "description" : "Tactical combat in a persistent world. Gloomy dungeons and monsters."},
+    "jaws" : {"title" : "Gloomhaven: Jaws of the Lion", "description" : "Standalone game with a campaign for new players."},
+    "brass" : {"title" : "Brass: Birmingham", "description" : "Economic strategy game about canals, rails and industry in Birmingham."},
+    "ark" : {"title" : "Ark Nova", "description" : "Plan and design a modern zoo. Ark Nova is a strategy game with cards."},
+    "łódź" : {"title" : "Łódź Express", "description" : "Trains through Łódź and Kraków."}
+}
+
+
+class SearchIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "search")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def keys(self, index, query, **options):
+        return [key for key, _, _ in index.search(query, **options)]
+
+    def test_search_and_updates(self):
+        index = SearchIndex(self.path, max_segments = 3)
+        passed = list(index_records(GAMES.items(), index, batch_size = 2))
+        self.assertEqual(len(passed), 5)
+        self.assertEqual(index.segments, 3)
+        self.assertEqual(tokenize("Brass: Birmingham"), ["brass", "birmingham"])
+        #Title words outrank description words, both documents match
+        self.assertEqual(self.keys(index, "birmingham"), ["brass"])
+        self.assertEqual(self.keys(index, "strategy game")[:2], ["brass", "ark"])
+        self.assertEqual(self.keys(index, "gloom"), [])
+        self.assertEqual(set(self.keys(index, "gloom", prefix = True)), {"gloomhaven", "jaws"})
+        self.assertEqual(self.keys(index, "ŁÓDŹ"), ["łódź"])
+        self.assertEqual(index.search("zoo")[0][2], "Ark Nova")
+        self.assertEqual(index.complete("gloom"), [("gloomhaven", 2), ("gloomy", 1)])
+
+        #Reader opens the files written by another instance
+        reader = SearchIndex(self.path)
+        self.assertEqual(len(reader), 5)
+        self.assertEqual(self.keys(reader, "canals"), ["brass"])
+
+        #Replaced and removed documents are not found, the fourth segment triggers merge
+        index.update([("brass", replace(make_game(1), title = "Brass: Lancashire", description = "Cotton mills."))])
+        self.assertEqual(index.segments, 1)
+        self.assertEqual(self.keys(index, "birmingham"), [])
+        self.assertEqual(self.keys(index, "lancashire cotton"), ["brass"])
+        self.assertEqual(index.remove(["ark", "unknown"]), 1)
+        self.assertEqual(self.keys(index, "zoo"), [])
+        self.assertEqual(len(SearchIndex(self.path)), 4)
+        #Games which dropped out of the ranking are removed
+        self.assertEqual(index.retain({"gloomhaven" : 1, "brass" : 2, "jaws" : 3}), 1)
+        self.assertEqual(self.keys(index, "łódź"), [])
+        self.assertEqual(len(SearchIndex(self.path)), 3)
+        index.merge()
+        self.assertEqual(index.complete("ark"), [])
+        self.assertEqual(self.keys(SearchIndex(self.path), "persistent"), ["gloomhaven"])
+
+    def test_rebuild_from_export(self):
+        export = os.path.join(self.tmp.name, "games.jsonl")
+        with open(export, "w", encoding = 'utf-8') as f:
+            for key, record in GAMES.items():
+                f.write(json.dumps(dict(record, link = "https://bgg/boardgame/" + key)) + "\n")
+            f.write(json.dumps({"title" : "Ark without link"}) + "\n")
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        script = os.path.join(root, "bg_search.py")
+        usage = subprocess.run([sys.executable, script, "build", export], capture_output = True, text = True)
+        self.assertEqual(usage.returncode, 1)
+        self.assertIn("Usage", usage.stderr)
+        build = subprocess.run([sys.executable, script, "build", export, self.path], check = True, capture_output = True, text = True)
+        self.assertIn("Skipped 1 records without link", build.stderr)
+        output = subprocess.run([sys.executable, script, "search", self.path, "ark"], check = True, capture_output = True, text = True)
+        self.assertIn("https://bgg/boardgame/ark", output.stdout)
+        self.assertEqual(len(SearchIndex(self.path)), len(GAMES))
+        index = SearchIndex(self.path)
+        self.assertEqual(index.rebuild([("one", GAMES["ark"])]), 1)
+        self.assertEqual(len(SearchIndex(self.path)), 1)
+        self.assertEqual(len(os.listdir(self.path)), 2)
@@ -0,0 +1,94 @@
+import unittest
+import os
+import tempfile
+from dataclasses import replace
+from bg_stats import GameStats, ALL, update_stats, stats_frame
+from test.test_writer import make_game
+
+
+def games(n):
+    return [
+        ("link-{}".format(i), replace(
+            make_game(i), category = ("Adventure", "Economic", "Wargame")[i % 3], players = "{}–{}".format(1 + i % 2, 2 + i % 6),
+            time = "{}–{}".format(30, 30 * (1 + i % 5)), weight = 1 + (i % 4) * 0.9
+        ))
+        for i in range(n)
+    ]
+
+
+class GameStatsTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "state", "stats.sqlite")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_frame(self):
+        frame = stats_frame([("a", {"players" : "1–4", "time" : "60", "weight" : "2.5", "release" : "2017"}), ("b", {"players" : "14+"})])
+        self.assertEqual(frame.loc["a", ["players_min", "players_max", "time_min", "time_max", "weight", "release"]].tolist(), [1, 4, 60, 60, 2.5, 2017])
+        self.assertEqual(frame.loc["b", ["players_min", "players_max"]].tolist(), [14, 14])
+
+    def test_aggregates_and_invalidation(self):
+        records = games(30)
+        stats = GameStats(self.path)
+        passed = list(update_stats(records, stats, {key : rank for rank, (key, _) in enumerate(records, 1)}, batch_size = 40))
+        self.assertEqual(len(passed), 30)
+        adventure = stats.get("Adventure")
+        self.assertEqual(adventure["games"], 10)
+        self.assertEqual(adventure["rank_best"], 1)
+        self.assertEqual(sum(adventure["distributions"]["weight"].values()), 10)
+        self.assertEqual(adventure["distributions"]["rank"]["1-101"], 10)
+        #Games 0, 6, ... are for 1 to 2 players, games 3, 9, ... for 2 to 5 players
+        self.assertEqual(adventure["distributions"]["players"], {"1" : 5, "2" : 10, "3" : 5, "4" : 5, "5" : 5, "6" : 0, "7" : 0, "8+" : 0})
+        self.assertEqual(stats.groups(), {"Adventure" : 10, "Economic" : 10, "Wargame" : 10, ALL : 30})
+        self.assertAlmostEqual(stats.get()["weight_mean"], sum(game.weight for _, game in records) / 30, places = 3)
+        keys = {group : stats.key(group) for group in stats.groups()}
+
+        #Moving a game between categories refreshes only these two groups and ALL
+        refreshed = stats.update([("link-0", replace(records[0][1], category = "Economic"))])
+        self.assertEqual(refreshed, {"Adventure", "Economic", ALL})
+        self.assertEqual(stats.key("Wargame"), keys["Wargame"])
+        self.assertNotEqual(stats.key("Adventure"), keys["Adventure"])
+        self.assertEqual(stats.get("Economic")["games"], 11)
+        #Rank is kept when a batch does not give it
+        self.assertEqual(stats.get("Economic")["rank_best"], 1)
+        stats.close()
+
+        stats = GameStats(self.path)
+        self.assertEqual(stats.distribution("Adventure", "players")["1"], 4)
+        self.assertEqual(stats.remove(["link-{}".format(i) for i in range(2, 30, 3)]), {"Wargame", ALL})
+        self.assertIsNone(stats.get("Wargame"))
+        self.assertIsNone(stats.key("Wargame"))
+        self.assertEqual(stats.groups(), {"Adventure" : 9, "Economic" : 11, ALL : 20})
+        stats.close()
+
+    def test_records_without_numbers(self):
+        stats = GameStats(self.path)
+        self.assertEqual(stats.update([("a", {"title" : "A", "category" : "Adventure"})]), {"Adventure", ALL})
+        self.assertEqual(stats.get("Adventure")["games"], 1)
+        self.assertIsNone(stats.get("Adventure")["weight_mean"])
+        stats.close()
+
+    def test_retain_ranking(self):
+        records = games(6)
+        stats = GameStats(self.path)
+        stats.update(records, {key : rank for rank, (key, _) in enumerate(records, 1)})
+        #Wargame games 2 and 5 dropped out of the ranking, Adventure game 3 moved up
+        refreshed = stats.retain({"link-3" : 1, "link-0" : 2, "link-1" : 3, "link-4" : 4})
+        self.assertEqual(refreshed, {"Adventure", "Economic", "Wargame", ALL})
+        self.assertEqual(stats.groups(), {"Adventure" : 2, "Economic" : 2, ALL : 4})
+        self.assertEqual(stats.get("Adventure")["rank_best"], 1)
+        self.assertEqual(stats.retain({"link-3" : 1, "link-0" : 2, "link-1" : 3, "link-4" : 4}), set())
+        stats.close()
+
+    def test_batches_refresh_all_group_once(self):
+        records = games(30)
+        stats = GameStats(self.path)
+        list(update_stats(records, stats, batch_size = 10))
+        self.assertEqual(stats.key("Adventure"), "v1/Adventure/3")
+        self.assertEqual(stats.key(ALL), "v1/{}/1".format(ALL))
+        self.assertEqual(stats.get()["games"], 30)
+        self.assertEqual(stats.update(records[:1], all_group = False), {"Adventure"})
+        self.assertEqual(stats.refresh(), {"Adventure", "Economic", "Wargame", ALL})
+        stats.close()
@@ -0,0 +1,39 @@
+import unittest
+import bg_table
+from test.test_writer import make_game
+
+
+class GameTableTest(unittest.TestCase):
+    def test_round_trip(self):
+        games = [make_game(i) for i in range(5)]
+        games[1].tags = ["Worker Placement", "Dice Rolling"]
+        games[2].weight = None
+        table = bg_table.GameTable(capacity = 2)
+        table.extend(games[:3])
+        for game in games[3:]:
+            table.append(game)
+        table.append({"title" : "Partial", "release" : "2017"})
+        self.assertEqual(len(table), 6)
+        self.assertEqual(list(table)[:5], games)
+        self.assertEqual(table[-1].release, 2017)
+        self.assertEqual(table[-1].tags, [])
+        #Repeated strings are stored once
+        self.assertEqual(table.pools["publisher"].values, ["KOSMOS"])
+        self.assertEqual(table.pools["tags"].values, ["Dice Rolling", "Worker Placement"])
+        with self.assertRaises(IndexError):
+            table[6]
+
+    def test_dataframe(self):
+        table = bg_table.GameTable()
+        table.extend([make_game(i) for i in range(3)] + [{"title" : "Empty"}])
+        frame = table.to_dataframe()
+        self.assertEqual(str(frame["category"].dtype), "category")
+        self.assertEqual(str(frame["release"].dtype), "Int64")
+        self.assertEqual(frame["release"].isna().tolist(), [False, False, False, True])
+        self.assertEqual(frame["tags"][0], ["Dice Rolling"])
+        self.assertEqual(frame["category"].cat.categories.tolist(), ["Economic"])
+        self.assertEqual(table.to_dataframe(tags_as_lists = False)["tags"][0], "Dice Rolling")
+
+    def test_memory_benchmark(self):
+        results = bg_table.memory_benchmark(n = 20)
+        self.assertEqual(set(results), {"dataframe_appends", "game_table", "game_table_dataframe", "game_objects"})
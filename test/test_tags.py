@@ -0,0 +1,73 @@
+import unittest
+import os
+import tempfile
+from dataclasses import replace
+import numpy as np
+from bg_tags import TagSimilarity, track_tags
+from bg_table import GameTable
+from test.test_writer import make_game
+
+TAGS = {
+    "gloomhaven" : ["Action Queue", "Cooperative Game", "Grid Movement", "Campaign"],
+    "jaws" : ["Cooperative Game", "Grid Movement", "Campaign"],
+    "spirit" : ["Cooperative Game", "Area Control"],
+    "brass" : ["Network Building", "Hand Management", "Loans"],
+    "ark" : ["Hand Management", "Tile Placement"]
+}
+
+
+class TagSimilarityTest(unittest.TestCase):
+    def assertCooccurrence(self, engine):
+        matrix = engine.matrix.toarray()
+        self.assertTrue(np.array_equal(engine.cooccurrence.toarray(), matrix.T @ matrix))
+
+    def test_similarity_and_updates(self):
+        engine = TagSimilarity()
+        passed = list(track_tags(((key, {"tags" : tags}) for key, tags in TAGS.items()), engine, batch_size = 2))
+        self.assertEqual(len(passed), 5)
+        self.assertCooccurrence(engine)
+        self.assertEqual([key for key, _ in engine.similar("gloomhaven")], ["jaws", "spirit"])
+        self.assertEqual([key for key, _ in engine.similar("brass", n = 1)], ["ark"])
+        self.assertEqual(engine.similar("ark")[0][0], "brass")
+        self.assertEqual(engine.like_tags(["Campaign", "Grid Movement"])[0][0], "jaws")
+        self.assertEqual(engine.like_tags(["Unknown"]), [])
+        related = dict(engine.related_tags("Campaign"))
+        self.assertEqual(related["Grid Movement"], 1.0)
+        self.assertAlmostEqual(related["Cooperative Game"], 2 / 3)
+        self.assertNotIn("Loans", related)
+        pairs = dict(engine.all_similar(n = 2, chunk_size = 2))
+        for key in TAGS:
+            self.assertEqual(pairs[key], engine.similar(key, n = 2))
+
+        #Replaced tags update co-occurrence incrementally
+        engine.update([("spirit", make_game(1)), ("root", replace(make_game(2), tags = ["Area Control", "Dice Rolling"]))])
+        self.assertCooccurrence(engine)
+        self.assertEqual(engine.similar("spirit")[0][0], "root")
+        self.assertEqual(engine.cooccurrence[engine.tags.index("Cooperative Game")].sum(), 2 + 2 + 2 + 1)
+
+        #Games which dropped out of the ranking are subtracted from co-occurrence
+        self.assertEqual(engine.retain({"gloomhaven" : 1, "brass" : 2, "ark" : 3, "root" : 4}), 2)
+        self.assertEqual(engine.keys, ["gloomhaven", "brass", "ark", "root"])
+        self.assertNotIn("jaws", engine)
+        self.assertCooccurrence(engine)
+        self.assertEqual(engine.similar("ark")[0][0], "brass")
+        self.assertEqual(engine.remove(["unknown"]), 0)
+
+    def test_save_and_load(self):
+        engine = TagSimilarity()
+        engine.update(TAGS.items())
+        engine.update([("ark", ["Tile Placement"])])
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "tags.npz")
+            engine.save(path)
+            loaded = TagSimilarity.load(path)
+        self.assertEqual((loaded.keys, loaded.tags), (engine.keys, engine.tags))
+        self.assertTrue(np.array_equal(loaded.cooccurrence.toarray(), engine.cooccurrence.toarray()))
+        self.assertEqual(loaded.similar("brass"), engine.similar("brass"))
+
+        table = GameTable()
+        table.extend(replace(make_game(i), tags = tags) for i, tags in enumerate(TAGS.values()))
+        from_table = TagSimilarity.from_table(table, list(TAGS))
+        fresh = TagSimilarity()
+        fresh.update(TAGS.items())
+        self.assertEqual(from_table.similar("gloomhaven"), fresh.similar("gloomhaven"))
@@ -0,0 +1,81 @@
+import unittest
+import os
+import gzip
+import tempfile
+from bg_upload import DropboxUploader, UploadManifest, remote_path
+from test.stand_in import StandInServer, DropboxStandIn
+
+
+class DropboxUploaderTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.data = os.path.join(self.tmp.name, "data")
+        os.makedirs(self.data)
+        self.contents = {
+            "games.jsonl" : b'{"title": "Gloomhaven"}\n' * 200,
+            "prices.csv" : b"title,price\nGloomhaven,129.99\n",
+            "history.parquet" : b"PAR1" + b"\x00" * 100,
+            #Random bytes do not compress, so the file goes through an upload session
+            "big.csv" : os.urandom(10000)
+        }
+        for name, content in self.contents.items():
+            with open(os.path.join(self.data, name), "wb") as f:
+                f.write(content)
+        self.manifest_path = os.path.join(self.data, ".uploaded.json")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def uploader(self, server):
+        return DropboxUploader(
+            "token", api_url = server.url + "/2", workers = 3, chunk_size = 4096, single_limit = 5000,
+            manifest = UploadManifest(self.manifest_path)
+        )
+
+    def test_upload_and_skip_unchanged(self):
+        dropbox = DropboxStandIn()
+        with StandInServer(dropbox.routes) as server:
+            results = self.uploader(server).upload_dir(self.data, "/bgg", date = "2024-01-01")
+            self.assertEqual([result["status"] for result in results], ["uploaded"] * 4)
+            self.assertEqual(sorted(dropbox.files), [
+                "/bgg/big2024-01-01.csv.gz", "/bgg/games2024-01-01.jsonl.gz",
+                "/bgg/history2024-01-01.parquet", "/bgg/prices2024-01-01.csv.gz"
+            ])
+            for name, content in self.contents.items():
+                remote = remote_path(name, "/bgg", "2024-01-01")
+                if name.endswith(".parquet"):
+                    self.assertEqual(dropbox.files[remote], content)
+                else:
+                    self.assertEqual(gzip.decompress(dropbox.files[remote + ".gz"]), content)
+            self.assertLess(len(dropbox.files["/bgg/games2024-01-01.jsonl.gz"]), len(self.contents["games.jsonl"]))
+            self.assertEqual(dropbox.calls.count("start"), 1)
+            self.assertEqual(dropbox.calls.count("append"), 1)
+            self.assertEqual(dropbox.calls.count("finish"), 1)
+            self.assertEqual(dropbox.calls.count("upload"), 3)
+
+            #Next run with the same manifest uploads only changed files
+            with open(os.path.join(self.data, "prices.csv"), "ab") as f:
+                f.write(b"Brass,199.99\n")
+            calls = len(dropbox.calls)
+            results = self.uploader(server).upload_dir(self.data, "/bgg", date = "2024-01-02")
+        self.assertEqual(
+            {os.path.basename(result["file"]) : result["status"] for result in results},
+            {"games.jsonl" : "unchanged", "prices.csv" : "uploaded", "history.parquet" : "unchanged", "big.csv" : "unchanged"}
+        )
+        self.assertEqual(dropbox.calls[calls:], ["upload"])
+        self.assertIn("/bgg/prices2024-01-02.csv.gz", dropbox.files)
+
+    def test_throttling_and_errors(self):
+        dropbox = DropboxStandIn(throttle = 2)
+        with StandInServer(dropbox.routes) as server:
+            uploader = self.uploader(server)
+            path = os.path.join(self.data, "prices.csv")
+            self.assertEqual(uploader.upload_file(path, "/prices.csv")["status"], "uploaded")
+            self.assertEqual(dropbox.calls, ["upload"] * 3)
+            bad = DropboxUploader("wrong", api_url = server.url + "/2")
+            with self.assertRaises(RuntimeError):
+                bad.upload_file(os.path.join(self.data, "games.jsonl"), "/games.jsonl")
+            results = bad.upload_dir(self.data)
+        self.assertEqual({result["status"] for result in results}, {"failed"})
+        with self.assertRaises(ValueError):
+            DropboxUploader(None)
@@ -0,0 +1,61 @@
+import unittest
+import os
+import json
+import tempfile
+import bg_scraper as bgs
+
+
+def make_game(i):
+    return bgs.Game(
+        title = "Game {}".format(i), players = "2–4", release = 2000 + i, tags = ["Dice Rolling"], age = "10+",
+        time = "60", category = "Economic", publisher = "KOSMOS", description = "Łódź", weight = 2.5
+    )
+
+
+class JSONLWriterTest(unittest.TestCase):
+    def test_buffered_writes(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "games.jsonl")
+            with bgs.JSONLWriter(path, max_records = 3, flush_interval = 3600) as writer:
+                writer.write([make_game(0), make_game(1)])
+                #Buffered records are not on disk yet
+                self.assertEqual(os.path.getsize(path), 0)
+                writer.write({"title" : "dict"})
+                self.assertEqual(writer.written, 3)
+                writer.write(make_game(3))
+            with open(path, encoding = 'utf-8') as f:
+                lines = [json.loads(line) for line in f]
+            self.assertEqual([line["title"] for line in lines], ["Game 0", "Game 1", "dict", "Game 3"])
+            self.assertEqual(lines[0]["description"], "Łódź")
+
+            with bgs.JSONLWriter(path) as writer:
+                writer.overwrite(make_game(9))
+                with self.assertRaises(Exception):
+                    writer.write("not a record")
+            with open(path, encoding = 'utf-8') as f:
+                self.assertEqual(len(f.readlines()), 1)
+
+    def test_pipeline_streams_games(self):
+        consumed = []
+        def links():
+            for i in range(10):
+                consumed.append(i)
+                yield "link-{}".format(i)
+        class Page():
+            def __init__(self):
+                self.page = None
+            def set_page(self, page):
+                self.page = page
+            def quit(self):
+                pass
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "games.jsonl")
+            with bgs.ScraperPool(1, timeout = 1, factory = Page) as pool, bgs.JSONLWriter(path) as writer:
+                games = pool.imap(lambda s: make_game(int(s.page.split("-")[1])), links())
+                first = next(bgs.sink_games(games, writer))
+                #Links are pulled lazily, not all at once
+                self.assertLess(len(consumed), 10)
+                rest = list(bgs.sink_games(games, writer))
+            self.assertEqual(sorted([first[0]] + [link for link, _ in rest]), sorted("link-{}".format(i) for i in range(10)))
+            with open(path) as f:
+                self.assertEqual(len(f.readlines()), 10)